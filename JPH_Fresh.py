@@ -9,6 +9,16 @@ from datetime import datetime
 if sys.stdout.encoding != 'utf-8':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 import requests
+from api_config import HttpClients
+from letter_index import record_letter
+from letter_blocks import layout_paragraph
+from font_subsets import RunFontSubset
+from preflight import run_preflight, ARREARS_RULES
+from column_manifests import read_policy_sheet, MissingColumnsError
+from output_plan import plan_letters, save_manifest
+from output_profiles import OutputProfile, SizeReport
+from output_writer import OutputWriter
+from blob_store import BlobStore
 import segno
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
@@ -21,9 +31,7 @@ from reportlab.lib.enums import TA_JUSTIFY
 from reportlab.lib.colors import gray
 
 import os
-import re
 from datetime import datetime
-from reportlab.lib.utils import ImageReader
 try:
     from PyPDF2 import PdfReader, PdfWriter
     PYPDF2_NEW = True
@@ -59,6 +67,10 @@ def load_excel_file():
         "temp_uploads/Generic_template.xlsx",  # Case variation in temp
     ]
     
+    # --input <file>: use exactly this file (lazy_letters.py renders one row this way)
+    if '--input' in sys.argv and sys.argv.index('--input') + 1 < len(sys.argv):
+        possible_files = [sys.argv[sys.argv.index('--input') + 1]]
+    
     # Removed dangerous glob fallback to prevent using wrong Excel files
     # Only use specific expected file locations
     
@@ -76,16 +88,9 @@ def load_excel_file():
         if os.path.exists(file_path):
             try:
                 print(f"[INFO] Attempting to load: {file_path}")
-                df = pd.read_excel(file_path, engine='openpyxl')
-                
-                # Validate the file has required columns
-                required_cols = ['Policy No', 'Arrears Amount']
+                # Only the columns this template uses, with compact dtypes (column_manifests.py)
+                df = read_policy_sheet(file_path, 'JPH_Fresh.py')
                 available_cols = list(df.columns)
-                missing_cols = [col for col in required_cols if col not in available_cols]
-                
-                if missing_cols:
-                    print(f"[WARNING] File {file_path} missing required columns: {missing_cols}")
-                    continue
                 
                 if len(df) == 0:
                     print(f"[WARNING] File {file_path} is empty")
@@ -95,6 +100,9 @@ def load_excel_file():
                 print(f"[OK] Loaded {len(df)} rows with columns: {available_cols}")
                 return df
                 
+            except MissingColumnsError as e:
+                print(f"[WARNING] File {file_path} missing required columns: {e.missing}")
+                continue
             except Exception as e:
                 print(f"[WARNING] Failed to load {file_path}: {str(e)}")
                 continue
@@ -231,11 +239,34 @@ styles['TableTextBold'] = ParagraphStyle(
     alignment=1
 )
 
+# --profile print|email|web: logo resolution, QR rendering and stream compression
+letter_profile = OutputProfile.from_argv(sys.argv)
+size_report = SizeReport()
+# Letters are written by a background thread while the next row renders, through
+# the blob store so a regenerated campaign only writes the letters that changed
+output_writer = OutputWriter(blob_store=BlobStore())
+print(f"[INFO] Output profile: {letter_profile.name}")
+
+# Pre-flight: classify every row up front so rows that would be skipped cost no
+# QR call or render (report: <output>/validation_report.csv)
+df, row_checks = run_preflight(df, ARREARS_RULES, output_folder)
+
+# Plan every output file name up front; the manifest is what SMS links, email
+# and combine use to find the letters
+output_plan = plan_letters(df, 'JPH_Fresh.py')
+save_manifest(output_folder, output_plan, 'JPH_Fresh.py')
+
+# --font-subset: give every letter of the run the same embedded font subset so
+# combined files (print batches, combine_pdfs.py) store the fonts only once
+font_subset = RunFontSubset.from_dataframe(df) if '--font-subset' in sys.argv else None
+if font_subset:
+    print(f"[INFO] Run font subset enabled: {len(font_subset.charset)} non-ASCII glyphs shared by all letters")
+
 # Iterate through each row in the DataFrame to process individual policyholder data
-for index, row in df.iterrows():
+# Progress counts the rows left after pre-flight; index is the Excel row, used for naming
+total_rows = len(df)
+for current_row, (index, row) in enumerate(df.iterrows(), 1):
     # Enhanced progress reporting for large files
-    total_rows = len(df)
-    current_row = index + 1
     
     if total_rows > 1000:
         # For large files, show progress every 50 rows (more frequent updates)
@@ -335,11 +366,6 @@ for index, row in df.iterrows():
     
     print(f"[DEBUG] Full Name (max 24 chars): '{full_name}' (length: {len(full_name)})")
     
-    # Validate required fields
-    if pd.isna(policy_no) or str(policy_no).strip() == '':
-        print(f"⚠️ Skipping row {index + 1}: Missing policy number")
-        continue
-
     # Format values for use in the PDF
     # Handle NaN values in name fields to avoid "nan nan" in PDFs
     name_parts = []
@@ -355,17 +381,9 @@ for index, row in df.iterrows():
     no_installments = no_installments if pd.notna(no_installments) else 0
     gross_premium = float(gross_premium) if pd.notna(gross_premium) else 0.0
 
-    # Sanitize name and policy number for safe filename creation using consistent method
-    import sys
-    sys.path.append('.')
-    try:
-        from filename_utils import sanitize_filename
-        safe_name = sanitize_filename(name)
-        safe_policy = sanitize_filename(str(policy_no))
-    except ImportError:
-        # Fallback to original method if filename_utils not available
-        safe_name = re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')
-        safe_policy = re.sub(r'[^\w\s-]', '_', str(policy_no)).strip()
+    # File names were planned for the whole batch before the loop (output_plan.py)
+    safe_name = output_plan.at[index, 'safe_name']
+    safe_policy = output_plan.at[index, 'safe_policy']
 
     # Generate QR Code for payment
     if total_rows > 1000 and current_row % 50 == 0:
@@ -410,11 +428,11 @@ for index, row in df.iterrows():
         if total_rows > 1000 and current_row % 50 == 0:
             print(f"[PROGRESS] Row {current_row}: Making API call for QR code...")
         
-        response = requests.post(
+        response = HttpClients.zwennpay().post(
             "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
             headers={"accept": "text/plain", "Content-Type": "application/json"},
             json=payload,
-            timeout=20
+            timeout=HttpClients.timeout(20)
         )
         
         if response.status_code == 200:
@@ -424,7 +442,8 @@ for index, row in df.iterrows():
                 continue
                 
             qr = segno.make(qr_data, error='L')
-            qr_filename = f"qr_{safe_policy}.png"
+            # Row number keeps the name unique while an earlier row's file awaits removal
+            qr_filename = f"qr_{index + 1}_{safe_policy}.png"
             qr.save(qr_filename, scale=8, border=2, dark='#000000')
         else:
             print(f"❌ API request failed for {name}: {response.status_code} - {response.text}")
@@ -438,14 +457,18 @@ for index, row in df.iterrows():
         continue
 
     # Create PDF filenames for both protected and unprotected versions
-    protected_pdf_filename = f"{protected_folder}/{index+1:03d}_{safe_policy}_{safe_name}.pdf"
-    unprotected_pdf_filename = f"{unprotected_folder}/{index+1:03d}_{safe_policy}_{safe_name}.pdf"
+    protected_pdf_filename = f"{protected_folder}/{output_plan.at[index, 'file']}"
+    unprotected_pdf_filename = f"{unprotected_folder}/{output_plan.at[index, 'file']}"
     
     if total_rows > 1000 and current_row % 50 == 0:
         print(f"[PROGRESS] Row {current_row}: Creating PDF document...")
     
     # Create unprotected PDF first
-    c = canvas.Canvas(unprotected_pdf_filename, pagesize=A4)
+    # invariant: fixed creation date and file ID, so an unchanged letter renders to
+    # the same bytes and a rerun links it from the blob store instead of writing it
+    c = canvas.Canvas(unprotected_pdf_filename, pagesize=A4, pageCompression=letter_profile.page_compression, invariant=1)
+    if font_subset:
+        font_subset.apply(c)
     width, height = A4
     margin = 50
     bottom_margin = 60  # Increased for pre-printed stationery address space
@@ -455,8 +478,7 @@ for index, row in df.iterrows():
     date_top_y = y_pos
 
     # Add arrears processing date from Excel file
-    date_para = Paragraph(f"{arrears_date_formatted}", styles['SalutationText'])
-    date_para.wrapOn(c, width - margin, height)
+    date_para = layout_paragraph(f"{arrears_date_formatted}", styles['SalutationText'], width - margin)
     date_para.drawOn(c, margin, y_pos - date_para.height)
     y_pos -= date_para.height + 12
 
@@ -481,29 +503,25 @@ for index, row in df.iterrows():
         address_lines.append(str(owner1_address4))
     
     for line in address_lines:
-        addr_para = Paragraph(line.upper(), styles['SalutationText'])
-        addr_para.wrapOn(c, width - 2 * margin, height)
+        addr_para = layout_paragraph(line.upper(), styles['SalutationText'], width - 2 * margin)
         addr_para.drawOn(c, margin, y_pos - addr_para.height)
         y_pos -= addr_para.height + 6
     y_pos -= 8  # Increased space between address and salutation
 
     # Add salutation - static for JPH
     salutation_text = "Dear Valued Customers,"
-    salutation = Paragraph(salutation_text, styles['BodyText'])
-    salutation.wrapOn(c, width - 2 * margin, height)
+    salutation = layout_paragraph(salutation_text, styles['BodyText'], width - 2 * margin)
     salutation.drawOn(c, margin, y_pos - salutation.height)
     y_pos -= salutation.height + 4
 
     # Add subject line
-    subject = Paragraph("RE: ARREARS ON YOUR LIFE INSURANCE POLICY", styles['BoldText'])
-    subject.wrapOn(c, width - 2 * margin, height)
+    subject = layout_paragraph("RE: ARREARS ON YOUR LIFE INSURANCE POLICY", styles['BoldText'], width - 2 * margin)
     subject.drawOn(c, margin, y_pos - subject.height)
     y_pos -= subject.height + 4
 
     # Add new introductory paragraph (matching new format)
     intro_text = f"At NIC, we value the trust you have placed in us to protect what matters most— your financial future & that of your loved ones. We are writing to remind you that your life insurance policy shows a <font name='Cambria-Bold'>premium amount in arrears as shown below:</font>"
-    intro = Paragraph(intro_text, styles['BodyText'])
-    intro.wrapOn(c, width - 2 * margin, height)
+    intro = layout_paragraph(intro_text, styles['BodyText'], width - 2 * margin)
     intro.drawOn(c, margin, y_pos - intro.height)
     y_pos -= intro.height + 8  # Increased breathing space before table
 
@@ -542,8 +560,7 @@ for index, row in df.iterrows():
 
     # Add new body content (matching new format)
     text1 = "Keeping your policy up to date is not only about making a payment. It ensures:"
-    para1 = Paragraph(text1, styles['BodyText'])
-    para1.wrapOn(c, width - 2 * margin, height)
+    para1 = layout_paragraph(text1, styles['BodyText'], width - 2 * margin)
     para1.drawOn(c, margin, y_pos - para1.height)
     y_pos -= para1.height + 4
 
@@ -559,8 +576,7 @@ for index, row in df.iterrows():
     # Add checkmark bullet points with drawn checkmarks
     # Point 1: Continuity of Protection
     text2 = "<font name='Cambria-Bold'>Continuity of Protection:</font> You and your family remain covered against life's unexpected events. Even a short lapse could mean losing valuable protection just when it is most needed."
-    para2 = Paragraph(text2, styles['BodyText'])
-    para2.wrapOn(c, width - 2 * margin - 25, height)
+    para2 = layout_paragraph(text2, styles['BodyText'], width - 2 * margin - 25)
     # Position checkmark to align with first line of text (lower position)
     draw_checkmark(c, margin + 10, y_pos - 8, 8)
     para2.drawOn(c, margin + 25, y_pos - para2.height)
@@ -568,8 +584,7 @@ for index, row in df.iterrows():
 
     # Point 2: Growth of Your Savings
     text3 = "<font name='Cambria-Bold'>Growth of Your Savings:</font> Every premium contributes to building long-term savings that support your financial goals,be it retirement, children's education, funding your dream project, or financial security."
-    para3 = Paragraph(text3, styles['BodyText'])
-    para3.wrapOn(c, width - 2 * margin - 25, height)
+    para3 = layout_paragraph(text3, styles['BodyText'], width - 2 * margin - 25)
     # Position checkmark to align with first line of text (lower position)
     draw_checkmark(c, margin + 10, y_pos - 8, 8)
     para3.drawOn(c, margin + 25, y_pos - para3.height)
@@ -577,55 +592,47 @@ for index, row in df.iterrows():
 
     # Point 3: Peace of Mind
     text4 = "<font name='Cambria-Bold'>Peace of Mind:</font> By keeping your insurance policy lapse-free and premium up to date, you can live with confidence, knowing that your financial safety net is intact for you and your dear ones."
-    para4 = Paragraph(text4, styles['BodyText'])
-    para4.wrapOn(c, width - 2 * margin - 25, height)
+    para4 = layout_paragraph(text4, styles['BodyText'], width - 2 * margin - 25)
     # Position checkmark to align with first line of text (lower position)
     draw_checkmark(c, margin + 10, y_pos - 8, 8)
     para4.drawOn(c, margin + 25, y_pos - para4.height)
     y_pos -= para4.height + 8  # Breathing space before next paragraph
 
     text6 = "Accordingly we encourage you to settle your outstanding premium at the earliest opportunity to ensure uninterrupted cover and continued growth of your savings and by acting now, you avoid the risk of:"
-    para6 = Paragraph(text6, styles['BodyText'])
-    para6.wrapOn(c, width - 2 * margin, height)
+    para6 = layout_paragraph(text6, styles['BodyText'], width - 2 * margin)
     para6.drawOn(c, margin, y_pos - para6.height)
     y_pos -= para6.height + 3
 
     # Add bullet points for risks (more compact)
     text7 = "• Losing valuable accumulated benefits;"
-    para7 = Paragraph(text7, styles['BodyText'])
-    para7.wrapOn(c, width - 2 * margin - 10, height)
+    para7 = layout_paragraph(text7, styles['BodyText'], width - 2 * margin - 10)
     para7.drawOn(c, margin + 10, y_pos - para7.height)
     y_pos -= para7.height + 2
 
     text8 = "• Facing delays, reinstatement requirements, or medical reviews if the policy lapses; and"
-    para8 = Paragraph(text8, styles['BodyText'])
-    para8.wrapOn(c, width - 2 * margin - 10, height)
+    para8 = layout_paragraph(text8, styles['BodyText'], width - 2 * margin - 10)
     para8.drawOn(c, margin + 10, y_pos - para8.height)
     y_pos -= para8.height + 2
 
     text9 = "• Exposing your loved ones to uncertainty at a time when security matters most."
-    para9 = Paragraph(text9, styles['BodyText'])
-    para9.wrapOn(c, width - 2 * margin - 10, height)
+    para9 = layout_paragraph(text9, styles['BodyText'], width - 2 * margin - 10)
     para9.drawOn(c, margin + 10, y_pos - para9.height)
     y_pos -= para9.height + 6
 
     # Add new line for payment facilities (not a bullet point)
     text_payment_facilities = "Should you wish to avail of a facility to settle your arrears, kindly contact us on +230 602 3315 for assistance."
-    para_payment_facilities = Paragraph(text_payment_facilities, styles['BodyText'])
-    para_payment_facilities.wrapOn(c, width - 2 * margin, height)
+    para_payment_facilities = layout_paragraph(text_payment_facilities, styles['BodyText'], width - 2 * margin)
     para_payment_facilities.drawOn(c, margin, y_pos - para_payment_facilities.height)
     y_pos -= para_payment_facilities.height + 10  # Increased breathing space after this section
 
     # Add "How to Settle Quickly and Easily?" section in black
     text10 = "<font name='Cambria-Bold'>How to Settle Quickly and Easily?</font>"
-    para10 = Paragraph(text10, styles['BoldText'])
-    para10.wrapOn(c, width - 2 * margin, height)
+    para10 = layout_paragraph(text10, styles['BoldText'], width - 2 * margin)
     para10.drawOn(c, margin, y_pos - para10.height)
     y_pos -= para10.height + 3
 
     text11 = "Payment can be made through online, mobile app, branches or bank transfer. For your convenience, you may also settle payments instantly via the MauCAS QR Code (Scan to Pay) below using any mobile banking app such as Juice, MauBank WithMe, Blink, MyT Money, or other supported applications."
-    para11 = Paragraph(text11, styles['BodyText'])
-    para11.wrapOn(c, width - 2 * margin, height)
+    para11 = layout_paragraph(text11, styles['BodyText'], width - 2 * margin)
     para11.drawOn(c, margin, y_pos - para11.height)
     y_pos -= para11.height + 10  # Space before QR code section
 
@@ -635,15 +642,15 @@ for index, row in df.iterrows():
         
         # Add maucas logo (bigger size using available space)
         if os.path.exists("maucas2.jpeg"):
-            img = ImageReader("maucas2.jpeg")
             img_width = 110  # Increased from 85 to 110 for better visibility on letterhead
+            img = letter_profile.image("maucas2.jpeg", img_width)
             img_height = img_width * (img.getSize()[1] / img.getSize()[0])
             logo_x = page_center_x - (img_width / 2)
             c.drawImage(img, logo_x, y_pos - img_height, width=img_width, height=img_height)
             y_pos -= img_height + 2
         elif os.path.exists("maucas.jpeg"):
-            img = ImageReader("maucas.jpeg")
             img_width = 110  # Increased from 85 to 110 for better visibility on letterhead
+            img = letter_profile.image("maucas.jpeg", img_width)
             img_height = img_width * (img.getSize()[1] / img.getSize()[0])
             logo_x = page_center_x - (img_width / 2)
             c.drawImage(img, logo_x, y_pos - img_height, width=img_width, height=img_height)
@@ -652,13 +659,13 @@ for index, row in df.iterrows():
         # Add QR code (optimal size for scanning)
         qr_size = 100  # Back to 100px for reliable scanning
         qr_x = page_center_x - (qr_size / 2)
-        c.drawImage(qr_filename, qr_x, y_pos - qr_size, width=qr_size, height=qr_size)
+        letter_profile.draw_qr(c, qr, qr_filename, qr_x, y_pos - qr_size, qr_size)
         y_pos -= qr_size + 2
         
         # Add ZwennPay logo (smaller size)
         if os.path.exists("zwennPay.jpg"):
-            zwenn_img = ImageReader("zwennPay.jpg")
             zwenn_width = 50  # Smaller for compact layout
+            zwenn_img = letter_profile.image("zwennPay.jpg", zwenn_width)
             zwenn_height = zwenn_width * (zwenn_img.getSize()[1] / zwenn_img.getSize()[0])
             zwenn_x = page_center_x - (zwenn_width / 2)
             c.drawImage(zwenn_img, zwenn_x, y_pos - zwenn_height, width=zwenn_width, height=zwenn_height)
@@ -674,31 +681,31 @@ for index, row in df.iterrows():
     footer_start_y = y_pos - 2
     
     # Compact footer format
-    footer1 = Paragraph(
+    footer1 = layout_paragraph(
         "<i>If you have already settled this amount, please accept our thanks and disregard this reminder.</i>",
-        styles['BodyText']
+        styles['BodyText'],
+        width - 2 * margin
     )
-    footer1.wrapOn(c, width - 2 * margin, height)
     footer1.drawOn(c, margin, footer_start_y - footer1.height)
 
     # Add NIC tagline (with more breathing space)
     tagline_y_pos = footer_start_y - footer1.height - 6  # Increased breathing space before tagline
-    tagline = Paragraph(
+    tagline = layout_paragraph(
         "We appreciate your commitment for protection and financial wellbeing<br/><font name='Cambria-Bold'>NIC - Serving you, Serving the Nation</font>",
-        styles['BodyText']
+        styles['BodyText'],
+        width - 2 * margin
     )
-    tagline.wrapOn(c, width - 2 * margin, height)
     tagline.drawOn(c, margin, tagline_y_pos - tagline.height)
     
     # Add assignee surname if present (between NIC tagline and computer generated statement)
     assignee_y_pos = tagline_y_pos - tagline.height - 8  # Small gap after NIC tagline
     if assignee_surname and pd.notna(assignee_surname) and str(assignee_surname).strip():
         assignee_text = str(assignee_surname).strip()
-        assignee_para = Paragraph(
+        assignee_para = layout_paragraph(
             f"{assignee_text}",
-            styles['BodyText']
+            styles['BodyText'],
+            width - 2 * margin
         )
-        assignee_para.wrapOn(c, width - 2 * margin, height)
         assignee_para.drawOn(c, margin, assignee_y_pos - assignee_para.height)
         assignee_y_pos -= assignee_para.height + 8  # Gap after assignee name
     
@@ -715,27 +722,33 @@ for index, row in df.iterrows():
         textColor=colors.grey
     )
     
-    computer_generated = Paragraph(
+    computer_generated = layout_paragraph(
         "This is a computer generated statement and requires no signature",
-        computer_generated_style
+        computer_generated_style,
+        width - 2 * margin
     )
-    computer_generated.wrapOn(c, width - 2 * margin, height)
     computer_generated.drawOn(c, margin, computer_generated_y_pos - computer_generated.height)
 
     # Save the unprotected PDF
-    c.save()
-    print(f"✅ Unprotected PDF saved: {unprotected_pdf_filename}")
+    letter_pages = c.getPageNumber()
+    unprotected_pdf = c.getpdfdata()
+    output_writer.write(unprotected_pdf_filename, unprotected_pdf)
+    output_writer.submit(record_letter, output_folder, unprotected_pdf_filename, letter_pages, policy_no, address_lines)
+    if font_subset:
+        font_subset.record(unprotected_pdf)
+    print(f"✅ Unprotected PDF queued for writing: {unprotected_pdf_filename}")
 
     # Create password-protected version using customer's NIC
     try:
         if nic and str(nic).strip():
             password = str(nic).strip()
             
-            # Read the unprotected PDF
-            with open(unprotected_pdf_filename, 'rb') as input_file:
-                reader = PdfReader(input_file)
+            # Encrypt the rendered letter in memory - a rerun links the letter
+            # encrypted earlier from the same bytes and password instead
+            def encrypt_letter():
+                reader = PdfReader(io.BytesIO(unprotected_pdf))
                 writer = PdfWriter()
-                
+            
                 # Copy all pages (compatible with both old and new PyPDF2)
                 if PYPDF2_NEW:
                     for page in reader.pages:
@@ -743,33 +756,36 @@ for index, row in df.iterrows():
                 else:
                     for page_num in range(reader.getNumPages()):
                         writer.addPage(reader.getPage(page_num))
-                
+            
                 # Encrypt with NIC as password
                 writer.encrypt(password)
-                
+            
                 # Write password-protected PDF to protected folder
-                with open(protected_pdf_filename, 'wb') as output_file:
-                    writer.write(output_file)
+                protected_pdf = io.BytesIO()
+                writer.write(protected_pdf)
+                return protected_pdf.getvalue()
+            
+            output_writer.write_derived(protected_pdf_filename, unprotected_pdf, password, encrypt_letter)
             
-            print(f"🔒 Protected PDF saved with NIC password: {protected_pdf_filename}")
+            print(f"🔒 Protected PDF queued for writing with NIC password: {protected_pdf_filename}")
         else:
             # If no NIC, copy unprotected version to protected folder
-            import shutil
-            shutil.copy2(unprotected_pdf_filename, protected_pdf_filename)
-            print(f"⚠️ No NIC found for {name}, copied unprotected PDF to both folders")
+            output_writer.link(unprotected_pdf_filename, protected_pdf_filename)
+            print(f"⚠️ No NIC found for {name}, queued a copy of the unprotected PDF for the protected folder")
     except Exception as e:
         print(f"⚠️ Failed to create protected PDF: {str(e)}")
         # If password protection fails, copy unprotected version
         try:
-            import shutil
-            shutil.copy2(unprotected_pdf_filename, protected_pdf_filename)
-            print(f"📄 Copied unprotected PDF to protected folder as fallback")
+            output_writer.link(unprotected_pdf_filename, protected_pdf_filename)
+            print("📄 Queued a copy of the unprotected PDF for the protected folder as fallback")
         except Exception as copy_error:
             print(f"❌ Failed to copy PDF: {str(copy_error)}")
 
+    output_writer.submit(size_report.add, unprotected_pdf_filename, 'unprotected')
+    output_writer.submit(size_report.add, protected_pdf_filename, 'protected')
+
     # Clean up QR code file
-    if os.path.exists(qr_filename):
-        os.remove(qr_filename)
+    output_writer.remove(qr_filename)
 
     if total_rows > 1000 and current_row % 50 == 0:
         print(f"[PROGRESS] Row {current_row}: PDF completed successfully!")
@@ -778,4 +794,13 @@ for index, row in df.iterrows():
     print(f"   📁 Protected: {protected_pdf_filename}")
     print(f"   📁 Unprotected: {unprotected_pdf_filename}")
 
-print(f"🎉 Script completed. Processed {len(df)} rows total.")
\ No newline at end of file
+# Write out the letters still queued before the summaries
+output_writer.close()
+print(output_writer.summary())
+if font_subset:
+    print(font_subset.summary())
+print(size_report.summary(letter_profile.name))
+
+print(f"🎉 Script completed. Processed {len(df)} rows total.")
+if output_writer.errors:
+    sys.exit(1)
\ No newline at end of file
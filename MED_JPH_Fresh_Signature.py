@@ -9,22 +9,29 @@ from datetime import datetime
 if sys.stdout.encoding != 'utf-8':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 import requests
+from api_config import HttpClients
+from letter_index import record_letter
+from letter_blocks import layout_paragraph
+from font_subsets import RunFontSubset
+from preflight import run_preflight, ARREARS_RULES
+from column_manifests import read_policy_sheet, MissingColumnsError
+from output_plan import plan_letters, save_manifest
+from output_profiles import OutputProfile, SizeReport
+from output_writer import OutputWriter
+from blob_store import BlobStore
 import segno
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from reportlab.platypus import Table, TableStyle, Paragraph
+from reportlab.platypus import Table, TableStyle
 from reportlab.lib import colors
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_JUSTIFY
-from reportlab.lib.utils import ImageReader
 from reportlab.lib.colors import gray
 
 import os
-import re
 from datetime import datetime
-from reportlab.lib.utils import ImageReader
 from PyPDF2 import PdfFileReader, PdfFileWriter
 
 # Verify font files exist
@@ -55,6 +62,10 @@ def load_excel_file():
         "temp_uploads/Generic_template.xlsx",  # Case variation in temp
     ]
     
+    # --input <file>: use exactly this file (lazy_letters.py renders one row this way)
+    if '--input' in sys.argv and sys.argv.index('--input') + 1 < len(sys.argv):
+        possible_files = [sys.argv[sys.argv.index('--input') + 1]]
+    
     # Removed dangerous glob fallback to prevent using wrong Excel files
     # Only use specific expected file locations
     
@@ -72,16 +83,9 @@ def load_excel_file():
         if os.path.exists(file_path):
             try:
                 print(f"[INFO] Attempting to load: {file_path}")
-                df = pd.read_excel(file_path, engine='openpyxl')
-                
-                # Validate the file has required columns
-                required_cols = ['Policy No', 'Arrears Amount']
+                # Only the columns this template uses, with compact dtypes (column_manifests.py)
+                df = read_policy_sheet(file_path, 'MED_JPH_Fresh_Signature.py')
                 available_cols = list(df.columns)
-                missing_cols = [col for col in required_cols if col not in available_cols]
-                
-                if missing_cols:
-                    print(f"[WARNING] File {file_path} missing required columns: {missing_cols}")
-                    continue
                 
                 if len(df) == 0:
                     print(f"[WARNING] File {file_path} is empty")
@@ -91,6 +95,9 @@ def load_excel_file():
                 print(f"[OK] Loaded {len(df)} rows with columns: {available_cols}")
                 return df
                 
+            except MissingColumnsError as e:
+                print(f"[WARNING] File {file_path} missing required columns: {e.missing}")
+                continue
             except Exception as e:
                 print(f"[WARNING] Failed to load {file_path}: {str(e)}")
                 continue
@@ -227,11 +234,34 @@ styles['TableTextBold'] = ParagraphStyle(
     alignment=1
 )
 
+# --profile print|email|web: logo resolution, QR rendering and stream compression
+letter_profile = OutputProfile.from_argv(sys.argv)
+size_report = SizeReport()
+# Letters are written by a background thread while the next row renders, through
+# the blob store so a regenerated campaign only writes the letters that changed
+output_writer = OutputWriter(blob_store=BlobStore())
+print(f"[INFO] Output profile: {letter_profile.name}")
+
+# Pre-flight: classify every row up front so rows that would be skipped cost no
+# QR call or render (report: <output>/validation_report.csv)
+df, row_checks = run_preflight(df, ARREARS_RULES, output_folder)
+
+# Plan every output file name up front; the manifest is what SMS links, email
+# and combine use to find the letters
+output_plan = plan_letters(df, 'MED_JPH_Fresh_Signature.py')
+save_manifest(output_folder, output_plan, 'MED_JPH_Fresh_Signature.py')
+
+# --font-subset: give every letter of the run the same embedded font subset so
+# combined files (print batches, combine_pdfs.py) store the fonts only once
+font_subset = RunFontSubset.from_dataframe(df) if '--font-subset' in sys.argv else None
+if font_subset:
+    print(f"[INFO] Run font subset enabled: {len(font_subset.charset)} non-ASCII glyphs shared by all letters")
+
 # Iterate through each row in the DataFrame to process individual policyholder data
-for index, row in df.iterrows():
+# Progress counts the rows left after pre-flight; index is the Excel row, used for naming
+total_rows = len(df)
+for current_row, (index, row) in enumerate(df.iterrows(), 1):
     # Enhanced progress reporting for large files
-    total_rows = len(df)
-    current_row = index + 1
     
     if total_rows > 1000:
         # For large files, show progress every 100 rows
@@ -331,11 +361,6 @@ for index, row in df.iterrows():
     
     print(f"[DEBUG] Full Name (max 24 chars): '{full_name}' (length: {len(full_name)})")
     
-    # Validate required fields
-    if pd.isna(policy_no) or str(policy_no).strip() == '':
-        print(f"⚠️ Skipping row {index + 1}: Missing policy number")
-        continue
-
     # Format values for use in the PDF
     # Handle NaN values in name fields to avoid "nan nan" in PDFs
     name_parts = []
@@ -351,17 +376,9 @@ for index, row in df.iterrows():
     no_installments = no_installments if pd.notna(no_installments) else 0
     gross_premium = float(gross_premium) if pd.notna(gross_premium) else 0.0
 
-    # Sanitize name and policy number for safe filename creation using consistent method
-    import sys
-    sys.path.append('.')
-    try:
-        from filename_utils import sanitize_filename
-        safe_name = sanitize_filename(name)
-        safe_policy = sanitize_filename(str(policy_no))
-    except ImportError:
-        # Fallback to original method if filename_utils not available
-        safe_name = re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')
-        safe_policy = re.sub(r'[^\w\s-]', '_', str(policy_no)).strip()
+    # File names were planned for the whole batch before the loop (output_plan.py)
+    safe_name = output_plan.at[index, 'safe_name']
+    safe_policy = output_plan.at[index, 'safe_policy']
 
     # Generate QR Code for payment
     try:
@@ -401,11 +418,11 @@ for index, row in df.iterrows():
             "AdditionalPurposeTransaction": str(nic)
         }
         
-        response = requests.post(
+        response = HttpClients.zwennpay().post(
             "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
             headers={"accept": "text/plain", "Content-Type": "application/json"},
             json=payload,
-            timeout=20
+            timeout=HttpClients.timeout(20)
         )
         
         if response.status_code == 200:
@@ -415,7 +432,8 @@ for index, row in df.iterrows():
                 continue
                 
             qr = segno.make(qr_data, error='L')
-            qr_filename = f"qr_{safe_policy}.png"
+            # Row number keeps the name unique while an earlier row's file awaits removal
+            qr_filename = f"qr_{index + 1}_{safe_policy}.png"
             qr.save(qr_filename, scale=8, border=2, dark='#000000')
         else:
             print(f"❌ API request failed for {name}: {response.status_code} - {response.text}")
@@ -429,11 +447,15 @@ for index, row in df.iterrows():
         continue
 
     # Create PDF filenames for both protected and unprotected versions
-    protected_pdf_filename = f"{protected_folder}/{index+1:03d}_{safe_policy}_{safe_name}.pdf"
-    unprotected_pdf_filename = f"{unprotected_folder}/{index+1:03d}_{safe_policy}_{safe_name}.pdf"
+    protected_pdf_filename = f"{protected_folder}/{output_plan.at[index, 'file']}"
+    unprotected_pdf_filename = f"{unprotected_folder}/{output_plan.at[index, 'file']}"
     
     # Create unprotected PDF first
-    c = canvas.Canvas(unprotected_pdf_filename, pagesize=A4)
+    # invariant: fixed creation date and file ID, so an unchanged letter renders to
+    # the same bytes and a rerun links it from the blob store instead of writing it
+    c = canvas.Canvas(unprotected_pdf_filename, pagesize=A4, pageCompression=letter_profile.page_compression, invariant=1)
+    if font_subset:
+        font_subset.apply(c)
     width, height = A4
     margin = 50
     bottom_margin = 60  # Increased for pre-printed stationery address space
@@ -533,32 +555,27 @@ for index, row in df.iterrows():
 
     # Add main body text
     body_text1 = f"You are hereby notified that the premiums due by you under the above Policy as on <font name='Cambria-Bold'>{arrears_date_formatted}</font> amount to MUR <font name='Cambria-Bold'>{amount:,.2f}</font>."
-    para1 = Paragraph(body_text1, styles['BodyText'])
-    para1.wrapOn(c, width - 2 * margin, height)
+    para1 = layout_paragraph(body_text1, styles['BodyText'], width - 2 * margin)
     para1.drawOn(c, margin, y_pos - para1.height)
     y_pos -= para1.height + 12
 
     body_text2 = "You may wish to verify payments effected one month before and one month after the periods mentioned above given that premiums received will not set off against the oldest installment(s) due."
-    para2 = Paragraph(body_text2, styles['BodyText'])
-    para2.wrapOn(c, width - 2 * margin, height)
+    para2 = layout_paragraph(body_text2, styles['BodyText'], width - 2 * margin)
     para2.drawOn(c, margin, y_pos - para2.height)
     y_pos -= para2.height + 12
 
     body_text3 = "You are hereby further notified that, as provided by law and as set out in your contract, should you not pay the <font name='Cambria-Bold'>total</font> premium amount due within 20 days of the date of receipt of the present Mise en Demeure, the Policy cover shall be suspended as from the 21st day until noon the day on which you pay the <font name='Cambria-Bold'>total</font> premiums in arrears."
-    para3 = Paragraph(body_text3, styles['BodyText'])
-    para3.wrapOn(c, width - 2 * margin, height)
+    para3 = layout_paragraph(body_text3, styles['BodyText'], width - 2 * margin)
     para3.drawOn(c, margin, y_pos - para3.height)
     y_pos -= para3.height + 12
 
     body_text4 = "Should the premiums remain unpaid for a further 10 days after the expiry of the above-mentioned delay of 20 days, we hereby inform you that we shall consider the above Policy as cancelled as per the article 1983-84 al.2 which states that 'Le défaut de paiement d'une prime dû pour sanction, après accomplissement des formalités prescrites par l'article 1983-81, que la résiliation pure et simple de l'assurance ou la réduction de ses effets' with effect from the expiry of the aforesaid period of 10 days."
-    para4 = Paragraph(body_text4, styles['BodyText'])
-    para4.wrapOn(c, width - 2 * margin, height)
+    para4 = layout_paragraph(body_text4, styles['BodyText'], width - 2 * margin)
     para4.drawOn(c, margin, y_pos - para4.height)
     y_pos -= para4.height + 12
 
     text11 = "Payment can be made through online, mobile app, branches or bank transfer. For your convenience, you may also settle payments instantly via the MauCAS QR Code (Scan to Pay) below using any mobile banking app such as Juice, MauBank WithMe, Blink, MyT Money, or other supported applications."
-    para11 = Paragraph(text11, styles['BodyText'])
-    para11.wrapOn(c, width - 2 * margin, height)
+    para11 = layout_paragraph(text11, styles['BodyText'], width - 2 * margin)
     para11.drawOn(c, margin, y_pos - para11.height)
     y_pos -= para11.height + 10  # Space before QR code section
 
@@ -568,15 +585,15 @@ for index, row in df.iterrows():
         
         # Add maucas logo (same size as QR code for visual balance)
         if os.path.exists("maucas2.jpeg"):
-            img = ImageReader("maucas2.jpeg")
             img_width = 100  # Match QR code size for visual balance
+            img = letter_profile.image("maucas2.jpeg", img_width)
             img_height = img_width * (img.getSize()[1] / img.getSize()[0])
             logo_x = page_center_x - (img_width / 2)
             c.drawImage(img, logo_x, y_pos - img_height, width=img_width, height=img_height)
             y_pos -= img_height + 2
         elif os.path.exists("maucas.jpeg"):
-            img = ImageReader("maucas.jpeg")
             img_width = 100  # Match QR code size for visual balance
+            img = letter_profile.image("maucas.jpeg", img_width)
             img_height = img_width * (img.getSize()[1] / img.getSize()[0])
             logo_x = page_center_x - (img_width / 2)
             c.drawImage(img, logo_x, y_pos - img_height, width=img_width, height=img_height)
@@ -585,13 +602,13 @@ for index, row in df.iterrows():
         # Add QR code (optimal size for scanning)
         qr_size = 100  # Back to 100px for reliable scanning
         qr_x = page_center_x - (qr_size / 2)
-        c.drawImage(qr_filename, qr_x, y_pos - qr_size, width=qr_size, height=qr_size)
+        letter_profile.draw_qr(c, qr, qr_filename, qr_x, y_pos - qr_size, qr_size)
         y_pos -= qr_size + 2
         
         # Add ZwennPay logo (smaller size)
         if os.path.exists("zwennPay.jpg"):
-            zwenn_img = ImageReader("zwennPay.jpg")
             zwenn_width = 50  # Smaller for compact layout
+            zwenn_img = letter_profile.image("zwennPay.jpg", zwenn_width)
             zwenn_height = zwenn_width * (zwenn_img.getSize()[1] / zwenn_img.getSize()[0])
             zwenn_x = page_center_x - (zwenn_width / 2)
             c.drawImage(zwenn_img, zwenn_x, y_pos - zwenn_height, width=zwenn_width, height=zwenn_height)
@@ -605,14 +622,12 @@ for index, row in df.iterrows():
 
     # Add footer text
     footer_text1 = "Please accept our apologies and kindly disregard this notice if payment has already been made by the time it reaches you."
-    para_footer1 = Paragraph(footer_text1, styles['BodyText'])
-    para_footer1.wrapOn(c, width - 2 * margin, height)
+    para_footer1 = layout_paragraph(footer_text1, styles['BodyText'], width - 2 * margin)
     para_footer1.drawOn(c, margin, y_pos - para_footer1.height)
     y_pos -= para_footer1.height + 12
 
     footer_text2 = "Should you require any additional information, please do not hesitate to email us on <font name='Cambria' size='11'><u>nicarlife@nicl.mu</u></font> or call our Recovery Department on 602-3315."
-    para_footer2 = Paragraph(footer_text2, styles['BodyText'])
-    para_footer2.wrapOn(c, width - 2 * margin, height)
+    para_footer2 = layout_paragraph(footer_text2, styles['BodyText'], width - 2 * margin)
     para_footer2.drawOn(c, margin, y_pos - para_footer2.height)
     y_pos -= para_footer2.height + 20
 
@@ -625,51 +640,57 @@ for index, row in df.iterrows():
     # Add computer generated disclaimer with 3 line space below
     y_pos -= 20  # Add some space after assignee surname
     disclaimer_text = "This is a computer generated letter and does not require authentication."
-    disclaimer_para = Paragraph(disclaimer_text, styles['disclaimerText'])
-    disclaimer_para.wrapOn(c, width - 2 * margin, height)
+    disclaimer_para = layout_paragraph(disclaimer_text, styles['disclaimerText'], width - 2 * margin)
     disclaimer_para.drawOn(c, margin, y_pos - disclaimer_para.height)
     
     # Ensure 3 lines of space below disclaimer (approximately 42 points = 3 lines at 14pt spacing)
     y_pos -= disclaimer_para.height + 42
 
     # Save the unprotected PDF
-    c.save()
-    print(f"✅ Unprotected PDF saved: {unprotected_pdf_filename}")
+    letter_pages = c.getPageNumber()
+    unprotected_pdf = c.getpdfdata()
+    output_writer.write(unprotected_pdf_filename, unprotected_pdf)
+    output_writer.submit(record_letter, output_folder, unprotected_pdf_filename, letter_pages, policy_no, address_lines)
+    if font_subset:
+        font_subset.record(unprotected_pdf)
+    print(f"✅ Unprotected PDF queued for writing: {unprotected_pdf_filename}")
 
     # Create password-protected version using customer's NIC
     try:
         if nic and str(nic).strip():
             password = str(nic).strip()
             
-            # Read the unprotected PDF
-            with open(unprotected_pdf_filename, 'rb') as input_file:
-                reader = PdfFileReader(input_file)
+            # Encrypt the rendered letter in memory - a rerun links the letter
+            # encrypted earlier from the same bytes and password instead
+            def encrypt_letter():
+                reader = PdfFileReader(io.BytesIO(unprotected_pdf))
                 writer = PdfFileWriter()
-                
+            
                 # Copy all pages
                 for page_num in range(reader.getNumPages()):
                     writer.addPage(reader.getPage(page_num))
-                
+            
                 # Encrypt with NIC as password
                 writer.encrypt(password)
-                
+            
                 # Write password-protected PDF to protected folder
-                with open(protected_pdf_filename, 'wb') as output_file:
-                    writer.write(output_file)
+                protected_pdf = io.BytesIO()
+                writer.write(protected_pdf)
+                return protected_pdf.getvalue()
+            
+            output_writer.write_derived(protected_pdf_filename, unprotected_pdf, password, encrypt_letter)
             
-            print(f"🔒 Protected PDF saved with NIC password: {protected_pdf_filename}")
+            print(f"🔒 Protected PDF queued for writing with NIC password: {protected_pdf_filename}")
         else:
             # If no NIC, copy unprotected version to protected folder
-            import shutil
-            shutil.copy2(unprotected_pdf_filename, protected_pdf_filename)
-            print(f"⚠️ No NIC found for {name}, copied unprotected PDF to both folders")
+            output_writer.link(unprotected_pdf_filename, protected_pdf_filename)
+            print(f"⚠️ No NIC found for {name}, queued a copy of the unprotected PDF for the protected folder")
     except Exception as e:
         print(f"⚠️ Failed to create protected PDF: {str(e)}")
         # If password protection fails, copy unprotected version
         try:
-            import shutil
-            shutil.copy2(unprotected_pdf_filename, protected_pdf_filename)
-            print(f"📄 Copied unprotected PDF to protected folder as fallback")
+            output_writer.link(unprotected_pdf_filename, protected_pdf_filename)
+            print("📄 Queued a copy of the unprotected PDF for the protected folder as fallback")
         except Exception as copy_error:
             print(f"❌ Failed to copy PDF: {str(copy_error)}")
 
@@ -677,10 +698,21 @@ for index, row in df.iterrows():
     print(f"   📁 Protected: {protected_pdf_filename}")
     print(f"   📁 Unprotected: {unprotected_pdf_filename}")
 
+    output_writer.submit(size_report.add, unprotected_pdf_filename, 'unprotected')
+    output_writer.submit(size_report.add, protected_pdf_filename, 'protected')
+
     # Clean up QR code file
-    if os.path.exists(qr_filename):
-        os.remove(qr_filename)
+    output_writer.remove(qr_filename)
 
     print(f"✅ PDF generated successfully for {name}")
 
-print(f"🎉 Script completed. Processed {len(df)} rows total.")
\ No newline at end of file
+# Write out the letters still queued before the summaries
+output_writer.close()
+print(output_writer.summary())
+if font_subset:
+    print(font_subset.summary())
+print(size_report.summary(letter_profile.name))
+
+print(f"🎉 Script completed. Processed {len(df)} rows total.")
+if output_writer.errors:
+    sys.exit(1)
\ No newline at end of file
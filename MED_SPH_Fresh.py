@@ -9,10 +9,12 @@ from datetime import datetime
 if sys.stdout.encoding != 'utf-8':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 import requests
+from api_config import HttpClients
+from letter_blocks import layout_paragraph
 import segno
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from reportlab.platypus import Table, TableStyle, Paragraph
+from reportlab.platypus import Table, TableStyle
 from reportlab.lib import colors
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
@@ -324,11 +326,11 @@ for index, row in df.iterrows():
             "AdditionalPurposeTransaction": str(nic)
         }
         
-        response = requests.post(
+        response = HttpClients.zwennpay().post(
             "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
             headers={"accept": "text/plain", "Content-Type": "application/json"},
             json=payload,
-            timeout=20
+            timeout=HttpClients.timeout(20)
         )
         
         if response.status_code == 200:
@@ -439,32 +441,27 @@ for index, row in df.iterrows():
 
     # Add main body text
     body_text1 = f"You are hereby notified that the premiums due by you under the above Policy as on {arrears_date_formatted} amounts to MUR {amount:,.2f}."
-    para1 = Paragraph(body_text1, styles['BodyText'])
-    para1.wrapOn(c, width - 2 * margin, height)
+    para1 = layout_paragraph(body_text1, styles['BodyText'], width - 2 * margin)
     para1.drawOn(c, margin, y_pos - para1.height)
     y_pos -= para1.height + 12
 
     body_text2 = "You may wish to verify payments effected one month before and one month after the periods mentioned above given that premiums received will not set off against the oldest installment(s) due."
-    para2 = Paragraph(body_text2, styles['BodyText'])
-    para2.wrapOn(c, width - 2 * margin, height)
+    para2 = layout_paragraph(body_text2, styles['BodyText'], width - 2 * margin)
     para2.drawOn(c, margin, y_pos - para2.height)
     y_pos -= para2.height + 12
 
     body_text3 = "You are hereby further notified that, as provided by law and as set out in your contract, should you not pay the <font name='Cambria-Bold'>total</font> premium amount due within <font name='Cambria-Bold'>20 days</font> of the date of receipt of the present Mise en Demeure, the Policy cover shall be suspended as from the 21st day until noon the day on which you pay the total premiums in arrears."
-    para3 = Paragraph(body_text3, styles['BodyText'])
-    para3.wrapOn(c, width - 2 * margin, height)
+    para3 = layout_paragraph(body_text3, styles['BodyText'], width - 2 * margin)
     para3.drawOn(c, margin, y_pos - para3.height)
     y_pos -= para3.height + 12
 
     body_text4 = "Should the premiums remain unpaid for a further 10 days after the expiry of the above-mentioned delay of 20 days, we hereby inform you that we shall consider the above Policy as cancelled as per the article 1983-84 al.2 which states that 'Le défaut de paiement d'une prime dû pour sanction, après accomplissement des formalités prescrites par l'article 1983-81, que la résiliation pure et simple de l'assurance ou la réduction de ses effets' with effect from the expiry of the aforesaid period of 10 days."
-    para4 = Paragraph(body_text4, styles['BodyText'])
-    para4.wrapOn(c, width - 2 * margin, height)
+    para4 = layout_paragraph(body_text4, styles['BodyText'], width - 2 * margin)
     para4.drawOn(c, margin, y_pos - para4.height)
     y_pos -= para4.height + 12
 
     body_text5 = "For your convenience, you may now settle payments via the QR code below using apps such as Juice or MyT Money."
-    para5 = Paragraph(body_text5, styles['BodyText'])
-    para5.wrapOn(c, width - 2 * margin, height)
+    para5 = layout_paragraph(body_text5, styles['BodyText'], width - 2 * margin)
     para5.drawOn(c, margin, y_pos - para5.height)
     y_pos -= para5.height + 10
 
@@ -489,14 +486,12 @@ for index, row in df.iterrows():
 
     # Add footer text
     footer_text1 = "Please accept our apologies and kindly disregard this notice if payment has already been made by the time it reaches you."
-    para_footer1 = Paragraph(footer_text1, styles['BodyText'])
-    para_footer1.wrapOn(c, width - 2 * margin, height)
+    para_footer1 = layout_paragraph(footer_text1, styles['BodyText'], width - 2 * margin)
     para_footer1.drawOn(c, margin, y_pos - para_footer1.height)
     y_pos -= para_footer1.height + 12
 
     footer_text2 = "Should you require any additional information, please do not hesitate to email us on nicarlife@nicl.mu or call our Recovery Department on 602-3315."
-    para_footer2 = Paragraph(footer_text2, styles['BodyText'])
-    para_footer2.wrapOn(c, width - 2 * margin, height)
+    para_footer2 = layout_paragraph(footer_text2, styles['BodyText'], width - 2 * margin)
     para_footer2.drawOn(c, margin, y_pos - para_footer2.height)
     y_pos -= para_footer2.height + 20
 
@@ -508,8 +503,7 @@ for index, row in df.iterrows():
 
     # Add disclaimer at bottom
     disclaimer_text = "This is a computer-generated letter and does not require authentication."
-    para_disclaimer = Paragraph(disclaimer_text, styles['disclaimerText'])
-    para_disclaimer.wrapOn(c, width - 2 * margin, height)
+    para_disclaimer = layout_paragraph(disclaimer_text, styles['disclaimerText'], width - 2 * margin)
     para_disclaimer.drawOn(c, margin, bottom_margin)
 
     # Save the PDF
@@ -6,7 +6,7 @@ Generates 2-page motor insurance renewal notices with KYC declaration
 
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
@@ -14,11 +14,15 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_JUSTIFY
 from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import Paragraph
 from PyPDF2 import PdfFileWriter, PdfFileReader
 import pandas as pd
 import requests
+from api_config import HttpClients
+from letter_blocks import layout_paragraph
+from preflight import run_preflight, blank, MOTOR_RULES
+from column_manifests import read_policy_sheet
+from output_plan import plan_outputs, joined_text, save_manifest, motor_safe_name, motor_safe_policy
+from date_columns import parse_date_column, format_date_column, renewal_period, MOTOR_DATE_FORMATS
 import segno
 
 # Verify font files exist
@@ -54,7 +58,7 @@ def create_motor_renewal_pdf():
     
     # Read Excel file
     try:
-        df = pd.read_excel('output_motor_renewal.xlsx')
+        df = read_policy_sheet('output_motor_renewal.xlsx', 'Motor_Insurance_Renewal.py')
         print(f"📊 Loaded {len(df)} records from output_motor_renewal.xlsx")
     except FileNotFoundError:
         print("❌ Error: output_motor_renewal.xlsx not found!")
@@ -63,8 +67,27 @@ def create_motor_renewal_pdf():
         print(f"❌ Error reading Excel file: {str(e)}")
         return
     
-    # Process each row
-    for index, row in df.iterrows():
+    # Parse Cover End Dt for the whole listing at once and derive the renewal
+    # period column-wise (the per-row loop only looks the results up)
+    cover_end_dates = parse_date_column(df.get('Cover End Dt', pd.Series(index=df.index, dtype=object)), MOTOR_DATE_FORMATS)
+    renewal_start_dates, renewal_end_dates = renewal_period(cover_end_dates)
+    expiry_text = format_date_column(cover_end_dates)
+    renewal_start_text = format_date_column(renewal_start_dates)
+    renewal_end_text = format_date_column(renewal_end_dates)
+    
+    # Pre-flight: drop rows that would be skipped before any QR call or render
+    unparsed_cover_end = ('skip', "Could not parse 'Cover End Dt'",
+                          lambda df: ~blank(df, 'Cover End Dt') & cover_end_dates.isna())
+    df, row_checks = run_preflight(df, MOTOR_RULES + [unparsed_cover_end], output_dir)
+    
+    # Plan every output file name up front - repeated name/policy pairs get a
+    # numeric suffix instead of overwriting each other
+    output_plan = plan_outputs(joined_text(df, ['Policy No']), joined_text(df, ['Title', 'Firstname', 'Surname']),
+                               'Motor_Renewal_{name}_{policy}', output_dir, motor_safe_name, motor_safe_policy)
+    save_manifest(output_dir, output_plan, 'Motor_Insurance_Renewal.py')
+    
+    # Process each row; current_row counts the rows left after pre-flight, index is the Excel row
+    for current_row, (index, row) in enumerate(df.iterrows(), 1):
         try:
             # Helper function to safely get and clean data
             def safe_get(column_name, default=''):
@@ -73,18 +96,8 @@ def create_motor_renewal_pdf():
                     return default
                 return str(value).strip()
             
-            # Validate New Net Premium - skip record if non-numeric
+            # Non-numeric New Net Premium rows were dropped by pre-flight (MOTOR_RULES)
             new_net_premium_raw = safe_get('New Net Premium')
-            try:
-                # Try to convert to float to check if it's numeric
-                float(new_net_premium_raw.replace(',', ''))  # Remove commas for validation
-                is_numeric_premium = True
-            except (ValueError, AttributeError):
-                is_numeric_premium = False
-            
-            if not is_numeric_premium or not new_net_premium_raw.strip():
-                print(f"⚠️ Skipping record {index+1}: Non-numeric or empty 'New Net Premium' value: '{new_net_premium_raw}' for {safe_get('Title')} {safe_get('Firstname')} {safe_get('Surname')}")
-                continue
             
             # Map Excel columns to policy data
             policy_data = {
@@ -117,43 +130,16 @@ def create_motor_renewal_pdf():
                 # Parse Cover End Dt (assuming it's in a standard date format)
                 cover_end_str = policy_data['cover_end_dt']
                 if cover_end_str:
-                    # Try different date and datetime formats
-                    date_formats = [
-                        '%Y-%m-%d %H:%M:%S',  # 2025-12-03 23:59:00
-                        '%Y-%m-%d %H:%M',     # 2025-12-03 23:59
-                        '%Y-%m-%d',           # 2025-12-03
-                        '%d/%m/%Y %H:%M:%S',  # 03/12/2025 23:59:00
-                        '%d/%m/%Y %H:%M',     # 03/12/2025 23:59
-                        '%d/%m/%Y',           # 03/12/2025
-                        '%d-%m-%Y %H:%M:%S',  # 03-12-2025 23:59:00
-                        '%d-%m-%Y %H:%M',     # 03-12-2025 23:59
-                        '%d-%m-%Y',           # 03-12-2025
-                        '%d %B %Y',           # 03 December 2025
-                        '%d %b %Y'            # 03 Dec 2025
-                    ]
-                    
-                    cover_end_date = None
-                    for date_format in date_formats:
-                        try:
-                            cover_end_date = datetime.strptime(cover_end_str, date_format)
-                            break
-                        except ValueError:
-                            continue
-                    
-                    if cover_end_date is None:
-                        # If no format works, skip this record
+                    # Parsed for the whole listing before the loop; unparseable dates
+                    # were already skipped by the pre-flight check
+                    if pd.isna(cover_end_dates.at[index]):
                         print(f"❌ Skipping record {index+1}: Could not parse Cover End Dt '{cover_end_str}' for {policy_data['name']}")
                         continue
                     
-                    # Calculate renewal start (next day after cover end)
-                    renewal_start_date = cover_end_date + timedelta(days=1)
-                    # Calculate renewal end (1 day less than 1 year from renewal start)
-                    renewal_end_date = renewal_start_date + timedelta(days=364)
-                    
-                    # Format dates for display
-                    policy_data['expiry_date'] = cover_end_date.strftime('%d %B %Y')
-                    policy_data['renewal_start'] = renewal_start_date.strftime('%d %B %Y')
-                    policy_data['renewal_end'] = renewal_end_date.strftime('%d %B %Y')
+                    # Renewal starts the day after cover end and ends 364 days later
+                    policy_data['expiry_date'] = expiry_text.at[index]
+                    policy_data['renewal_start'] = renewal_start_text.at[index]
+                    policy_data['renewal_end'] = renewal_end_text.at[index]
                 else:
                     # Fallback if Cover End Dt is empty
                     policy_data['expiry_date'] = safe_get('Expiry Date')
@@ -170,47 +156,9 @@ def create_motor_renewal_pdf():
             vehicle_desc = f"COMPREHENSIVE COVER\n{policy_data['make']} {policy_data['model']}\n{policy_data['vehicle_no']}\n{policy_data['chassis_no']}"
             policy_data['vehicle_desc'] = vehicle_desc
             
-            # Generate PDF filename in output_motor folder with enhanced character cleaning
-            import re
-            # Clean name by removing/replacing problematic characters
-            safe_name = policy_data['name']
-            # Replace common problematic characters
-            safe_name = safe_name.replace('â€"', '-')  # Replace em dash
-            safe_name = safe_name.replace('–', '-')    # Replace en dash
-            safe_name = safe_name.replace('—', '-')    # Replace em dash
-            safe_name = safe_name.replace('"', '')     # Remove quotes
-            safe_name = safe_name.replace('"', '')     # Remove smart quotes left
-            safe_name = safe_name.replace('"', '')     # Remove smart quotes right
-            safe_name = safe_name.replace("'", '')     # Remove smart apostrophes
-            safe_name = safe_name.replace('`', '')     # Remove backticks
-            # Remove any remaining non-ASCII characters and replace with underscore
-            safe_name = re.sub(r'[^\x00-\x7F]+', '_', safe_name)
-            # Replace spaces and path separators
-            safe_name = safe_name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-            # Remove multiple consecutive underscores
-            safe_name = re.sub(r'_+', '_', safe_name)
-            # Remove leading/trailing underscores
-            safe_name = safe_name.strip('_')
-            
-            # Truncate name if too long to prevent Windows path length issues
-            max_name_length = 100  # Leave room for prefix, policy number, and extension
-            if len(safe_name) > max_name_length:
-                safe_name = safe_name[:max_name_length]
-            
-            safe_policy = policy_data['policy_no'].replace('/', '_').replace('\\', '_')
-            
-            # Create filename and check total path length
-            base_filename = f"Motor_Renewal_{safe_name}_{safe_policy}.pdf"
-            pdf_filename = os.path.join(output_dir, base_filename)
-            
-            # If path is still too long, truncate further
-            if len(pdf_filename) > 250:  # Leave some buffer under 260 char limit
-                # Calculate how much to truncate
-                excess = len(pdf_filename) - 250
-                new_name_length = max(20, len(safe_name) - excess)  # Minimum 20 chars for name
-                safe_name = safe_name[:new_name_length]
-                base_filename = f"Motor_Renewal_{safe_name}_{safe_policy}.pdf"
-                pdf_filename = os.path.join(output_dir, base_filename)
+            # File name planned for the whole listing before the loop (output_plan.py)
+            safe_name = output_plan.at[index, 'safe_name']
+            pdf_filename = os.path.join(output_dir, output_plan.at[index, 'file'])
             
             # Generate QR Code for payment using API
             try:
@@ -268,11 +216,11 @@ def create_motor_renewal_pdf():
                     "AdditionalPurposeTransaction": str(policy_data['nic'])
                 }
                 
-                response = requests.post(
+                response = HttpClients.zwennpay().post(
                     "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
                     headers={"accept": "text/plain", "Content-Type": "application/json"},
                     json=payload,
-                    timeout=20
+                    timeout=HttpClients.timeout(20)
                 )
                 
                 if response.status_code == 200:
@@ -342,7 +290,7 @@ def create_motor_renewal_pdf():
                 # Remove temporary file
                 if os.path.exists(temp_filename):
                     os.remove(temp_filename)
-                print(f"🔒 PDF {index+1}/{len(df)}: {os.path.basename(pdf_filename)} - Password protected (12345)")
+                print(f"🔒 PDF {current_row}/{len(df)}: {os.path.basename(pdf_filename)} - Password protected (12345)")
             except Exception as e:
                 print(f"⚠️ Failed to add password protection for {pdf_filename}: {str(e)}")
                 # If password protection fails, ensure we still have the original PDF
@@ -487,40 +435,35 @@ def create_page2_kyc(c, data, qr_filename):
     # Point (a)
     c.drawString(indent_letter, y_pos, "(a)")
     text_a = "there has been no change in the information and due diligence (KYC) documentation previously submitted by me/us to the Company, including details pertaining to my/our financial and professional profile and other personal details such as name, address, mobile number, occupation, status, motor vehicle details etc."
-    para_a = Paragraph(text_a, justified_style)
-    para_a.wrapOn(c, text_width, 100)
+    para_a = layout_paragraph(text_a, justified_style, text_width)
     para_a.drawOn(c, indent_text, y_pos - para_a.height + 10)
     y_pos -= para_a.height + 8
     
     # Point (b)
     c.drawString(indent_letter, y_pos, "(b)")
     text_b = "the statement made and the information supplied in this questionnaire are correct and there are no other facts that are relevant to the Company for assessing my/our profile(s);"
-    para_b = Paragraph(text_b, justified_style)
-    para_b.wrapOn(c, text_width, 100)
+    para_b = layout_paragraph(text_b, justified_style, text_width)
     para_b.drawOn(c, indent_text, y_pos - para_b.height + 10)
     y_pos -= para_b.height + 8
     
     # Point (c)
     c.drawString(indent_letter, y_pos, "(c)")
     text_c = "the premium that is being paid to the Company comes from my own savings/salary."
-    para_c = Paragraph(text_c, justified_style)
-    para_c.wrapOn(c, text_width, 100)
+    para_c = layout_paragraph(text_c, justified_style, text_width)
     para_c.drawOn(c, indent_text, y_pos - para_c.height + 10)
     y_pos -= para_c.height + 8
     
     # Point (d)
     c.drawString(indent_letter, y_pos, "(d)")
     text_d = "I/We agree to furnish any additional information, as may be required, during the course of this business relationship to the Company to justify whatsoever information including, but not limited to, my/our source of funds or wealth; and"
-    para_d = Paragraph(text_d, justified_style)
-    para_d.wrapOn(c, text_width, 100)
+    para_d = layout_paragraph(text_d, justified_style, text_width)
     para_d.drawOn(c, indent_text, y_pos - para_d.height + 10)
     y_pos -= para_d.height + 8
     
     # Point (e)
     c.drawString(indent_letter, y_pos, "(e)")
     text_e = "I/We declare that I/We do not or am/are not related to anyone who hold any position with a significant influence on public, social or governmental policy nor acting as a senior official in a state owned organization."
-    para_e = Paragraph(text_e, justified_style)
-    para_e.wrapOn(c, text_width, 100)
+    para_e = layout_paragraph(text_e, justified_style, text_width)
     para_e.drawOn(c, indent_text, y_pos - para_e.height + 10)
     y_pos -= para_e.height + 15
     
@@ -643,8 +586,7 @@ def create_page2_renewal(c, data, qr_filename):
         leading=12
     )
     
-    para_main = Paragraph(main_text, justified_style_main)
-    para_main.wrapOn(c, width - 2 * margin, 100)
+    para_main = layout_paragraph(main_text, justified_style_main, width - 2 * margin)
     para_main.drawOn(c, margin, y_pos - para_main.height + 10)
     y_pos -= para_main.height + 10
     
@@ -732,8 +674,7 @@ def create_page2_renewal(c, data, qr_filename):
     # Calculate the width of "Note 1: " label to position text after it
     note1_label_width = c.stringWidth("Note 1: ", "Cambria-Bold", 9)
     note1_text = "The Renewal Premium, which includes applicable fees and charges, is valid as at the date of this letter and may be subject to change in case of any claim intimation arising post issuance of this letter and prior expiry of the present cover."
-    para_note1 = Paragraph(note1_text, justified_style_page1)
-    para_note1.wrapOn(c, text_width_page1 - note1_label_width, 100)
+    para_note1 = layout_paragraph(note1_text, justified_style_page1, text_width_page1 - note1_label_width)
     para_note1.drawOn(c, margin + note1_label_width, y_pos - para_note1.height + 9)
     y_pos -= para_note1.height + 10
     
@@ -743,40 +684,34 @@ def create_page2_renewal(c, data, qr_filename):
     # Calculate the width of "Note 2: " label to position text after it
     note2_label_width = c.stringWidth("Note 2: ", "Cambria-Bold", 9)
     note2_text = "The Proposed Insured's Declared Value (\"IDV\") of the vehicle, including accessories if any fitted thereon, will be deemed to be the 'Sum Insured' for the Motor Insurance Policy and will be the amount insured for your vehicle. It will be the basis to determine the total loss settlements in the event the vehicle is stolen or damaged beyond repair in an accident. However, you will be compensated only for a sum equivalent to the Current Market Value of the insured vehicle at the time of loss and will not be more than the Proposed IDV."
-    para_note2 = Paragraph(note2_text, justified_style_page1)
-    para_note2.wrapOn(c, text_width_page1 - note2_label_width, 100)
+    para_note2 = layout_paragraph(note2_text, justified_style_page1, text_width_page1 - note2_label_width)
     para_note2.drawOn(c, margin + note2_label_width, y_pos - para_note2.height + 9)
     y_pos -= para_note2.height + 10
     
     # Additional paragraphs with justified text
     para1_text = "The Proposed IDV set above is based on a depreciation rate applied to the Expiring IDV. As client, you may wish to review the Proposed IDV and obtain the Current Market Value of the vehicle from an independent Surveyor at your own cost. As Insurer, we recommend that you insure your vehicle at its Current Market Value by taking into consideration all the factors which determine its market value including, but not limited to, its age, mileage and current condition, inclusive of all taxes and charges."
-    para1 = Paragraph(para1_text, justified_style_page1)
-    para1.wrapOn(c, text_width_page1, 100)
+    para1 = layout_paragraph(para1_text, justified_style_page1, text_width_page1)
     para1.drawOn(c, margin, y_pos - para1.height + 9)
     y_pos -= para1.height + 5
     
     para2_text = "Should you wish to insure your vehicle under different terms, you are kindly invited to fill in the table below and to contact us within two weeks prior to expiry of the current Policy. Alternatively, kindly fill in the Renewal Confirmation section and submit the signed Renewal Notice together with payment* or evidence of bank transfer on any of the following Account Numbers: Maubank (060100056724), MCB (000444155732) or SBM (61030100056822) for renewal and issuance of your Policy."
-    para2 = Paragraph(para2_text, justified_style_page1)
-    para2.wrapOn(c, text_width_page1, 100)
+    para2 = layout_paragraph(para2_text, justified_style_page1, text_width_page1)
     para2.drawOn(c, margin, y_pos - para2.height + 9)
     y_pos -= para2.height + 15
     
     para3_text = "*Any outstanding balance on the expiring policy will need to be settled as at the renewal date."
-    para3 = Paragraph(para3_text, justified_style_page1)
-    para3.wrapOn(c, text_width_page1, 100)
+    para3 = layout_paragraph(para3_text, justified_style_page1, text_width_page1)
     para3.drawOn(c, margin, y_pos - para3.height + 9)
     y_pos -= para3.height + 5
     
     para4_text = "For any assistance, please feel free to contact us at the nearest branch office or your Insurance Advisor. Alternatively, you may call us on 602-3385."
-    para4 = Paragraph(para4_text, justified_style_page1)
-    para4.wrapOn(c, text_width_page1, 100)
+    para4 = layout_paragraph(para4_text, justified_style_page1, text_width_page1)
     para4.drawOn(c, margin, y_pos - para4.height + 9)
     y_pos -= para4.height + 5
     
     # Add QR code payment instruction
     para5_text = "For your convenience, you may also settle payments instantly via the MauCAS QR Code (Scan to Pay) below using any mobile banking app such as Juice, MauBank WithMe, Blink, MyT Money, or other supported applications."
-    para5 = Paragraph(para5_text, justified_style_page1)
-    para5.wrapOn(c, text_width_page1, 100)
+    para5 = layout_paragraph(para5_text, justified_style_page1, text_width_page1)
     para5.drawOn(c, margin, y_pos - para5.height + 9)
     y_pos -= para5.height + 8
     
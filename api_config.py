@@ -5,13 +5,109 @@ Contains all API endpoints, payloads, and configuration for reuse across project
 """
 
 import requests
-import json
 import os
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# =============================================================================
+# SHARED HTTP CLIENTS
+# =============================================================================
+
+class HttpClients:
+    """
+    Shared keep-alive HTTP sessions, one per API, so bulk runs reuse TCP+TLS
+    connections instead of paying a handshake per request.
+    
+    Tunable through environment variables:
+        HTTP_POOL_SIZE         connections kept per host (default 10)
+        HTTP_CONNECT_TIMEOUT   seconds to establish a connection (default 5)
+        HTTP_READ_TIMEOUT      default seconds to wait for a response (default 30)
+        HTTP_RETRIES           connection retries per request (default 3)
+    """
+    
+    POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+    CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+    READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+    RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+    
+    _sessions = {}
+    _sdk_clients = {}
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def timeout(read=None):
+        """(connect, read) timeout tuple for requests"""
+        return (HttpClients.CONNECT_TIMEOUT, read if read is not None else HttpClients.READ_TIMEOUT)
+    
+    @staticmethod
+    def _create_session(retry):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HttpClients.POOL_SIZE,
+                              max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    @staticmethod
+    def _get_session(name, retry_factory):
+        session = HttpClients._sessions.get(name)
+        if session is None:
+            with HttpClients._lock:
+                session = HttpClients._sessions.get(name)
+                if session is None:
+                    session = HttpClients._create_session(retry_factory())
+                    HttpClients._sessions[name] = session
+        return session
+    
+    @staticmethod
+    def brevo():
+        """
+        Session for the Brevo API.
+        Only connection errors are retried here (the request never reached Brevo);
+        429 and 5xx responses are left to the email dispatcher.
+        """
+        return HttpClients._get_session('brevo', lambda: Retry(
+            total=HttpClients.RETRIES, connect=HttpClients.RETRIES, read=0, status=0,
+            backoff_factor=0.5, raise_on_status=False
+        ))
+    
+    @staticmethod
+    def zwennpay():
+        """
+        Session for the ZwennPay QR API.
+        QR generation is idempotent, so gateway errors are retried as well.
+        """
+        return HttpClients._get_session('zwennpay', lambda: Retry(
+            total=HttpClients.RETRIES, connect=HttpClients.RETRIES, read=1,
+            status=HttpClients.RETRIES, status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST']),
+            backoff_factor=0.5, raise_on_status=False
+        ))
+    
+    @staticmethod
+    def brevo_sdk(api_key, host=None):
+        """Shared sib_api_v3_sdk TransactionalEmailsApi per (api key, host)"""
+        key = (api_key, host)
+        client = HttpClients._sdk_clients.get(key)
+        if client is None:
+            import sib_api_v3_sdk
+            with HttpClients._lock:
+                client = HttpClients._sdk_clients.get(key)
+                if client is None:
+                    configuration = sib_api_v3_sdk.Configuration()
+                    configuration.api_key['api-key'] = api_key
+                    configuration.connection_pool_maxsize = HttpClients.POOL_SIZE
+                    if host:
+                        configuration.host = host.rstrip('/')
+                    client = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
+                    HttpClients._sdk_clients[key] = client
+        return client
+
 # =============================================================================
 # BREVO EMAIL API CONFIGURATION
 # =============================================================================
@@ -19,8 +115,8 @@ load_dotenv()
 class BrevoAPI:
     """Brevo Email API Configuration and Helper Functions"""
     
-    # API Configuration
-    BASE_URL = "https://api.brevo.com/v3"
+    # API Configuration (BREVO_API_URL points at a local stub such as fake_brevo_server.py)
+    BASE_URL = os.getenv('BREVO_API_URL', "https://api.brevo.com/v3").rstrip('/')
     SEND_EMAIL_ENDPOINT = f"{BASE_URL}/smtp/email"
     
     # Default headers (API key should be set when using)
@@ -93,47 +189,111 @@ class BrevoAPI:
         return payload
     
     @staticmethod
-    def send_email(payload, api_key=None):
+    def send_email(payload, api_key=None, base_url=None):
         """
         Send email via Brevo API
         
         Args:
-            payload (dict): Email payload
+            payload (dict): Email payload (may contain messageVersions for batch sends)
             api_key (str, optional): Brevo API key (if not provided, uses environment variable)
+            base_url (str, optional): API base URL (defaults to BASE_URL)
         
         Returns:
-            dict: API response
+            dict: API response (message_ids is filled for batch sends)
         """
         if api_key is None:
             api_key = BrevoAPI.get_api_key()
+        endpoint = f"{base_url.rstrip('/')}/smtp/email" if base_url else BrevoAPI.SEND_EMAIL_ENDPOINT
         try:
             headers = BrevoAPI.get_headers(api_key)
-            response = requests.post(
-                BrevoAPI.SEND_EMAIL_ENDPOINT,
+            response = HttpClients.brevo().post(
+                endpoint,
                 headers=headers,
                 json=payload,
-                timeout=30
+                timeout=HttpClients.timeout(30)
             )
+            response_json = response.json() if response.content else {}
+            if not isinstance(response_json, dict):
+                response_json = {}
             
             return {
                 "success": response.status_code == 201,
                 "status_code": response.status_code,
-                "response": response.json() if response.content else {},
-                "message_id": response.json().get("messageId") if response.content else None
+                "response": response_json,
+                "message_id": response_json.get("messageId"),
+                "message_ids": response_json.get("messageIds"),
+                "headers": dict(response.headers)
             }
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "status_code": None,
+                "response": {},
+                "message_id": None,
+                "message_ids": None,
+                "headers": {}
+            }
+    
+    @staticmethod
+    def send_email_with_file(payload, attachment_path, attachment_name=None, api_key=None,
+                             base_url=None, timeout=60):
+        """
+        Send email via Brevo API with a file attachment streamed from disk
+        
+        The attachment is base64-encoded chunk by chunk into the request body
+        instead of being held in memory as bytes, base64 and JSON copies.
+        
+        Args:
+            payload (dict): Email payload without attachment
+            attachment_path (str): Path of the file to attach
+            attachment_name (str, optional): Attachment filename (defaults to the file's name)
+            api_key (str, optional): Brevo API key (if not provided, uses environment variable)
+            base_url (str, optional): API base URL (defaults to BASE_URL)
+            timeout (int, optional): Request timeout in seconds
+        
+        Returns:
+            dict: API response, including payload_bytes and response headers
+        """
+        from email_attachments import StreamingEmailBody
+        
+        if api_key is None:
+            api_key = BrevoAPI.get_api_key()
+        endpoint = f"{(base_url or BrevoAPI.BASE_URL).rstrip('/')}/smtp/email"
+        body = StreamingEmailBody(payload, attachment_path, attachment_name)
+        try:
+            response = HttpClients.brevo().post(
+                endpoint,
+                headers=BrevoAPI.get_headers(api_key),
+                data=body,
+                timeout=HttpClients.timeout(timeout)
+            )
+            response_json = response.json() if response.content else {}
+            
+            return {
+                "success": response.status_code == 201,
+                "status_code": response.status_code,
+                "response": response_json,
+                "message_id": response_json.get("messageId") if isinstance(response_json, dict) else None,
+                "headers": dict(response.headers),
+                "payload_bytes": len(body)
+            }
+        except (requests.exceptions.RequestException, ValueError) as e:
             return {
                 "success": False,
                 "error": str(e),
                 "status_code": None,
                 "response": {},
-                "message_id": None
+                "message_id": None,
+                "headers": {},
+                "payload_bytes": len(body)
             }
     
     @staticmethod
     def send_simple_email(recipient_email, recipient_name, subject, html_content, 
                          attachment_content=None, attachment_name=None,
-                         sender_email=None, sender_name=None, api_key=None):
+                         sender_email=None, sender_name=None, api_key=None,
+                         attachment_path=None):
         """
         Send email with default sender configuration
         
@@ -147,6 +307,8 @@ class BrevoAPI:
             sender_email (str, optional): Sender email (uses env var if not provided)
             sender_name (str, optional): Sender name (uses env var if not provided)
             api_key (str, optional): API key (uses env var if not provided)
+            attachment_path (str, optional): File to attach, streamed from disk
+                (preferred over attachment_content for large PDFs)
         
         Returns:
             dict: API response
@@ -168,6 +330,8 @@ class BrevoAPI:
             attachment_name=attachment_name
         )
         
+        if attachment_path:
+            return BrevoAPI.send_email_with_file(payload, attachment_path, attachment_name, api_key)
         return BrevoAPI.send_email(payload, api_key)
 
 # =============================================================================
@@ -275,11 +439,11 @@ class ZwennPayAPI:
                 amount, policy_no, mobile_no, customer_name, nic, merchant_id
             )
             
-            response = requests.post(
+            response = HttpClients.zwennpay().post(
                 ZwennPayAPI.QR_ENDPOINT,
                 headers=ZwennPayAPI.DEFAULT_HEADERS,
                 json=payload,
-                timeout=timeout
+                timeout=HttpClients.timeout(timeout)
             )
             
             if response.status_code == 200:
@@ -380,5 +544,5 @@ def example_zwennpay_usage():
 
 if __name__ == "__main__":
     print("API Configuration loaded successfully!")
-    print("Available classes: BrevoAPI, ZwennPayAPI")
+    print("Available classes: HttpClients, BrevoAPI, ZwennPayAPI")
     print("Run example_brevo_usage() or example_zwennpay_usage() to see examples")
\ No newline at end of file
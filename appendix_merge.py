@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Appendix Merge Engine
+Appends the static HealthSense forms to renewal letters.
+The forms are parsed once into a single in-memory appendix document and every
+letter is merged from that copy, instead of re-opening each form per letter.
+"""
+
+import os
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor
+
+# Static forms appended to every healthcare renewal letter, in order
+RENEWAL_APPENDIX_FORMS = [
+    "Renewal Acceptance Form - HealthSense Plan V2 0.pdf",
+    "HEALTHSENSE _SOB - FEB 2025.pdf",
+    "HEALTHSENSE CAT COVER_SOB - FEB 2025.pdf"
+]
+
+# Merged files smaller than this are treated as failed merges
+MIN_MERGED_SIZE = 10000
+
+def missing_appendix_forms(form_paths=None):
+    """Return the forms that are not on disk"""
+    return [p for p in (form_paths or RENEWAL_APPENDIX_FORMS) if not os.path.exists(p)]
+
+class AppendixMerger:
+    """
+    Holds the parsed appendix forms and merges them into letters.
+
+    All forms are inserted once into self.appendix_doc; merge_* then grafts
+    the pages of that one document after the letter pages. Forms that cannot
+    be opened are reported once at load time and skipped.
+    """
+
+    def __init__(self, form_paths=None, verbose=True):
+        self.form_paths = list(form_paths or RENEWAL_APPENDIX_FORMS)
+        self.appendix_doc = fitz.open()
+        self.form_pages = []
+        for form_path in self.form_paths:
+            try:
+                with fitz.open(form_path) as form_doc:
+                    self.appendix_doc.insert_pdf(form_doc)
+                    self.form_pages.append((form_path, form_doc.page_count))
+                    if verbose:
+                        print(f"   📄 Loaded {form_doc.page_count} pages from {os.path.basename(form_path)}")
+            except Exception as e:
+                print(f"   ⚠️ Warning: Could not load {form_path}: {str(e)}")
+
+    @property
+    def page_count(self):
+        return self.appendix_doc.page_count
+
+    def build(self, letter_doc):
+        """Return a new fitz document: letter pages followed by the appendix"""
+        merged_doc = fitz.open()
+        merged_doc.insert_pdf(letter_doc)
+        if self.appendix_doc.page_count:
+            merged_doc.insert_pdf(self.appendix_doc)
+        return merged_doc
+
+    def merge_file(self, letter_path, output_path):
+        """Merge a letter file with the appendix and save to output_path; returns total pages"""
+        with fitz.open(letter_path) as letter_doc:
+            merged_doc = self.build(letter_doc)
+        try:
+            merged_doc.save(output_path, garbage=1, deflate=True)
+            return merged_doc.page_count
+        finally:
+            merged_doc.close()
+
+    def merge_bytes(self, letter_bytes):
+        """Merge an in-memory letter with the appendix; returns (pdf bytes, total pages)"""
+        with fitz.open(stream=letter_bytes, filetype="pdf") as letter_doc:
+            merged_doc = self.build(letter_doc)
+        try:
+            return merged_doc.tobytes(garbage=1, deflate=True), merged_doc.page_count
+        finally:
+            merged_doc.close()
+
+    def close(self):
+        self.appendix_doc.close()
+
+def merge_temp_path(pdf_file):
+    """Temporary output path for a merge; not matched by *.pdf globs"""
+    return pdf_file + ".merging"
+
+def replace_if_valid(temp_path, pdf_file, min_size=MIN_MERGED_SIZE):
+    """Move a finished merge over the letter, or discard it if it is too small"""
+    if os.path.exists(temp_path) and os.path.getsize(temp_path) > min_size:
+        os.replace(temp_path, pdf_file)
+        return True
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    return False
+
+# Per-process merger, created once by the pool initializer
+_worker_merger = None
+
+def _init_merge_worker(form_paths):
+    global _worker_merger
+    _worker_merger = AppendixMerger(form_paths, verbose=False)
+
+def _merge_in_worker(pdf_file):
+    temp_path = merge_temp_path(pdf_file)
+    try:
+        total_pages = _worker_merger.merge_file(pdf_file, temp_path)
+        if replace_if_valid(temp_path, pdf_file):
+            return pdf_file, True, total_pages
+        return pdf_file, False, "merged file is too small"
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return pdf_file, False, str(e)
+
+def merge_files_parallel(pdf_files, form_paths=None, workers=None):
+    """
+    Merge letters with the appendix over a process pool.
+
+    Each worker parses the forms once, writes every merge to a temp file and
+    renames it over the letter only when it looks valid, so a failed merge
+    leaves the original letter untouched. Yields (pdf_file, success,
+    total_pages_or_error) in input order.
+    """
+    form_paths = list(form_paths or RENEWAL_APPENDIX_FORMS)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_merge_worker,
+                             initargs=(form_paths,)) as executor:
+        chunksize = max(1, len(pdf_files) // (workers * 8))
+        for result in executor.map(_merge_in_worker, pdf_files, chunksize=chunksize):
+            yield result
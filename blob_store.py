@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Blob Store
+Content-addressed storage for files that are written again and again with
+the same bytes (the letters of a regenerated campaign, uploaded Excel
+backups, the per-folder source copies). Identical content is kept once
+under its SHA-256 and every copy is a hardlink to it, falling back to a
+normal copy where hardlinks are not supported (other filesystem, FAT).
+
+Blobs are always a copy of their source, never a link to it, so working
+files such as Generic_Template.xlsx can be overwritten without touching the
+store. Linked files share their bytes, so they are only ever replaced through
+os.replace (or removed), never rewritten in place. The letter templates write
+through output_writer.OutputWriter, which links every letter from the store.
+
+Encrypted letters differ on every run (random file ID), so they are found
+by what they were made from instead: remember_derived() records the blob
+built from derived_key(source bytes, salt) and derived() finds it again on
+a rerun.
+
+gc() removes blobs that no file links to any more once they are older than
+the retention period.
+"""
+
+import os
+import time
+import shutil
+import hashlib
+
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', 'blob_store')
+BLOB_RETENTION_DAYS = float(os.getenv('BLOB_RETENTION_DAYS', 14))
+
+def file_digest(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def derived_key(source, salt):
+    """Key of content built from source bytes with salt (e.g. a letter and its password)"""
+    digest = hashlib.sha256(source)
+    digest.update(b'\0' + str(salt).encode('utf-8'))
+    return digest.hexdigest()
+
+def link_or_copy(src, dst):
+    """
+    Make dst a hardlink of src, or a copy if linking fails.
+    dst is replaced atomically, never written through. Returns True if linked.
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return True
+    temp_path = dst + ".link"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(src, temp_path)
+        linked = True
+    except OSError:
+        shutil.copy2(src, temp_path)
+        linked = False
+    os.replace(temp_path, dst)
+    return linked
+
+class BlobStore:
+    """Blobs are stored as <root>/objects/<first 2 hex digits>/<sha256>"""
+
+    def __init__(self, root=BLOB_STORE_DIR):
+        self.root = os.path.abspath(root)
+        self.objects_dir = os.path.join(self.root, 'objects')
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _store(self, digest, write):
+        """Create the blob with write(file) unless it exists; returns its path"""
+        object_path = self.object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = f"{object_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                write(f)
+            os.replace(temp_path, object_path)
+        # Retention counts from the last time the content was used
+        os.utime(object_path, None)
+        return object_path
+
+    def put(self, path):
+        """Add a copy of a file's contents to the store; returns its digest"""
+        digest = file_digest(path)
+
+        def copy_file(f):
+            with open(path, 'rb') as src:
+                shutil.copyfileobj(src, f, 1024 * 1024)
+        self._store(digest, copy_file)
+        return digest
+
+    def put_bytes(self, data):
+        """Add data to the store; returns (digest, True if it was already stored)"""
+        digest = hashlib.sha256(data).hexdigest()
+        existed = os.path.exists(self.object_path(digest))
+        self._store(digest, lambda f: f.write(data))
+        return digest, existed
+
+    def link_bytes(self, data, dst):
+        """
+        Place data at dst through the store.
+        Returns (digest, reused) - reused is True when the bytes were already stored.
+        """
+        digest, reused = self.put_bytes(data)
+        link_or_copy(self.object_path(digest), dst)
+        return digest, reused
+
+    def link_digest(self, digest, dst):
+        return link_or_copy(self.object_path(digest), dst)
+
+    def _derived_path(self, key):
+        return os.path.join(self.root, 'derived', key[:2], key)
+
+    def derived(self, key):
+        """Digest of the blob remember_derived() recorded under a derived_key(), if it is still stored"""
+        try:
+            with open(self._derived_path(key), 'r', encoding='ascii') as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        return digest if os.path.exists(self.object_path(digest)) else None
+
+    def remember_derived(self, key, digest):
+        path = self._derived_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w', encoding='ascii') as f:
+            f.write(digest)
+        os.replace(f"{path}.tmp", path)
+
+    def link(self, src, dst):
+        """
+        Place the contents of src at dst through the store.
+        Returns (digest, linked) - linked is False when dst had to be copied.
+        """
+        digest = self.put(src)
+        return digest, link_or_copy(self.object_path(digest), dst)
+
+    def iter_objects(self):
+        if not os.path.isdir(self.objects_dir):
+            return
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if os.path.isdir(prefix_dir):
+                for name in os.listdir(prefix_dir):
+                    yield os.path.join(prefix_dir, name)
+
+    def usage(self):
+        """(blob count, total bytes) - each blob is counted once however many links it has"""
+        count = 0
+        total = 0
+        for object_path in self.iter_objects():
+            count += 1
+            total += os.path.getsize(object_path)
+        return count, total
+
+    def gc(self, retention_days=BLOB_RETENTION_DAYS):
+        """
+        Delete blobs with no other links that were last used more than
+        retention_days ago. Returns (blobs removed, bytes freed).
+        """
+        cutoff = time.time() - retention_days * 86400
+        removed = 0
+        freed = 0
+        for object_path in self.iter_objects():
+            try:
+                st = os.stat(object_path)
+                if st.st_nlink <= 1 and st.st_mtime < cutoff:
+                    os.remove(object_path)
+                    removed += 1
+                    freed += st.st_size
+            except OSError as e:
+                print(f"[BLOB] Warning: Could not check {object_path}: {e}")
+        self._gc_derived()
+        return removed, freed
+
+    def _gc_derived(self):
+        """Drop derived records whose blob has been removed"""
+        derived_dir = os.path.join(self.root, 'derived')
+        if not os.path.isdir(derived_dir):
+            return
+        for prefix in os.listdir(derived_dir):
+            prefix_dir = os.path.join(derived_dir, prefix)
+            for name in os.listdir(prefix_dir) if os.path.isdir(prefix_dir) else []:
+                path = os.path.join(prefix_dir, name)
+                try:
+                    with open(path, 'r', encoding='ascii') as f:
+                        digest = f.read().strip()
+                    if not os.path.exists(self.object_path(digest)):
+                        os.remove(path)
+                except OSError:
+                    continue
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Brevo Email Dispatcher
+Sends email jobs concurrently through a bounded worker pool with a token-bucket
+rate limiter that adapts to HTTP 429 / Retry-After responses.
+Per-recipient status is checkpointed so a crashed batch can resume where it stopped.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+# Status codes worth retrying (rate limited or temporary server trouble)
+TRANSIENT_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+DEFAULT_WORKERS = 4
+DEFAULT_RATE = 8.0          # emails per second
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 1.0    # seconds, doubled per retry before jitter
+MAX_RETRY_DELAY = 60.0
+
+class TransientSendError(Exception):
+    """Raised by a send function for a failure that is worth retrying"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def is_transient_status(status):
+    """Check if an HTTP status code should be retried"""
+    return status is None or status in TRANSIENT_STATUS_CODES
+
+def parse_retry_after(headers):
+    """
+    Read the wait time (seconds) from Retry-After or Brevo's rate-limit reset header.
+    Returns None when no usable header is present.
+    """
+    if not headers:
+        return None
+
+    lowered = {str(k).lower(): v for k, v in dict(headers).items()}
+
+    for header in ('retry-after', 'x-sib-ratelimit-reset'):
+        value = lowered.get(header)
+        if value is None:
+            continue
+        value = str(value).strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        # Retry-After may also be an HTTP date
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError, IndexError):
+            continue
+
+    return None
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with additive-increase / multiplicative-decrease
+    adaptation: a 429 halves the rate and pauses all workers, successes
+    slowly restore it up to the configured ceiling.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=None, min_rate=0.5):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.max_rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def throttle(self, retry_after=None):
+        """Slow down after a 429: halve the rate and pause until Retry-After"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            print(f"[RATE] Rate limited by Brevo, slowing to {self.rate:.2f}/s"
+                  + (f" and pausing {retry_after:.1f}s" if retry_after else ""))
+
+    def recover(self):
+        """Creep back towards the configured rate after a success"""
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class DispatchCheckpoint:
+    """
+    Append-only JSON-lines log of per-recipient results.
+    Each completed record is written (and fsynced) as soon as it finishes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.completed = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash - ignore it
+                        continue
+                    self.completed[entry['key']] = entry
+            print(f"[INFO] Loaded checkpoint {path}: {self.sent_count()} already sent")
+
+    def sent_count(self):
+        return sum(1 for e in self.completed.values() if e.get('status') == 'sent')
+
+    def get_sent(self, key):
+        """Return the stored result for a key that was already sent, otherwise None"""
+        entry = self.completed.get(key)
+        if entry and entry.get('status') == 'sent':
+            return entry.get('result')
+        return None
+
+    def record(self, key, status, result):
+        entry = {'key': key, 'status': status, 'result': result, 'time': time.time()}
+        with self.lock:
+            self.completed[key] = entry
+            if not self.path:
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+class EmailDispatcher:
+    """
+    Run a send function over many jobs with a bounded worker pool.
+
+    send_func(job) must return (success, result). A failure that should be
+    retried is signalled by raising TransientSendError; any other exception
+    counts as a permanent failure for that job.
+    """
+
+    def __init__(self, send_func, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY,
+                 checkpoint_path=None):
+        self.send_func = send_func
+        self.workers = max(1, int(workers))
+        self.limiter = TokenBucket(rate=rate)
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.checkpoint = DispatchCheckpoint(checkpoint_path)
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, honouring Retry-After as a floor"""
+        delay = random.uniform(0, min(MAX_RETRY_DELAY, self.base_delay * (2 ** attempt)))
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _run_job(self, key, job):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                success, result = self.send_func(job)
+            except TransientSendError as e:
+                if e.status == 429:
+                    self.limiter.throttle(e.retry_after)
+                if attempt >= self.max_retries:
+                    error = f"{e} (gave up after {attempt + 1} attempts)"
+                    print(f"[ERROR] {key}: {error}", file=sys.stderr)
+                    self.checkpoint.record(key, 'failed', error)
+                    return False, error
+                delay = self._backoff_delay(attempt, e.retry_after)
+                print(f"[RETRY] {key}: {e} - retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 2}/{self.max_retries + 1})")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except Exception as e:
+                error = f"Unexpected error: {str(e)}"
+                print(f"[ERROR] {key}: {error}", file=sys.stderr)
+                self.checkpoint.record(key, 'failed', error)
+                return False, error
+
+            if success:
+                self.limiter.recover()
+            self.checkpoint.record(key, 'sent' if success else 'failed', result)
+            return success, result
+
+    def run(self, jobs):
+        """
+        Dispatch (key, job) pairs and return [(key, success, result, resumed)]
+        in the original order. Keys already sent in the checkpoint are not resent.
+        """
+        outcomes = [None] * len(jobs)
+        pending = []
+
+        for index, (key, job) in enumerate(jobs):
+            previous = self.checkpoint.get_sent(key)
+            if previous is not None:
+                outcomes[index] = (key, True, previous, True)
+            else:
+                pending.append((index, key, job))
+
+        if len(pending) < len(jobs):
+            print(f"[INFO] Resuming batch: skipping {len(jobs) - len(pending)} already sent")
+
+        print(f"[INFO] Dispatching {len(pending)} emails with {self.workers} workers "
+              f"at up to {self.limiter.max_rate:g}/s")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [(index, key, executor.submit(self._run_job, key, job))
+                       for index, key, job in pending]
+            for done, (index, key, future) in enumerate(futures, 1):
+                success, result = future.result()
+                outcomes[index] = (key, success, result, False)
+                if done % 50 == 0:
+                    print(f"[INFO] Dispatched {done}/{len(pending)} emails")
+
+        return outcomes
@@ -8,11 +8,12 @@ import sys
 import os
 import json
 import argparse
-import base64
-from pathlib import Path
-import sib_api_v3_sdk
-from sib_api_v3_sdk.rest import ApiException
 from dotenv import load_dotenv
+from api_config import BrevoAPI, HttpClients
+from brevo_dispatcher import (EmailDispatcher, TransientSendError, is_transient_status,
+                              parse_retry_after, DEFAULT_WORKERS, DEFAULT_RATE)
+from email_attachments import check_attachment_size, attachment_payload_size
+from output_plan import load_manifest, letters_by_policy, find_letter
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,62 +25,24 @@ SENDER_NAME = "NIC Life Insurance Mauritius"
 REPLY_TO_EMAIL = "nicarlife@nicl.mu"
 REPLY_TO_NAME = "NIC Life Insurance"
 
-# Validate that API key is loaded
-if not BREVO_API_KEY:
-    print("[ERROR] BREVO_API_KEY not found in environment variables. Please check your .env file.")
-    sys.exit(1)
-
-def setup_brevo_client():
-    """Setup Brevo API client"""
-    try:
-        configuration = sib_api_v3_sdk.Configuration()
-        configuration.api_key['api-key'] = BREVO_API_KEY
-        api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
-        print("[INFO] Brevo client initialized successfully")
-        return api_instance
-    except Exception as e:
-        print(f"[ERROR] Failed to initialize Brevo client: {str(e)}", file=sys.stderr)
-        return None
-
-def encode_pdf_attachment(pdf_path):
-    """Encode PDF file as base64 for email attachment"""
-    try:
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_content = pdf_file.read()
-            encoded_content = base64.b64encode(pdf_content).decode('utf-8')
-            return encoded_content
-    except Exception as e:
-        print(f"[ERROR] Failed to encode PDF {pdf_path}: {str(e)}", file=sys.stderr)
-        return None
+# Optional API host override (e.g. http://127.0.0.1:8025/v3 for fake_brevo_server.py)
+BREVO_API_URL = os.getenv('BREVO_API_URL')
 
-def send_email_with_pdf(api_instance, recipient_email, recipient_name, policy_no, pdf_path):
-    """Send email with PDF attachment using Brevo"""
-    try:
-        # Encode PDF attachment
-        pdf_content = encode_pdf_attachment(pdf_path)
-        if not pdf_content:
-            return False, "Failed to encode PDF attachment"
-
-        # Get PDF filename
-        pdf_filename = os.path.basename(pdf_path)
-        
-        # Create email content
-        subject = f"Arrears Notice - Policy {policy_no}"
-        html_content = f"""
+# Arrears email shell, rendered once. Placeholders use Brevo's {{params.X}} syntax so
+# the same shell serves batch sends (rendered by Brevo per messageVersion) and
+# single sends (rendered locally by render_template).
+ARREARS_SUBJECT = "Arrears Notice - Policy {{params.POLICY_NO}}"
+ARREARS_HTML_SHELL = """
         <html>
         <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
             <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
                 <h2 style="color: #2c5aa0;">NIC Mauritius - Policy Arrears Notice</h2>
                 
-                <p>Dear {recipient_name},</p>
+                <p>Dear {{params.NAME}},</p>
                 
                 <p>We hope this email finds you well.</p>
                 
-                <p>Please find attached the arrears notice for your insurance policy <strong>{policy_no}</strong>.</p>
-                
-                <div style="background-color: #f8f9fa; padding: 15px; border-left: 4px solid #2c5aa0; margin: 20px 0;">
-                    <p><strong>Important:</strong> Please review the attached document and take the necessary action to settle any outstanding amounts.</p>
-                </div>
+                __NOTICE__
                 
                 <p>For any queries or assistance, please contact our Customer Service Team:</p>
                 <ul>
@@ -100,41 +63,212 @@ def send_email_with_pdf(api_instance, recipient_email, recipient_name, policy_no
         </body>
         </html>
         """
+ARREARS_ATTACHMENT_HTML = ARREARS_HTML_SHELL.replace('__NOTICE__', """<p>Please find attached the arrears notice for your insurance policy <strong>{{params.POLICY_NO}}</strong>.</p>
+                
+                <div style="background-color: #f8f9fa; padding: 15px; border-left: 4px solid #2c5aa0; margin: 20px 0;">
+                    <p><strong>Important:</strong> Please review the attached document and take the necessary action to settle any outstanding amounts.</p>
+                </div>""")
+ARREARS_LINK_HTML = ARREARS_HTML_SHELL.replace('__NOTICE__', """<p>The arrears notice for your insurance policy <strong>{{params.POLICY_NO}}</strong> is available at the secure link below. Please use your National ID as password.</p>
+                
+                <p><a href="{{params.LETTER_URL}}" style="color: #2c5aa0;">{{params.LETTER_URL}}</a></p>
+                
+                <div style="background-color: #f8f9fa; padding: 15px; border-left: 4px solid #2c5aa0; margin: 20px 0;">
+                    <p><strong>Important:</strong> Please review the notice and take the necessary action to settle any outstanding amounts.</p>
+                </div>""")
+
+# Brevo allows at most 2000 recipients per request; we use one recipient per version
+MAX_BATCH_SIZE = 1000
+DEFAULT_BATCH_SIZE = 100
+
+# Validate that API key is loaded
+if not BREVO_API_KEY:
+    print("[ERROR] BREVO_API_KEY not found in environment variables. Please check your .env file.")
+    sys.exit(1)
+
+def setup_brevo_client():
+    """Setup Brevo API client"""
+    try:
+        api_instance = HttpClients.brevo_sdk(BREVO_API_KEY, BREVO_API_URL)
+        if BREVO_API_URL:
+            print(f"[INFO] Using Brevo API host override: {api_instance.api_client.configuration.host}")
+        print("[INFO] Brevo client initialized successfully")
+        return api_instance
+    except Exception as e:
+        print(f"[ERROR] Failed to initialize Brevo client: {str(e)}", file=sys.stderr)
+        return None
+
+def arrears_params(recipient_name, policy_no, letter_url=None):
+    """Per-recipient params for the arrears email shell"""
+    params = {"NAME": str(recipient_name), "POLICY_NO": str(policy_no)}
+    if letter_url:
+        params["LETTER_URL"] = str(letter_url)
+    return params
+
+def render_template(template, params):
+    """Fill {{params.X}} placeholders locally (single sends)"""
+    for key, value in params.items():
+        template = template.replace('{{params.' + key + '}}', value)
+    return template
+
+def brevo_connection(api_instance):
+    """API key and host of a Brevo client (honours the BREVO_API_URL override)"""
+    configuration = api_instance.api_client.configuration
+    return configuration.api_key['api-key'], configuration.host
+
+def api_failure(result, raise_transient=False):
+    """
+    Build the error message for a failed BrevoAPI call.
+    Raises TransientSendError instead when the failure is retryable and raise_transient is set.
+    """
+    status = result["status_code"]
+    if status is None:
+        error_msg = f"Network error: {result.get('error')}"
+    else:
+        reason = (result.get("response") or {}).get("message")
+        error_msg = f"Brevo API error: {status} - {reason or 'request failed'}"
+    if raise_transient and is_transient_status(status):
+        raise TransientSendError(error_msg, status=status,
+                                 retry_after=parse_retry_after(result.get("headers")))
+    print(f"[ERROR] {error_msg}", file=sys.stderr)
+    return error_msg
+
+def send_email_with_pdf(api_instance, recipient_email, recipient_name, policy_no, pdf_path,
+                        raise_transient=False):
+    """
+    Send email with PDF attachment using Brevo
+    The PDF is streamed from disk into the request body (see email_attachments.py)
+    using the host and API key of the given client, and oversize attachments
+    are rejected before the API call.
+    With raise_transient=True, rate limits / server errors / network errors raise
+    TransientSendError so the dispatcher can retry them.
+    """
+    try:
+        # Check attachment size before doing any work
+        _, size_error = check_attachment_size(pdf_path)
+        if size_error:
+            print(f"[ERROR] {size_error}", file=sys.stderr)
+            return False, size_error
+
+        # Get PDF filename
+        pdf_filename = os.path.basename(pdf_path)
         
-        # Create attachment
-        attachment = sib_api_v3_sdk.SendSmtpEmailAttachment(
-            content=pdf_content,
-            name=pdf_filename
-        )
+        # Create email content
+        params = arrears_params(recipient_name, policy_no)
+        subject = render_template(ARREARS_SUBJECT, params)
+        html_content = render_template(ARREARS_ATTACHMENT_HTML, params)
         
-        # Create email object
-        send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
-            to=[sib_api_v3_sdk.SendSmtpEmailTo(email=recipient_email, name=recipient_name)],
-            sender=sib_api_v3_sdk.SendSmtpEmailSender(email=SENDER_EMAIL, name=SENDER_NAME),
-            reply_to=sib_api_v3_sdk.SendSmtpEmailReplyTo(email=REPLY_TO_EMAIL, name=REPLY_TO_NAME),
+        # Create email payload (attachment is added while streaming)
+        payload = BrevoAPI.create_email_payload(
+            sender_email=SENDER_EMAIL,
+            sender_name=SENDER_NAME,
+            recipient_email=recipient_email,
+            recipient_name=recipient_name,
             subject=subject,
-            html_content=html_content,
-            attachment=[attachment]
+            html_content=html_content
         )
+        payload["replyTo"] = {"email": REPLY_TO_EMAIL, "name": REPLY_TO_NAME}
         
         # Send email
-        api_response = api_instance.send_transac_email(send_smtp_email)
-        message_id = api_response.message_id if hasattr(api_response, 'message_id') else 'unknown'
+        api_key, host = brevo_connection(api_instance)
+        result = BrevoAPI.send_email_with_file(payload, pdf_path, pdf_filename,
+                                               api_key=api_key, base_url=host)
+        
+        if result["success"]:
+            message_id = result["message_id"] or 'unknown'
+            print(f"[SUCCESS] Email sent to {recipient_email} - Message ID: {message_id} "
+                  f"({result['payload_bytes'] / 1024:.0f} KB)")
+            return True, message_id
+        
+        return False, api_failure(result, raise_transient)
+        
+    except TransientSendError:
+        raise
+    except Exception as e:
+        error_msg = f"Unexpected error: {str(e)}"
+        print(f"[ERROR] {error_msg}", file=sys.stderr)
+        return False, error_msg
+
+def arrears_base_payload(html_content):
+    """Sender/reply-to part shared by all arrears emails"""
+    return {
+        "sender": {"email": SENDER_EMAIL, "name": SENDER_NAME},
+        "replyTo": {"email": REPLY_TO_EMAIL, "name": REPLY_TO_NAME},
+        "htmlContent": html_content
+    }
+
+def send_link_email(api_instance, recipient_email, recipient_name, policy_no, letter_url,
+                    raise_transient=False):
+    """Send a single arrears email that links to the letter viewer instead of attaching the PDF"""
+    try:
+        params = arrears_params(recipient_name, policy_no, letter_url)
+        payload = arrears_base_payload(render_template(ARREARS_LINK_HTML, params))
+        payload["to"] = [{"email": recipient_email, "name": recipient_name}]
+        payload["subject"] = render_template(ARREARS_SUBJECT, params)
+        
+        api_key, host = brevo_connection(api_instance)
+        result = BrevoAPI.send_email(payload, api_key=api_key, base_url=host)
         
-        print(f"[SUCCESS] Email sent to {recipient_email} - Message ID: {message_id}")
-        return True, message_id
+        if result["success"]:
+            message_id = result["message_id"] or 'unknown'
+            print(f"[SUCCESS] Email sent to {recipient_email} - Message ID: {message_id}")
+            return True, message_id
         
-    except ApiException as e:
-        error_msg = f"Brevo API error: {e.status} - {e.reason}"
+        return False, api_failure(result, raise_transient)
+        
+    except TransientSendError:
+        raise
+    except Exception as e:
+        error_msg = f"Unexpected error: {str(e)}"
         print(f"[ERROR] {error_msg}", file=sys.stderr)
         return False, error_msg
+
+def send_link_email_batch(api_instance, jobs, raise_transient=False):
+    """
+    Send letter-link arrears emails for many recipients in one Brevo request.
+    The HTML shell goes once at message level; each recipient is a messageVersion
+    carrying only its own params and subject.
+    Brevo cannot attach a different file per messageVersion, which is why batches
+    are only sent in letter-link mode (--link-letters).
+    Returns (True, [message ids in job order]) or (False, error message).
+    """
+    try:
+        versions = []
+        for job in jobs:
+            params = arrears_params(job['name'], job['policy_no'], job['letter_url'])
+            versions.append({
+                "to": [{"email": job['email'], "name": job['name']}],
+                "params": params,
+                "subject": render_template(ARREARS_SUBJECT, params)
+            })
+        
+        payload = arrears_base_payload(ARREARS_LINK_HTML)
+        payload["subject"] = "Arrears Notice"
+        payload["messageVersions"] = versions
+        
+        api_key, host = brevo_connection(api_instance)
+        result = BrevoAPI.send_email(payload, api_key=api_key, base_url=host)
+        
+        if result["success"]:
+            message_ids = result["message_ids"] or []
+            if len(message_ids) != len(jobs):
+                message_ids = list(message_ids) + ['unknown'] * (len(jobs) - len(message_ids))
+            print(f"[SUCCESS] Batch of {len(jobs)} emails accepted by Brevo")
+            return True, message_ids
+        
+        return False, api_failure(result, raise_transient)
+        
+    except TransientSendError:
+        raise
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
         print(f"[ERROR] {error_msg}", file=sys.stderr)
         return False, error_msg
 
-def find_pdf_file(pdf_folder, expected_filename):
-    """Find PDF file with fuzzy matching for Unicode issues - ONLY uses protected PDFs for email security"""
+def find_pdf_file(pdf_folder, expected_filename, planned_filename=None):
+    """
+    Find PDF file with fuzzy matching for Unicode issues - ONLY uses protected PDFs for email security
+    planned_filename is the name from the folder's output manifest and is tried first
+    """
     
     # Define search locations - PROTECTED FOLDER FIRST for email security
     search_locations = [
@@ -144,13 +278,14 @@ def find_pdf_file(pdf_folder, expected_filename):
     
     # Note: Unprotected folder is intentionally excluded for email security
     
-    # Try exact match in all locations
-    for location in search_locations:
-        if os.path.exists(location):
-            exact_path = os.path.join(location, expected_filename)
-            if os.path.exists(exact_path):
-                print(f"[INFO] Found PDF (exact match): {exact_path}")
-                return exact_path
+    # Try the planned name, then an exact match, in all locations
+    for filename in filter(None, [planned_filename, expected_filename]):
+        for location in search_locations:
+            if os.path.exists(location):
+                exact_path = os.path.join(location, filename)
+                if os.path.exists(exact_path):
+                    print(f"[INFO] Found PDF (exact match): {exact_path}")
+                    return exact_path
     
     # If exact match fails, try fuzzy matching in all locations
     try:
@@ -190,8 +325,49 @@ def find_pdf_file(pdf_folder, expected_filename):
     
     return None
 
-def process_email_batch(email_data_file, pdf_folder):
-    """Process batch of emails from JSON data"""
+def letter_urls_by_policy(pdf_folder, base_url=None):
+    """
+    Letter viewer URL per policy number, from the campaign's letter_links/<folder>/<id>.json
+    records. Records written before letterUrl was stored get base_url/letter/<id>.
+    """
+    folder = os.path.abspath(pdf_folder)
+    links_dir = os.path.join(os.path.dirname(folder), 'letter_links', os.path.basename(folder))
+    urls = {}
+    if not os.path.isdir(links_dir):
+        return urls
+    for name in sorted(os.listdir(links_dir)):
+        if not name.endswith('.json') or name == 'status.json':
+            continue
+        try:
+            with open(os.path.join(links_dir, name), 'r', encoding='utf-8') as f:
+                letter = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(letter, dict) or not letter.get('isActive', True):
+            continue
+        policy_no = str(letter.get('policyNo') or '').strip()
+        letter_url = letter.get('letterUrl')
+        if not letter_url and base_url and letter.get('id'):
+            letter_url = f"{base_url.rstrip('/')}/letter/{letter['id']}"
+        if policy_no and letter_url:
+            urls.setdefault(policy_no, letter_url)
+    return urls
+
+def email_checkpoint_key(record):
+    """Stable per-recipient key used in the dispatch checkpoint"""
+    return f"{record.get('email', '')}|{record.get('policy_no', '')}|{record.get('pdf_filename', '')}"
+
+def process_email_batch(email_data_file, pdf_folder, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+                        checkpoint_path=None, batch_size=0, link_letters=False, letter_base_url=None):
+    """
+    Process batch of emails from JSON data
+    By default every email carries its PDF as an attachment. With link_letters the
+    email links to the letter viewer instead; the URL is the record's letter_url or
+    the campaign's SMS letter link for the policy (records without one are still
+    sent with the PDF attached). With batch_size > 0 the letter-link emails are sent
+    in groups through Brevo messageVersions; groups that still fail after retries
+    fall back to single sends.
+    """
     try:
         # Setup Brevo client
         api_instance = setup_brevo_client()
@@ -202,26 +378,58 @@ def process_email_batch(email_data_file, pdf_folder):
         with open(email_data_file, 'r', encoding='utf-8') as f:
             email_data = json.load(f)
         
+        batch_size = min(max(0, int(batch_size or 0)), MAX_BATCH_SIZE)
+        if batch_size and not link_letters:
+            print("[WARNING] Batch size ignored: batches are only sent with letter links (--link-letters)")
+            batch_size = 0
+        
         results = []
         success_count = 0
         failed_count = 0
         
         print(f"[INFO] Processing {len(email_data)} emails...")
         
+        # File names planned by the generator, when the folder has a manifest
+        planned_letters = letters_by_policy(load_manifest(pdf_folder))
+        
+        letter_urls = {}
+        if link_letters:
+            letter_urls = letter_urls_by_policy(pdf_folder, letter_base_url)
+            print(f"[INFO] Letter-link mode: {len(letter_urls)} letter links found for {os.path.basename(pdf_folder)}")
+        
+        # Validate records and locate PDFs up front, then dispatch concurrently
+        jobs = []
+        link_jobs = []
         for i, record in enumerate(email_data, 1):
             try:
                 recipient_email = record.get('email', '')
                 recipient_name = record.get('name', '')
                 policy_no = record.get('policy_no', '')
                 pdf_filename = record.get('pdf_filename', '')
+                letter_url = ''
+                if link_letters:
+                    letter_url = record.get('letter_url') or letter_urls.get(str(policy_no).strip(), '')
+                    if not letter_url:
+                        print(f"[WARNING] No letter link for policy {policy_no}, attaching the PDF instead")
+                
+                if letter_url and all([recipient_email, recipient_name, policy_no]):
+                    link_job = (email_checkpoint_key(record), {
+                        'index': i,
+                        'email': recipient_email,
+                        'name': recipient_name,
+                        'policy_no': policy_no,
+                        'letter_url': letter_url
+                    })
+                    (link_jobs if batch_size else jobs).append(link_job)
+                    continue
                 
                 if not all([recipient_email, recipient_name, policy_no, pdf_filename]):
                     print(f"[WARNING] Skipping record {i}: Missing required fields")
                     failed_count += 1
                     continue
                 
-                # Use fuzzy matching to find the PDF file
-                pdf_path = find_pdf_file(pdf_folder, pdf_filename)
+                # Look the letter up in the manifest, with fuzzy matching as fallback
+                pdf_path = find_pdf_file(pdf_folder, pdf_filename, find_letter(planned_letters, policy_no, recipient_name))
                 if not pdf_path:
                     print(f"[WARNING] PDF not found: {pdf_filename} in {pdf_folder}")
                     # List available PDFs for debugging
@@ -233,38 +441,99 @@ def process_email_batch(email_data_file, pdf_folder):
                     failed_count += 1
                     continue
                 
-                print(f"[PROCESSING] {i}/{len(email_data)}: {recipient_email}")
-                
-                success, message_id = send_email_with_pdf(
-                    api_instance, recipient_email, recipient_name, policy_no, pdf_path
-                )
-                
-                if success:
-                    success_count += 1
-                    results.append({
-                        'email': recipient_email,
-                        'status': 'sent',
-                        'message_id': message_id
-                    })
-                else:
-                    failed_count += 1
-                    results.append({
-                        'email': recipient_email,
-                        'status': 'failed',
-                        'error': message_id
-                    })
-                
-                # Small delay to avoid rate limiting
-                if i % 10 == 0:
-                    print(f"[INFO] Processed {i} emails, pausing briefly...")
-                    import time
-                    time.sleep(1)
+                jobs.append((email_checkpoint_key(record), {
+                    'index': i,
+                    'email': recipient_email,
+                    'name': recipient_name,
+                    'policy_no': policy_no,
+                    'pdf_path': pdf_path
+                }))
                     
             except Exception as e:
                 print(f"[ERROR] Failed to process record {i}: {str(e)}", file=sys.stderr)
                 failed_count += 1
         
+        def send_job(job):
+            if job.get('batch'):
+                print(f"[PROCESSING] Batch of {len(job['batch'])} emails "
+                      f"(records {job['batch'][0][1]['index']}-{job['batch'][-1][1]['index']})")
+                success, result = send_link_email_batch(
+                    api_instance, [member for _, member in job['batch']], raise_transient=True
+                )
+                if success:
+                    # Checkpoint every recipient of the group individually
+                    for (member_key, _), message_id in zip(job['batch'], result):
+                        dispatcher.checkpoint.record(member_key, 'sent', message_id)
+                return success, result
+            
+            print(f"[PROCESSING] {job['index']}/{len(email_data)}: {job['email']}")
+            if job.get('letter_url'):
+                return send_link_email(
+                    api_instance, job['email'], job['name'], job['policy_no'], job['letter_url'],
+                    raise_transient=True
+                )
+            return send_email_with_pdf(
+                api_instance, job['email'], job['name'], job['policy_no'], job['pdf_path'],
+                raise_transient=True
+            )
+        
+        dispatcher = EmailDispatcher(send_job, workers=workers, rate=rate,
+                                     checkpoint_path=checkpoint_path)
+        
+        # Group letter-link recipients not already sent into messageVersions batches
+        outcomes_by_key = {}
+        pending_links = []
+        for key, job in link_jobs:
+            previous = dispatcher.checkpoint.get_sent(key)
+            if previous is not None:
+                outcomes_by_key[key] = (True, previous, True)
+            else:
+                pending_links.append((key, job))
+        
+        batch_jobs = []
+        for start in range(0, len(pending_links), batch_size or 1):
+            group = pending_links[start:start + batch_size]
+            batch_key = f"batch|{group[0][0]}|{len(group)}"
+            batch_jobs.append((batch_key, {'batch': group}))
+        
+        fallback_jobs = []
+        for (_, batch_job), (_, success, result, _) in zip(batch_jobs, dispatcher.run(batch_jobs)):
+            group = batch_job['batch']
+            if success:
+                for (member_key, _), message_id in zip(group, result):
+                    outcomes_by_key[member_key] = (True, message_id, False)
+            else:
+                print(f"[WARNING] Batch of {len(group)} failed ({result}), falling back to single sends")
+                fallback_jobs.extend(group)
+        
+        for (key, _), (_, success, result, resumed) in zip(jobs + fallback_jobs,
+                                                            dispatcher.run(jobs + fallback_jobs)):
+            outcomes_by_key[key] = (success, result, resumed)
+        
+        for key, job in sorted(jobs + link_jobs, key=lambda item: item[1]['index']):
+            success, message_id, resumed = outcomes_by_key[key]
+            result = {
+                'email': job['email'],
+                'status': 'sent' if success else 'failed'
+            }
+            if success:
+                success_count += 1
+                result['message_id'] = message_id
+                if resumed:
+                    result['resumed'] = True
+            else:
+                failed_count += 1
+                result['error'] = message_id
+            if job.get('pdf_path'):
+                result['payload_bytes'] = attachment_payload_size(job['pdf_path'])
+            else:
+                result['mode'] = 'link'
+            results.append(result)
+        
         print(f"[SUMMARY] Completed: {success_count} sent, {failed_count} failed")
+        if batch_jobs:
+            print(f"[SUMMARY] {len(pending_links)} letter-link emails: {len(batch_jobs)} batch requests, "
+                  f"{len(fallback_jobs)} single-send fallbacks")
         return True, {
             'success_count': success_count,
             'failed_count': failed_count,
@@ -281,6 +550,19 @@ def main():
     parser.add_argument('--data', required=True, help='JSON file with email data')
     parser.add_argument('--folder', required=True, help='Folder containing PDF files')
     parser.add_argument('--output', help='Output file for results (optional)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Concurrent send workers (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f'Maximum emails per second (default: {DEFAULT_RATE})')
+    parser.add_argument('--checkpoint',
+                        help='Per-recipient checkpoint file; rerun with the same file to resume a crashed batch')
+    parser.add_argument('--link-letters', action='store_true',
+                        help='Link to the letter viewer (SMS letter links) instead of attaching the PDF')
+    parser.add_argument('--letter-base-url',
+                        help='Letter viewer base URL for letter links saved without a letterUrl')
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help=f'With --link-letters, send in Brevo batches of this many recipients '
+                             f'(max {MAX_BATCH_SIZE}, 0 = off, suggested {DEFAULT_BATCH_SIZE})')
     
     args = parser.parse_args()
     
@@ -292,7 +574,10 @@ def main():
         print(f"[ERROR] PDF folder not found: {args.folder}", file=sys.stderr)
         sys.exit(1)
     
-    success, result = process_email_batch(args.data, args.folder)
+    success, result = process_email_batch(args.data, args.folder, workers=args.workers,
+                                          rate=args.rate, checkpoint_path=args.checkpoint,
+                                          batch_size=args.batch_size, link_letters=args.link_letters,
+                                          letter_base_url=args.letter_base_url)
     
     if success:
         if args.output:
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Column Manifests
+The columns each generator reads from its policy sheet. The exports carry
+dozens of columns the letters never use; read_policy_sheet() loads only the
+manifest's columns, keeps short repeated values (Frequency, titles, Agent No)
+as categoricals and policy numbers as strings, and reports missing columns
+before any letter is generated:
+
+  required columns missing - the sheet is rejected (MissingColumnsError)
+  optional columns missing - a warning; those fields print blank as before
+"""
+
+import os
+import pandas as pd
+
+OWNER_COLUMNS = [
+    'Owner 1 Title', 'Owner 1 First Name', 'Owner 1 Surname',
+    'Owner 1 Policy Address 1', 'Owner 1 Policy Address 2',
+    'Owner 1 Policy Address 3', 'Owner 1 Policy Address 4'
+]
+
+ARREARS_COLUMNS = ['Policy No', 'Arrears Amount', 'Arrears Processing Date', 'Frequency',
+                   'Computed Gross Premium', 'No of Instalments in Arrears', 'Agent No',
+                   'Assignee Surname Corrected', 'MOBILE_NO', 'NIC'] + OWNER_COLUMNS
+
+JOINT_ARREARS_COLUMNS = ARREARS_COLUMNS + ['Owner 2 Title', 'Owner 2 First Name', 'Owner 2 Surname']
+
+ARREARS_REQUIRED = ['Policy No', 'Arrears Amount']
+
+MANIFESTS = {
+    'SPH_Fresh.py': {'required': ARREARS_REQUIRED, 'columns': ARREARS_COLUMNS},
+    'JPH_Fresh.py': {'required': ARREARS_REQUIRED, 'columns': JOINT_ARREARS_COLUMNS},
+    'Company_Fresh.py': {'required': ARREARS_REQUIRED, 'columns': ARREARS_COLUMNS},
+    'MED_SPH_Fresh_Signature.py': {'required': ARREARS_REQUIRED, 'columns': ARREARS_COLUMNS},
+    'MED_JPH_Fresh_Signature.py': {'required': ARREARS_REQUIRED, 'columns': JOINT_ARREARS_COLUMNS},
+    'generate_sms_links.py': {
+        'required': ARREARS_REQUIRED,
+        'columns': ['Policy No', 'Arrears Amount', 'Arrears Processing Date', 'Frequency',
+                    'Computed Gross Premium', 'MOBILE_NO', 'NIC'] + OWNER_COLUMNS
+    },
+    'healthcare_renewal_final.py': {
+        'required': ['POL_NO', 'NAME'],
+        'columns': ['POL_NO', 'TITLE', 'NAME', 'SURNAME', 'ADDRESS1', 'ADDRESS2', 'ADDRESS3',
+                    'EXPIRY_POL_FROM_DT', 'EXPIRY_POL_TO_DT', 'REN_POL_START_DT', 'REN_POL_TO_DT',
+                    'PLAN', 'CAT_PLAN', 'INPATIENT_LIMIT', 'OUTPATIENT_LIMIT', 'CAT_LIMIT',
+                    'TOTAL_PREMIUM', 'FSC_LEVY', 'MOB_NO']
+    },
+    'Motor_Insurance_Renewal.py': {
+        'required': ['Policy No', 'New Net Premium'],
+        'columns': ['Policy No', 'Old Policy No', 'Title', 'Firstname', 'Surname', 'Address1', 'Address2',
+                    'Address2 after Rating Category', 'Cover End Dt', 'Expiry Date', 'Renewal Start',
+                    'Renewal End', 'Make', 'Model', 'Vehicle No', 'Chassis No', 'Compulsory Excess',
+                    'IDV', 'Revised IDV', 'New Net Premium', 'NIC Number', 'Business Type', 'Mobile No']
+    }
+}
+
+# Generators without a manifest (older template copies) keep reading every column
+DEFAULT_MANIFEST = {'required': ARREARS_REQUIRED, 'columns': None}
+
+# Few distinct values repeated on every row
+CATEGORICAL_COLUMNS = ('Frequency', 'Agent No', 'Owner 1 Title', 'Owner 2 Title', 'Title', 'TITLE')
+
+# Read as text so numeric-looking policy numbers are never turned into floats
+POLICY_NUMBER_COLUMNS = ('Policy No', 'Old Policy No', 'POL_NO')
+
+class MissingColumnsError(ValueError):
+    """The sheet lacks columns the generator cannot work without"""
+
+    def __init__(self, path, missing):
+        self.path = path
+        self.missing = missing
+        super().__init__(f"{path} is missing required columns: {missing}")
+
+def manifest_for(generator):
+    return MANIFESTS.get(os.path.basename(generator), DEFAULT_MANIFEST)
+
+def sheet_columns(path):
+    """Header of the first sheet, without loading any rows"""
+    return list(pd.read_excel(path, engine='openpyxl', nrows=0).columns)
+
+def check_columns(available, generator):
+    """(missing required, missing optional) columns for a sheet header"""
+    manifest = manifest_for(generator)
+    missing_required = [c for c in manifest['required'] if c not in available]
+    missing_optional = [c for c in (manifest['columns'] or [])
+                        if c not in available and c not in manifest['required']]
+    return missing_required, missing_optional
+
+def read_policy_sheet(path, generator, prefix='[INFO]'):
+    """Load the columns generator uses from path with compact dtypes"""
+    available = sheet_columns(path)
+    missing_required, missing_optional = check_columns(available, generator)
+    if missing_required:
+        raise MissingColumnsError(path, missing_required)
+    if missing_optional:
+        print(f"{prefix} Columns not in {path} (printed blank): {missing_optional}")
+
+    manifest = manifest_for(generator)
+    columns = available if manifest['columns'] is None else [c for c in available if c in manifest['columns']]
+    dtypes = {c: 'category' for c in CATEGORICAL_COLUMNS if c in columns}
+    dtypes.update({c: str for c in POLICY_NUMBER_COLUMNS if c in columns})
+    df = pd.read_excel(path, engine='openpyxl', usecols=columns, dtype=dtypes)
+    print(f"{prefix} Loaded {len(columns)} of {len(available)} columns from {path} "
+          f"({df.memory_usage(deep=True).sum() / (1024 * 1024):.1f} MB in memory)")
+    return df
@@ -8,6 +8,15 @@ import sys
 import os
 import argparse
 import json
+import re
+import shutil
+import hashlib
+import tempfile
+from output_plan import in_manifest_order
+from folder_inventory import update_folder_safely
+
+# Letters per intermediate chunk in streaming mode (bounds memory use)
+DEFAULT_CHUNK_SIZE = 200
 
 # Try PyMuPDF first (better for image preservation), fallback to PyPDF2
 PDF_LIBRARY = None
@@ -94,6 +103,151 @@ def combine_pdfs_pymupdf(pdf_files, output_path):
         traceback.print_exc()
         return False
 
+INDIRECT_REF = re.compile(r'(?<![\d.])(\d+) 0 R')
+
+def _remap_refs(text, remap):
+    return INDIRECT_REF.sub(lambda m: f"{remap.get(int(m.group(1)), int(m.group(1)))} 0 R", text)
+
+def dedupe_streams(doc, first_xref, seen):
+    """
+    Point objects from first_xref on at identical streams already in doc.
+    seen maps stream digest -> xref and is carried from chunk to chunk; a stream
+    is identical when its bytes and its dictionary (with references already
+    remapped, e.g. an image's /SMask) match. Duplicates are emptied to null.
+    Returns the number of streams replaced.
+    """
+    new_streams = [x for x in range(first_xref, doc.xref_length()) if doc.xref_is_stream(x)]
+    remap = {}
+    changed = True
+    # Repeat until stable - an image only matches once its soft mask has been remapped
+    while changed:
+        changed = False
+        for xref in new_streams:
+            if xref in remap:
+                continue
+            digest = hashlib.sha256(doc.xref_stream_raw(xref))
+            digest.update(_remap_refs(doc.xref_object(xref, compressed=True), remap).encode('utf-8'))
+            canonical = seen.setdefault(digest.digest(), xref)
+            if canonical != xref:
+                remap[xref] = canonical
+                changed = True
+    if not remap:
+        return 0
+    for xref in range(first_xref, doc.xref_length()):
+        if xref in remap:
+            continue
+        for key in doc.xref_get_keys(xref):
+            kind, value = doc.xref_get_key(xref, key)
+            if kind in ('xref', 'dict', 'array'):
+                remapped = _remap_refs(value, remap)
+                if remapped != value:
+                    doc.xref_set_key(xref, key, remapped)
+    for xref in remap:
+        doc.update_stream(xref, b'')
+        doc.update_object(xref, 'null')
+    return len(remap)
+
+def combine_pdfs_streaming(pdf_files, output_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Combine PDFs using PyMuPDF with bounded memory.
+    
+    Letters are merged in chunks of chunk_size into temporary files saved with
+    garbage=4 (identical logo/font streams embedded by every letter are stored
+    once per chunk) and deflate. The chunks are then appended to the output with
+    incremental saves, reopening it each time, so only one chunk is ever held
+    in memory regardless of batch size. Before each save, the chunk's streams
+    that match one already in the output (dedupe_streams) are replaced by a
+    reference to the first copy, so each logo and font is stored once per file.
+    
+    Returns (merged, skipped): the number of input files in the output and the
+    number left out (missing or unreadable). merged is 0 if no output was written.
+    """
+    work_dir = None
+    partial_path = output_path + ".part"
+    try:
+        print(f"Starting streaming PDF combination of {len(pdf_files)} files using PyMuPDF "
+              f"(chunks of {chunk_size})...")
+        
+        work_dir = tempfile.mkdtemp(prefix="combine_", dir=os.path.dirname(os.path.abspath(output_path)))
+        chunk_paths = []
+        added_files = 0
+        input_bytes = 0
+        
+        # Phase 1: merge letters into deduplicated chunk files
+        for start in range(0, len(pdf_files), chunk_size):
+            chunk_files = pdf_files[start:start + chunk_size]
+            chunk_doc = fitz.open()
+            for i, pdf_file in enumerate(chunk_files, start + 1):
+                if not os.path.exists(pdf_file):
+                    print(f"Warning: File not found: {pdf_file}")
+                    continue
+                print(f"Adding file {i}/{len(pdf_files)}: {os.path.basename(pdf_file)}")
+                try:
+                    with fitz.open(pdf_file) as source_doc:
+                        chunk_doc.insert_pdf(source_doc)
+                    added_files += 1
+                    input_bytes += os.path.getsize(pdf_file)
+                except Exception as file_error:
+                    print(f"ERROR: Failed to process {pdf_file}: {str(file_error)}")
+                    continue
+            
+            if chunk_doc.page_count:
+                chunk_path = os.path.join(work_dir, f"chunk_{len(chunk_paths):05d}.pdf")
+                chunk_doc.save(chunk_path, garbage=4, deflate=True)
+                chunk_paths.append(chunk_path)
+                print(f"Wrote chunk {len(chunk_paths)}: {chunk_doc.page_count} pages")
+            chunk_doc.close()
+        
+        if not chunk_paths:
+            print("ERROR: No pages could be combined")
+            return 0, len(pdf_files)
+        
+        # Phase 2: concatenate chunks with incremental saves
+        print(f"Writing combined PDF to: {output_path}")
+        shutil.move(chunk_paths[0], partial_path)
+        seen_streams = {}
+        shared_streams = 0
+        if len(chunk_paths) > 1:
+            with fitz.open(partial_path) as combined_doc:
+                dedupe_streams(combined_doc, 1, seen_streams)
+        for chunk_path in chunk_paths[1:]:
+            with fitz.open(partial_path) as combined_doc, fitz.open(chunk_path) as chunk_doc:
+                first_xref = combined_doc.xref_length()
+                combined_doc.insert_pdf(chunk_doc)
+                shared_streams += dedupe_streams(combined_doc, first_xref, seen_streams)
+                combined_doc.saveIncr()
+            os.remove(chunk_path)
+        
+        with fitz.open(partial_path) as combined_doc:
+            page_count = combined_doc.page_count
+        os.replace(partial_path, output_path)
+        
+        file_size = os.path.getsize(output_path)
+        if file_size > 0:
+            print(f"Successfully combined {added_files} PDFs into {output_path}")
+            print(f"Total pages: {page_count}")
+            print(f"Output file size: {file_size:,} bytes")
+            if input_bytes:
+                print(f"Size vs. separate letters: {file_size / input_bytes:.0%} of {input_bytes:,} bytes "
+                      f"(shared resources deduplicated, {shared_streams} repeated across chunks)")
+            if added_files < len(pdf_files):
+                print(f"Skipped {len(pdf_files) - added_files} files that were missing or could not be read")
+            return added_files, len(pdf_files) - added_files
+        else:
+            print("ERROR: Output file is empty")
+            return 0, len(pdf_files)
+            
+    except Exception as e:
+        print(f"Error combining PDFs with PyMuPDF (streaming): {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 0, len(pdf_files)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
 def combine_pdfs_pypdf2(pdf_files, output_path):
     """Combine PDFs using PyPDF2 (fallback method)."""
     try:
@@ -168,14 +322,14 @@ def get_unprotected_pdfs(folder_path):
         print(f"Warning: Unprotected folder not found at {unprotected_path}")
         # Fallback to main folder for legacy structure
         if os.path.exists(folder_path):
-            pdf_files = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path)) 
-                        if f.endswith('.pdf')]
+            pdf_files = [os.path.join(folder_path, f)
+                         for f in in_manifest_order(folder_path, os.listdir(folder_path)) if f.endswith('.pdf')]
             print(f"Using legacy structure: found {len(pdf_files)} PDFs in main folder")
             return pdf_files
         return []
     
-    pdf_files = [os.path.join(unprotected_path, f) for f in sorted(os.listdir(unprotected_path)) 
-                if f.endswith('.pdf')]
+    pdf_files = [os.path.join(unprotected_path, f)
+                 for f in in_manifest_order(folder_path, os.listdir(unprotected_path)) if f.endswith('.pdf')]
     print(f"Found {len(pdf_files)} unprotected PDFs to combine")
     print("Note: Protected PDFs are excluded (each has unique password)")
     return pdf_files
@@ -195,6 +349,9 @@ def main():
     parser.add_argument('--folder', help='Base folder containing unprotected/ subfolder')
     parser.add_argument('--output', required=True, help='Output PDF file path')
     parser.add_argument('--name', help='Output filename (without extension)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f'Letters per intermediate chunk with PyMuPDF (default: {DEFAULT_CHUNK_SIZE}, '
+                             f'0 = build the whole file in memory)')
     
     args = parser.parse_args()
     
@@ -263,11 +420,19 @@ def main():
         print(f"🎯 Using {PDF_LIBRARY.upper()} library for combining")
         
         # Use PyMuPDF if available (better for QR codes), otherwise PyPDF2
-        if PDF_LIBRARY == "pymupdf":
+        if PDF_LIBRARY == "pymupdf" and args.chunk_size > 0:
+            merged, skipped = combine_pdfs_streaming(existing_files, args.output, args.chunk_size)
+            success = merged > 0
+        elif PDF_LIBRARY == "pymupdf":
             success = combine_pdfs_pymupdf(existing_files, args.output)
         else:
             success = combine_pdfs_pypdf2(existing_files, args.output)
         
+        if args.folder:
+            # The combined/ subfolder changes the folder's lastModified in the listing
+            folder_path = os.path.abspath(args.folder)
+            update_folder_safely(folder_path, os.path.dirname(folder_path))
+        
         if success:
             print("✅ PDF combination completed successfully!")
             print(f"📁 Combined file saved to: {args.output}")
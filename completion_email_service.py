@@ -12,6 +12,7 @@ from datetime import datetime
 import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 from dotenv import load_dotenv
+from api_config import HttpClients
 
 # Load environment variables from .env file
 load_dotenv()
@@ -30,10 +31,8 @@ def setup_brevo_client():
             print("[ERROR] BREVO_API_KEY not found in environment variables")
             return None
             
-        configuration = sib_api_v3_sdk.Configuration()
-        configuration.api_key['api-key'] = BREVO_API_KEY
-        api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
-        return api_instance
+        # Shared client: repeated notifications reuse the same connection pool
+        return HttpClients.brevo_sdk(BREVO_API_KEY, os.getenv('BREVO_API_URL'))
     except Exception as e:
         print(f"[ERROR] Failed to initialize Brevo client: {str(e)}")
         return None
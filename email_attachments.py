@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Email Attachment Streaming
+Builds Brevo JSON request bodies whose attachment content is base64-encoded
+straight from the PDF file in fixed-size chunks, so an email never holds the
+whole file (or its base64/JSON copies) in memory.
+"""
+
+import os
+import json
+import uuid
+import base64
+
+# Read size per chunk - must be a multiple of 3 so chunks encode without padding
+CHUNK_SIZE = 3 * 16 * 1024
+
+# Largest base64 attachment payload we hand to Brevo (override with BREVO_MAX_ATTACHMENT_BYTES)
+MAX_ATTACHMENT_BYTES = int(os.getenv('BREVO_MAX_ATTACHMENT_BYTES', 10 * 1024 * 1024))
+
+def attachment_payload_size(file_path):
+    """Size in bytes of the base64 content for a file, computed without reading it"""
+    size = os.path.getsize(file_path)
+    return 4 * ((size + 2) // 3)
+
+def check_attachment_size(file_path, max_bytes=None):
+    """
+    Check an attachment against the payload limit before any API call
+    Returns (payload_bytes, error_message_or_None)
+    """
+    if max_bytes is None:
+        max_bytes = MAX_ATTACHMENT_BYTES
+    payload_bytes = attachment_payload_size(file_path)
+    if payload_bytes > max_bytes:
+        return payload_bytes, (f"Attachment too large: {os.path.basename(file_path)} is "
+                               f"{payload_bytes / 1024:.0f} KB encoded (limit {max_bytes / 1024:.0f} KB)")
+    return payload_bytes, None
+
+def iter_base64_file(file_path, chunk_size=CHUNK_SIZE):
+    """Yield base64-encoded chunks of a file, reusing one read buffer"""
+    if chunk_size % 3:
+        raise ValueError("chunk_size must be a multiple of 3")
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            yield base64.b64encode(view[:read])
+
+class StreamingEmailBody:
+    """
+    Iterable JSON request body for a Brevo email with one file attachment.
+
+    The payload is serialised once with a placeholder where the attachment
+    content goes; iterating yields the JSON before the placeholder, the
+    base64 chunks of the file, then the rest of the JSON. len() gives the
+    exact Content-Length so requests sends it without chunked encoding.
+    """
+
+    def __init__(self, payload, attachment_path, attachment_name=None, chunk_size=CHUNK_SIZE):
+        self.attachment_path = attachment_path
+        self.chunk_size = chunk_size
+        self.attachment_bytes = attachment_payload_size(attachment_path)
+
+        marker = f"__attachment_{uuid.uuid4().hex}__"
+        body = dict(payload)
+        body['attachment'] = [{
+            'content': marker,
+            'name': attachment_name or os.path.basename(attachment_path)
+        }]
+        prefix, suffix = json.dumps(body).split(marker, 1)
+        self.prefix = prefix.encode('utf-8')
+        self.suffix = suffix.encode('utf-8')
+
+    def __len__(self):
+        return len(self.prefix) + self.attachment_bytes + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        for chunk in iter_base64_file(self.attachment_path, self.chunk_size):
+            yield chunk
+        yield self.suffix
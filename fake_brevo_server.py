@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Fake Brevo API Server
+Local stand-in for https://api.brevo.com/v3 used to exercise the email dispatcher
+and messageVersions batch sends without sending real emails. Point the email scripts at it with:
+
+    BREVO_API_URL=http://127.0.0.1:8025/v3 python brevo_email_service.py --data ... --folder ...
+"""
+
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeBrevoState:
+    """Shared counters and rate-limit window for the fake server"""
+
+    def __init__(self, rate_limit=0, fail_rate=0.0, latency=0.0, log_file=None, reject_batches=False):
+        self.rate_limit = rate_limit
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.log_file = log_file
+        self.reject_batches = reject_batches
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats = {'accepted': 0, 'rate_limited': 0, 'failed': 0}
+
+    def check_rate(self):
+        """Return seconds until the window resets if over the limit, otherwise None"""
+        if not self.rate_limit:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            if self.window_count > self.rate_limit:
+                self.stats['rate_limited'] += 1
+                return max(0.1, 1.0 - (now - self.window_start))
+        return None
+
+    def log(self, entry):
+        if not self.log_file:
+            return
+        with self.lock:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+def make_handler(state):
+    class FakeBrevoHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body, headers=None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length)
+
+            if not self.path.rstrip('/').endswith('/smtp/email'):
+                self._reply(404, {'code': 'not_found', 'message': f'Unknown path {self.path}'})
+                return
+            if not self.headers.get('api-key'):
+                self._reply(401, {'code': 'unauthorized', 'message': 'Key not found'})
+                return
+
+            if state.latency:
+                time.sleep(state.latency)
+
+            retry_after = state.check_rate()
+            if retry_after is not None:
+                self._reply(429, {'code': 'too_many_requests', 'message': 'Rate limit exceeded'},
+                            {'Retry-After': f'{retry_after:.2f}',
+                             'x-sib-ratelimit-reset': f'{retry_after:.2f}'})
+                return
+
+            if state.fail_rate and random.random() < state.fail_rate:
+                with state.lock:
+                    state.stats['failed'] += 1
+                self._reply(503, {'code': 'service_unavailable', 'message': 'Try again later'})
+                return
+
+            try:
+                payload = json.loads(raw.decode('utf-8') or '{}')
+            except ValueError:
+                self._reply(400, {'code': 'bad_request', 'message': 'Invalid JSON'})
+                return
+
+            versions = payload.get('messageVersions')
+            if versions is not None:
+                self._batch(payload, versions, length)
+                return
+
+            message_id = f"<{uuid.uuid4().hex}@fake.brevo>"
+            with state.lock:
+                state.stats['accepted'] += 1
+            state.log({
+                'message_id': message_id,
+                'to': [r.get('email') for r in payload.get('to', [])],
+                'subject': payload.get('subject'),
+                'attachments': [a.get('name') for a in payload.get('attachment', []) or []],
+                'bytes': length
+            })
+            self._reply(201, {'messageId': message_id})
+
+        def _batch(self, payload, versions, length):
+            """Batch send: one message per messageVersion, same limits as Brevo"""
+            if state.reject_batches:
+                self._reply(400, {'code': 'invalid_parameter', 'message': 'Batch sending rejected'})
+                return
+            recipients = sum(len(v.get('to') or []) for v in versions)
+            if not versions or any(not v.get('to') or len(v['to']) > 99 for v in versions):
+                self._reply(400, {'code': 'invalid_parameter',
+                                  'message': 'Each messageVersion needs 1-99 recipients in to'})
+                return
+            if recipients > 2000:
+                self._reply(400, {'code': 'invalid_parameter',
+                                  'message': 'Total recipients must not exceed 2000'})
+                return
+
+            message_ids = []
+            for version in versions:
+                message_id = f"<{uuid.uuid4().hex}@fake.brevo>"
+                message_ids.append(message_id)
+                state.log({
+                    'message_id': message_id,
+                    'to': [r.get('email') for r in version['to']],
+                    'subject': version.get('subject', payload.get('subject')),
+                    'params': version.get('params'),
+                    'attachments': [a.get('name') for a in payload.get('attachment', []) or []],
+                    'bytes': length,
+                    'batch': True
+                })
+            with state.lock:
+                state.stats['accepted'] += len(versions)
+                state.stats['batches'] = state.stats.get('batches', 0) + 1
+            self._reply(201, {'messageIds': message_ids})
+
+        def log_message(self, format, *args):
+            print(f"[FAKE-BREVO] {self.address_string()} {format % args}")
+
+    return FakeBrevoHandler
+
+def run_server(host='127.0.0.1', port=8025, **options):
+    """Start the fake server (blocking)"""
+    state = FakeBrevoState(**options)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    print(f"[INFO] Fake Brevo API listening on http://{host}:{port}/v3")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[SUMMARY] {state.stats}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local fake Brevo API for testing email sending')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8025, help='Port (default: 8025)')
+    parser.add_argument('--rate-limit', type=int, default=0,
+                        help='Requests per second before answering 429 (0 = unlimited)')
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with 503 (default: 0)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial delay per request in seconds')
+    parser.add_argument('--log', help='JSON-lines file recording every accepted email')
+    parser.add_argument('--reject-batches', action='store_true',
+                        help='Answer messageVersions requests with 400 to exercise the single-send fallback')
+
+    args = parser.parse_args()
+    run_server(args.host, args.port, rate_limit=args.rate_limit, fail_rate=args.fail_rate,
+               latency=args.latency, log_file=args.log, reject_batches=args.reject_batches)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,11 @@ Consistent filename sanitization for PDF generation and email lookup
 
 import re
 import unicodedata
+from functools import lru_cache
+
+# Compiled once - sanitize_filename runs for every name and policy of a batch
+SPECIAL_CHARS = re.compile(r'[^\w\s-]')
+REPEATED_UNDERSCORES = re.compile(r'_+')
 
 def sanitize_filename(text):
     """
@@ -13,26 +18,32 @@ def sanitize_filename(text):
     """
     if not text:
         return ''
-    
-    # Convert to string and strip whitespace
-    text = str(text).strip()
+    return _sanitize(str(text))
+
+@lru_cache(maxsize=65536)
+def _sanitize(text):
+    # Strip whitespace
+    text = text.strip()
     
     # Normalize Unicode characters (NFD = decomposed form)
     # This converts é to e + combining accent, then we can remove the accent
     normalized = unicodedata.normalize('NFD', text)
     
-    # Remove combining characters (accents) and keep only ASCII
-    ascii_text = ''.join(c for c in normalized if unicodedata.category(c) != 'Mn')
+    # Remove combining characters (accents); plain ASCII has none to remove
+    if normalized.isascii():
+        ascii_text = normalized
+    else:
+        ascii_text = ''.join(c for c in normalized if unicodedata.category(c) != 'Mn')
     
     # Replace special characters with underscores (including / for policy numbers)
     # This ensures 00520/0001149 becomes 00520_0001149
-    clean_text = re.sub(r'[^\w\s-]', '_', ascii_text)
+    clean_text = SPECIAL_CHARS.sub('_', ascii_text)
     
     # Replace spaces with underscores
     clean_text = clean_text.replace(' ', '_')
     
     # Remove multiple consecutive underscores
-    clean_text = re.sub(r'_+', '_', clean_text)
+    clean_text = REPEATED_UNDERSCORES.sub('_', clean_text)
     
     # Remove leading/trailing underscores
     clean_text = clean_text.strip('_')
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Folder Inventory
+Precomputed listing of the output_* / default_* campaign folders for the
+folder endpoints in server.js. Instead of walking every folder on each
+request, the server reads:
+
+  folder_inventory/index.json            one entry per folder (PDF counts,
+                                         sizes, template type, Excel and SMS
+                                         status), newest first
+  folder_inventory/contents/<folder>.json  the PDF files of one folder by
+                                         location (main / protected / unprotected)
+
+Entries are refreshed incrementally: pdf_generator_wrapper.py updates the
+folder it generated and generate_sms_links.py the folder it linked. A full
+rescan (new deployment, folders removed by hand) is one command:
+
+  python folder_inventory.py --rebuild
+  python folder_inventory.py --folder output_sph_october
+"""
+
+import os
+import json
+import time
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+INVENTORY_DIR = "folder_inventory"
+INDEX_FILE = "index.json"
+CONTENTS_DIR = "contents"
+FOLDER_PREFIXES = ('output_', 'default_')
+
+# Same prefix detection as the SMS folder screen
+TEMPLATE_PREFIXES = [
+    ('output_sph_', 'SPH_Fresh.py', 'SPH'),
+    ('output_jph_', 'JPH_Fresh.py', 'JPH'),
+    ('output_company_', 'Company_Fresh.py', 'Company'),
+    ('output_med_sph_', 'MED_SPH_Fresh_Signature.py', 'MED_SPH'),
+    ('output_med_jph_', 'MED_JPH_Fresh_Signature.py', 'MED_JPH')
+]
+
+# A lock older than this is left over from a killed process
+LOCK_STALE_SECONDS = 60
+
+def index_path(base_dir='.'):
+    return os.path.join(base_dir, INVENTORY_DIR, INDEX_FILE)
+
+def contents_path(folder_name, base_dir='.'):
+    return os.path.join(base_dir, INVENTORY_DIR, CONTENTS_DIR, f"{folder_name}.json")
+
+def iso_time(timestamp):
+    """UTC timestamp in the format of JavaScript's Date.toISOString()"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def is_campaign_folder(name, base_dir='.'):
+    return name.startswith(FOLDER_PREFIXES) and os.path.isdir(os.path.join(base_dir, name))
+
+def detect_template(folder_name):
+    for prefix, template, template_type in TEMPLATE_PREFIXES:
+        if folder_name.startswith(prefix):
+            return template, template_type
+    return 'Unknown', 'Unknown'
+
+def list_pdfs(path):
+    """[{filename, size, lastModified}] for the PDFs directly in path"""
+    files = []
+    if not os.path.isdir(path):
+        return files
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.pdf') and entry.is_file():
+                st = entry.stat()
+                files.append({'filename': entry.name, 'size': st.st_size, 'lastModified': iso_time(st.st_mtime)})
+    files.sort(key=lambda f: f['filename'])
+    return files
+
+def find_excel(folder_name, base_dir='.'):
+    """(hasExcelFile, hasFolderSpecificExcel, excelFilePath) - same search order as generate_sms_links.py"""
+    candidates = [
+        os.path.join(folder_name, f"{folder_name}_source.xlsx"),
+        f"{folder_name}_source.xlsx",
+        'Generic_Template_processed.xlsx',
+        'Generic_Template.xlsx'
+    ]
+    candidates += sorted(f for f in os.listdir(base_dir)
+                         if f.startswith('Generic_Template_backup_') and f.endswith('.xlsx'))
+    for candidate in candidates:
+        if os.path.exists(os.path.join(base_dir, candidate)):
+            return True, candidate.endswith(f"{folder_name}_source.xlsx"), candidate
+    return False, False, None
+
+def sms_status(folder_name, pdf_count, base_dir='.'):
+    """Link count and whether the folder's SMS links match its letters"""
+    links_dir = os.path.join(base_dir, 'letter_links', folder_name)
+    status = {'smsLinksGenerated': False, 'smsLinksCount': 0, 'smsFileExists': False,
+              'smsLinksUpToDate': False, 'smsGeneratedAt': None, 'lazyLetters': False}
+    if not os.path.isdir(links_dir):
+        return status
+    names = os.listdir(links_dir)
+    status['smsFileExists'] = 'sms_batch.csv' in names
+    status['smsLinksCount'] = sum(1 for n in names if n.endswith('.json') and n != 'status.json')
+    # Lazy campaigns (generate_sms_links.py --lazy) keep source.xlsx here and have no PDFs
+    status['lazyLetters'] = 'source.xlsx' in names
+    try:
+        with open(os.path.join(links_dir, 'status.json'), 'r', encoding='utf-8') as f:
+            status['smsGeneratedAt'] = json.load(f).get('generatedAt')
+    except (OSError, ValueError):
+        status['smsGeneratedAt'] = iso_time(os.path.getmtime(links_dir))
+    # Links only count as generated while they match the letters
+    up_to_date = status['smsLinksCount'] > 0 and (status['lazyLetters'] or status['smsLinksCount'] == pdf_count)
+    status['smsLinksUpToDate'] = up_to_date
+    status['smsLinksGenerated'] = up_to_date
+    return status
+
+def scan_folder(folder_name, base_dir='.'):
+    """Return (index entry, contents document) for one campaign folder"""
+    # Taken before listing, so a file added during the scan makes the entry look stale
+    indexed_at = iso_time(time.time())
+    folder_path = os.path.join(base_dir, folder_name)
+    files = {
+        'main': list_pdfs(folder_path),
+        'protected': list_pdfs(os.path.join(folder_path, 'protected')),
+        'unprotected': list_pdfs(os.path.join(folder_path, 'unprotected'))
+    }
+    protected_count = len(files['protected'])
+    unprotected_count = len(files['unprotected'])
+    pdf_count = max(protected_count, unprotected_count, len(files['main']))
+
+    if protected_count > 0 and unprotected_count > 0:
+        status = 'complete'
+    elif protected_count > 0 or unprotected_count > 0:
+        status = 'partial'
+    elif pdf_count > 0:
+        status = 'complete'
+    else:
+        status = 'unknown'
+
+    template, template_type = detect_template(folder_name)
+    has_excel, has_folder_excel, excel_path = find_excel(folder_name, base_dir)
+    st = os.stat(folder_path)
+    entry = {
+        'name': folder_name,
+        'template': template,
+        'templateType': template_type,
+        'pdfCount': pdf_count,
+        'protectedCount': protected_count,
+        'unprotectedCount': unprotected_count,
+        'totalPdfFiles': sum(len(f) for f in files.values()),
+        'totalBytes': sum(f['size'] for location in files.values() for f in location),
+        'createdDate': iso_time(getattr(st, 'st_birthtime', st.st_ctime)),
+        'lastModified': iso_time(st.st_mtime),
+        'status': status,
+        'hasExcelFile': has_excel,
+        'hasFolderSpecificExcel': has_folder_excel,
+        'excelFilePath': excel_path,
+        'indexedAt': indexed_at
+    }
+    entry.update(sms_status(folder_name, pdf_count, base_dir))
+    contents = {'folder': folder_name, 'indexedAt': entry['indexedAt'], 'files': files}
+    return entry, contents
+
+def write_json(path, data):
+    """Write via a temp file so readers never see a half-written document"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+@contextmanager
+def inventory_lock(base_dir='.', timeout=30):
+    """Serialize index updates between the wrapper, SMS generation and rebuilds"""
+    lock_path = os.path.join(base_dir, INVENTORY_DIR, 'index.lock')
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Folder inventory is locked: {lock_path}")
+            time.sleep(0.1)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+def load_index(base_dir='.'):
+    try:
+        with open(index_path(base_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'folders': []}
+
+def save_index(folders, base_dir='.'):
+    """Keep only folders with letters (PDFs or lazy letter links), newest first - the order the UI lists them in"""
+    folders = sorted((f for f in folders if f['pdfCount'] > 0 or f['smsLinksCount'] > 0),
+                     key=lambda f: f['lastModified'], reverse=True)
+    write_json(index_path(base_dir), {
+        'updatedAt': iso_time(time.time()),
+        'totalFolders': len(folders),
+        'folders': folders
+    })
+    return folders
+
+def update_folder(folder, base_dir='.'):
+    """
+    Rescan one folder and replace its entry; a folder that no longer exists is dropped.
+    folder may be a name or a path (the wrapper passes an absolute output path).
+    Returns the new entry or None.
+    """
+    folder_name = os.path.basename(os.path.normpath(folder))
+    entry = None
+    contents = None
+    if is_campaign_folder(folder_name, base_dir):
+        entry, contents = scan_folder(folder_name, base_dir)
+
+    with inventory_lock(base_dir):
+        folders = [f for f in load_index(base_dir).get('folders', []) if f['name'] != folder_name]
+        if entry:
+            folders.append(entry)
+            write_json(contents_path(folder_name, base_dir), contents)
+        elif os.path.exists(contents_path(folder_name, base_dir)):
+            os.remove(contents_path(folder_name, base_dir))
+        save_index(folders, base_dir)
+    return entry
+
+def update_folder_safely(folder, base_dir='.'):
+    """update_folder() for job scripts - an inventory failure must not fail the job"""
+    try:
+        return update_folder(folder, base_dir)
+    except Exception as e:
+        print(f"[INVENTORY] Warning: Could not update folder inventory for {folder}: {e}")
+        return None
+
+def rebuild(base_dir='.'):
+    """Rescan every campaign folder and drop contents files of removed folders"""
+    names = sorted(n for n in os.listdir(base_dir) if is_campaign_folder(n, base_dir))
+    scanned = [scan_folder(name, base_dir) for name in names]
+
+    with inventory_lock(base_dir):
+        for entry, contents in scanned:
+            write_json(contents_path(entry['name'], base_dir), contents)
+        contents_dir = os.path.join(base_dir, INVENTORY_DIR, CONTENTS_DIR)
+        os.makedirs(contents_dir, exist_ok=True)
+        for stale in set(os.listdir(contents_dir)) - {f"{name}.json" for name in names}:
+            os.remove(os.path.join(contents_dir, stale))
+        return save_index([entry for entry, _ in scanned], base_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the precomputed folder listing used by the web UI')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--rebuild', action='store_true', help='Rescan all output_* / default_* folders')
+    group.add_argument('--folder', help='Rescan a single folder')
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.rebuild:
+        folders = rebuild()
+        print(f"[INVENTORY] Indexed {len(folders)} folders with letters in {time.time() - start:.1f}s")
+    else:
+        entry = update_folder(args.folder)
+        if entry:
+            print(f"[INVENTORY] {entry['name']}: {entry['pdfCount']} letters "
+                  f"({entry['protectedCount']} protected, {entry['unprotectedCount']} unprotected)")
+        else:
+            print(f"[INVENTORY] {args.folder} is not an existing campaign folder - removed from the inventory")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Run Font Subsets
+reportlab embeds a subset of every TrueType font in each letter, with glyph
+codes handed out in the order characters are first drawn. Two letters whose
+names or addresses use different accented characters therefore carry
+different Cambria font programs, and combining them keeps one copy per letter.
+
+RunFontSubset collects every character the run can print (all Excel cells
+plus common typographic marks) and primes each new canvas with it before
+anything is drawn, so every letter of the run embeds the same subset with
+the same codes. The font streams are then byte-identical and combine tools
+that merge identical objects (combine_pdfs.py streaming mode, print_batches.py)
+store them once per file instead of once per letter.
+"""
+
+import fitz  # PyMuPDF
+from reportlab.pdfbase import pdfmetrics
+
+DEFAULT_FONTS = ('Cambria', 'Cambria-Bold')
+
+# Typographic marks that appear in template text but not in the Excel data
+EXTRA_CHARS = "–—‘’“”•…"
+
+def batch_charset(df, extra_chars=EXTRA_CHARS):
+    """
+    Every non-ASCII character that the run's data can put on a page, sorted.
+    Upper and lower case variants are included since templates re-case names.
+    ASCII is left out: reportlab always reserves codes 32-126 for it.
+    """
+    chars = set(extra_chars)
+    for column in df.columns:
+        for value in df[column].dropna():
+            text = str(value)
+            chars.update(text)
+            chars.update(text.upper())
+            chars.update(text.lower())
+    return ''.join(sorted(ch for ch in chars if ord(ch) > 126))
+
+def open_pdf(pdf):
+    """Open a PDF given as a path or as in-memory bytes"""
+    if isinstance(pdf, (bytes, bytearray)):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(pdf)
+
+def embedded_font_bytes(pdf):
+    """Stored (compressed) size of the font programs embedded in a PDF (path or bytes)"""
+    total = 0
+    with open_pdf(pdf) as doc:
+        for xref in range(1, doc.xref_length()):
+            if doc.xref_get_key(xref, "Type")[1] != "/FontDescriptor":
+                continue
+            for key in ("FontFile2", "FontFile", "FontFile3"):
+                kind, value = doc.xref_get_key(xref, key)
+                if kind == "xref":
+                    total += len(doc.xref_stream_raw(int(value.split()[0])))
+    return total
+
+class RunFontSubset:
+    """
+    One font subset shared by all letters of a run.
+
+    Call apply(c) right after creating each canvas. Characters outside the
+    charset still print - they are simply added after the shared ones, in
+    the same order for every letter using the template's fixed text.
+    """
+
+    def __init__(self, charset, font_names=DEFAULT_FONTS):
+        self.charset = charset
+        self.font_names = tuple(font_names)
+        self.font_bytes = None
+        self.letters = 0
+
+    @classmethod
+    def from_dataframe(cls, df, font_names=DEFAULT_FONTS, extra_chars=EXTRA_CHARS):
+        return cls(batch_charset(df, extra_chars), font_names)
+
+    def apply(self, c):
+        """Assign the run's glyph codes in this canvas before any text is drawn"""
+        if not self.charset:
+            return
+        for font_name in self.font_names:
+            font = pdfmetrics.getFont(font_name)
+            if hasattr(font, 'splitString'):
+                font.splitString(self.charset, c._doc)
+
+    def record(self, pdf):
+        """Count a saved letter; the first one is measured for the summary (path or bytes)"""
+        self.letters += 1
+        if self.font_bytes is None:
+            try:
+                self.font_bytes = embedded_font_bytes(pdf)
+            except Exception as e:
+                print(f"⚠️ Could not measure embedded fonts: {str(e)}")
+                self.font_bytes = 0
+
+    def summary(self):
+        """Run summary line: font bytes each letter no longer adds to a combined file"""
+        font_kb = (self.font_bytes or 0) / 1024
+        saved_mb = (self.font_bytes or 0) * max(self.letters - 1, 0) / (1024 * 1024)
+        return (f"🔤 Run font subset: {len(self.charset)} shared non-ASCII glyphs, "
+                f"{font_kb:.1f} KB of fonts saved per letter when combined "
+                f"(~{saved_mb:.1f} MB over {self.letters} letters)")
@@ -11,7 +11,16 @@ import os
 import sys
 import argparse
 import hashlib
-import requests
+from api_config import HttpClients
+from folder_inventory import update_folder_safely
+from qr_renderer import save_qr_png
+from lazy_letters import LAZY_TEMPLATES, source_row
+from blob_store import BlobStore
+from preflight import run_preflight, SMS_RULES
+from column_manifests import read_policy_sheet, MissingColumnsError
+from output_plan import load_manifest, files_by_row, plan_letters
+from sms_batch_writer import SmsBatchWriter, ShardPublishError, SMS_SHARD_MAX_ROWS, SMS_SHARD_MAX_BYTES
+from short_ids import allocate_short_ids, url_mapping, short_url_for, save_url_mappings
 import subprocess
 import time
 from datetime import datetime, timedelta
@@ -26,56 +35,6 @@ def generate_unique_id(policy_no, index, timestamp=None):
     data = f"{policy_no}-{index}-{timestamp}-{os.urandom(8).hex()}"
     return hashlib.sha256(data.encode()).hexdigest()[:16]
 
-def create_short_url(long_url):
-    """Create custom short URL using nicl.ink domain"""
-    import json
-    import random
-    import string
-    from datetime import datetime, timedelta
-    
-    # Generate unique 6-character short ID (lowercase + digits)
-    chars = string.ascii_lowercase + string.digits
-    short_id = ''.join(random.choice(chars) for _ in range(6))
-    
-    # Load existing mappings
-    try:
-        with open('url_mappings.json', 'r') as f:
-            mappings = json.load(f)
-    except FileNotFoundError:
-        mappings = {}
-    
-    # Ensure unique ID (retry if collision)
-    attempts = 0
-    while short_id in mappings and attempts < 10:
-        short_id = ''.join(random.choice(chars) for _ in range(6))
-        attempts += 1
-    
-    if attempts >= 10:
-        print(f"[WARNING] Could not generate unique short ID after 10 attempts")
-        # Fallback to longer ID
-        short_id = ''.join(random.choice(chars) for _ in range(8))
-    
-    # Store mapping
-    mappings[short_id] = {
-        "url": long_url,
-        "created": datetime.now().isoformat(),
-        "expires": (datetime.now() + timedelta(days=30)).isoformat(),
-        "clicks": 0,
-        "active": True
-    }
-    
-    # Save mappings
-    try:
-        with open('url_mappings.json', 'w') as f:
-            json.dump(mappings, f, indent=2)
-        print(f"[SMS] Created short URL: https://nicl.ink/{short_id} -> {long_url}")
-    except Exception as e:
-        print(f"[SMS] Error saving URL mapping: {e}")
-        # Fallback to original URL if storage fails
-        return long_url
-    
-    return f"https://nicl.ink/{short_id}"
-
 def generate_qr_code_for_customer(policy_no, mobile_no, customer_name, nic):
     """Generate QR code for customer payment"""
     try:
@@ -135,11 +94,11 @@ def generate_qr_code_for_customer(policy_no, mobile_no, customer_name, nic):
             "AdditionalPurposeTransaction": str(nic)
         }
         
-        response = requests.post(
+        response = HttpClients.zwennpay().post(
             "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
             headers={"accept": "text/plain", "Content-Type": "application/json"},
             json=payload,
-            timeout=20
+            timeout=HttpClients.timeout(20)
         )
         
         if response.status_code == 200:
@@ -158,8 +117,12 @@ def generate_qr_code_for_customer(policy_no, mobile_no, customer_name, nic):
         print(f"[SMS] QR generation failed for {policy_no}: {e}")
         return None
 
-def extract_letter_data(row, index, template_type):
-    """Extract letter content data from Excel row"""
+def extract_letter_data(row, index, template_type, qr_fallback=False):
+    """
+    Extract letter content data from Excel row.
+    qr_fallback: pre-flight found the QR fields incomplete - request the QR
+    with fallback data straight away instead of failing a first attempt.
+    """
     
     # Build customer name safely
     name_parts = []
@@ -207,11 +170,16 @@ def extract_letter_data(row, index, template_type):
     nic = str(row.get('NIC', '')) if pd.notna(row.get('NIC', '')) else ''
     
     # Generate QR code for payment
-    qr_code_data = generate_qr_code_for_customer(policy_no, mobile_no, customer_name, nic)
+    qr_code_data = None
+    if not qr_fallback:
+        qr_code_data = generate_qr_code_for_customer(policy_no, mobile_no, customer_name, nic)
     
     # If QR generation failed, try with minimal data (like PDF generation does)
     if not qr_code_data and policy_no:
-        print(f"[SMS] Retrying QR generation with minimal data for {policy_no}")
+        if qr_fallback:
+            print(f"[SMS] Generating QR with fallback data for {policy_no} (incomplete customer data)")
+        else:
+            print(f"[SMS] Retrying QR generation with minimal data for {policy_no}")
         # Try with just policy number and a default mobile if available
         fallback_mobile = mobile_no if mobile_no and str(mobile_no).strip().lower() not in ['nan', 'none', ''] else "57000000"
         fallback_nic = nic if nic and str(nic).strip().lower() not in ['nan', 'none', ''] else "A0000000000000"
@@ -289,27 +257,32 @@ def save_letter_json(unique_id, letter_data, output_folder):
     with open(json_file, 'w', encoding='utf-8') as f:
         json.dump(letter_data, f, indent=2, ensure_ascii=False)
     
-    return json_file
-
-def save_sms_csv(sms_data, output_folder):
-    """Save SMS bulk file as CSV"""
-    letter_links_dir = os.path.join("letter_links", output_folder)
-    os.makedirs(letter_links_dir, exist_ok=True)
-    
-    csv_file = os.path.join(letter_links_dir, "sms_batch.csv")
-    
-    # Create DataFrame and save as CSV
-    df = pd.DataFrame(sms_data)
-    df.to_csv(csv_file, index=False, encoding='utf-8')
+    # Pre-render the payment QR so the letter viewer serves a file instead of rendering it
+    if letter_data.get('qrCodeData'):
+        try:
+            save_qr_png(letter_data['qrCodeData'], letter_links_dir, unique_id)
+        except Exception as e:
+            print(f"[SMS] Warning: Could not pre-render QR for {unique_id}: {e}")
     
-    return csv_file
+    return json_file
 
-def generate_sms_links_for_folder(output_folder, template_type, base_url="https://your-domain.com"):
-    """Generate SMS links for all customers in an output folder"""
+def generate_sms_links_for_folder(output_folder, template_type, base_url="https://your-domain.com", template_file=None, lazy=False,
+                                  shard_rows=SMS_SHARD_MAX_ROWS, shard_bytes=SMS_SHARD_MAX_BYTES):
+    """
+    Generate SMS links for all customers in an output folder.
+    With lazy=True no PDFs are needed: each letter is rendered by template_file
+    the first time its link is opened (see lazy_letters.py).
+    shard_rows / shard_bytes split the SMS bulk file for the gateway (see sms_batch_writer.py).
+    """
     
     print(f"[SMS] Starting SMS link generation for folder: {output_folder}")
     print(f"[SMS] Template type: {template_type}")
     
+    if lazy and template_file not in LAZY_TEMPLATES:
+        print(f"[SMS] ERROR: {template_file} does not support on-demand rendering")
+        print(f"[SMS] Supported templates: {', '.join(LAZY_TEMPLATES)}")
+        return 0
+    
     # IMPORTANT: Clear existing SMS links before generating new ones
     letter_links_dir = os.path.join("letter_links", output_folder)
     if os.path.exists(letter_links_dir):
@@ -365,16 +338,9 @@ def generate_sms_links_for_folder(output_folder, template_type, base_url="https:
         if os.path.exists(file_path):
             try:
                 print(f"[SMS] Attempting to load: {file_path}")
-                df = pd.read_excel(file_path, engine='openpyxl')
-                
-                # Validate the file has required columns
-                required_cols = ['Policy No', 'Arrears Amount']
+                # Only the columns the links use, with compact dtypes (column_manifests.py)
+                df = read_policy_sheet(file_path, 'generate_sms_links.py', prefix='[SMS]')
                 available_cols = list(df.columns)
-                missing_cols = [col for col in required_cols if col not in available_cols]
-                
-                if missing_cols:
-                    print(f"[SMS] File {file_path} missing required columns: {missing_cols}")
-                    continue
                 
                 if len(df) == 0:
                     print(f"[SMS] File {file_path} is empty")
@@ -385,6 +351,9 @@ def generate_sms_links_for_folder(output_folder, template_type, base_url="https:
                 print(f"[SMS] Available columns: {available_cols}")
                 break
                 
+            except MissingColumnsError as e:
+                print(f"[SMS] File {file_path} missing required columns: {e.missing}")
+                continue
             except Exception as e:
                 print(f"[SMS] Failed to load {file_path}: {e}")
                 continue
@@ -402,16 +371,58 @@ def generate_sms_links_for_folder(output_folder, template_type, base_url="https:
     protected_folder = os.path.join(output_folder, "protected")
     unprotected_folder = os.path.join(output_folder, "unprotected")
     
-    if not os.path.exists(protected_folder) and not os.path.exists(unprotected_folder):
+    source_excel = None
+    template_rows = None
+    if lazy:
+        # Letters are rendered on first access from their row, stored in the letter
+        # record with the template's dtypes; source.xlsx is kept for reference
+        source_excel = os.path.join(letter_links_dir, "source.xlsx")
+        BlobStore().link(used_file, source_excel)
+        # The campaign folder holds no PDFs but is what the folder listings show
+        os.makedirs(output_folder, exist_ok=True)
+        try:
+            template_rows = read_policy_sheet(used_file, template_file, prefix='[SMS]')
+        except MissingColumnsError as e:
+            print(f"[SMS] ERROR: {used_file} is missing columns {template_file} needs: {e.missing}")
+            return 0
+        print(f"[SMS] Lazy mode: letters will be rendered by {template_file} on first access")
+    elif not os.path.exists(protected_folder) and not os.path.exists(unprotected_folder):
         print(f"[SMS] ERROR: No PDF folders found in {output_folder}")
         print(f"[SMS] Please generate PDFs first before creating SMS links")
         return 0
     
-    letter_links = []
-    sms_data = []
+    json_files_created = 0
+    total_records = len(df)
+    
+    # Pre-flight: skip rows without mobile or policy number before any QR call
+    df, row_checks = run_preflight(df, SMS_RULES, letter_links_dir, label='[SMS]')
+    
+    # PDF names from the folder's output manifest; lazy campaigns and folders
+    # generated before manifests existed are planned the same way here
+    planned_files = files_by_row(load_manifest(output_folder))
+    if not planned_files and template_file:
+        output_plan = plan_letters(df, template_file)
+        if output_plan is not None:
+            planned_files = output_plan['file'].to_dict()
     
     print(f"[SMS] Processing {len(df)} records...")
     
+    # Short IDs for the whole campaign in one allocation; the mappings of the
+    # rows written so far are saved before each shard (or the bulk file) is
+    # published, so a shard uploaded early only carries links that resolve
+    short_id_pool = iter(allocate_short_ids(len(df)))
+    new_mappings = {}
+    
+    def save_new_mappings():
+        if new_mappings and not save_url_mappings(new_mappings):
+            return False
+        new_mappings.clear()
+        return True
+    
+    # SMS rows go straight to the bulk file (and its shards) as they are produced
+    sms_writer = SmsBatchWriter(letter_links_dir, shard_rows, shard_bytes, before_publish=save_new_mappings)
+    publish_failed = False
+    
     for index, row in df.iterrows():
         try:
             # Extract customer data
@@ -432,22 +443,34 @@ def generate_sms_links_for_folder(output_folder, template_type, base_url="https:
             unique_id = generate_unique_id(policy_no, index)
             
             # Extract letter data
-            letter_data = extract_letter_data(row, index, template_type)
+            letter_data = extract_letter_data(row, index, template_type,
+                                              qr_fallback=row_checks.at[index, 'status'] == 'fallback')
             
             # Add PDF path information
-            safe_policy = policy_no.replace('/', '_').replace('\\', '_')
-            safe_name = letter_data['customerName'].replace(' ', '_').replace('/', '_').replace('\\', '_')
-            
-            # Use sequence number for PDF filename (matching PDF generation logic)
-            pdf_filename = f"{index+1:03d}_{safe_policy}_{safe_name}.pdf"
+            pdf_filename = planned_files.get(index)
+            if not pdf_filename:
+                safe_policy = policy_no.replace('/', '_').replace('\\', '_')
+                safe_name = letter_data['customerName'].replace(' ', '_').replace('/', '_').replace('\\', '_')
+                
+                # Use sequence number for PDF filename (matching PDF generation logic)
+                pdf_filename = f"{index+1:03d}_{safe_policy}_{safe_name}.pdf"
             letter_data["pdfPath"] = f"/{output_folder}/protected/{pdf_filename}"
-            
-            # Save letter data as JSON
-            json_file = save_letter_json(unique_id, letter_data, output_folder)
+            if lazy:
+                letter_data["lazy"] = True
+                letter_data["template"] = template_file
+                letter_data["sourceExcel"] = source_excel
+                letter_data["sourceRow"], letter_data["sourceRowDates"] = source_row(template_rows.loc[index])
             
             # Generate URLs
             long_url = f"{base_url}/letter/{unique_id}"
-            short_url = create_short_url(long_url)
+            short_id = next(short_id_pool)
+            new_mappings[short_id] = url_mapping(long_url)
+            short_url = short_url_for(short_id)
+            # Email letter-link mode (brevo_email_service.py --link-letters) sends this URL
+            letter_data["letterUrl"] = long_url
+            
+            # Save letter data as JSON
+            json_file = save_letter_json(unique_id, letter_data, output_folder)
             
             # Extract customer details for new CSV format
             customer_title = str(row.get('Owner 1 Title', '')).strip() if pd.notna(row.get('Owner 1 Title', '')) else ''
@@ -497,7 +520,7 @@ def generate_sms_links_for_folder(output_folder, template_type, base_url="https:
             sms_text = f"Valued Client, your {policy_type} Policy {policy_no} is in arrears for an amount of {arrears_formatted} as at {month_name} {year}. View Details : {short_url} Password: Your National ID. Thank you - NIC Team Tel 602 3315 for info."
             
             # Prepare SMS data with new format
-            sms_data.append({
+            sms_writer.write({
                 'SN': index + 1,                    # Sequential number
                 'Surname': customer_surname,        # Last name only
                 'First Name': first_name_combined,  # Title + First Name
@@ -506,37 +529,50 @@ def generate_sms_links_for_folder(output_folder, template_type, base_url="https:
                 'Message Text': sms_text            # New message format
             })
             
-            letter_links.append({
-                'unique_id': unique_id,
-                'policy_no': policy_no,
-                'customer_name': letter_data['customerName'],
-                'mobile': mobile,
-                'long_url': long_url,
-                'short_url': short_url
-            })
+            json_files_created += 1
             
             if (index + 1) % 50 == 0:
                 print(f"[SMS] Processed {index + 1}/{len(df)} records...")
         
+        except ShardPublishError:
+            # No later shard could be published either
+            publish_failed = True
+            break
         except Exception as e:
             print(f"[SMS] Error processing row {index + 1}: {e}")
             continue
     
-    # Save SMS bulk file
-    if sms_data:
-        csv_file = save_sms_csv(sms_data, output_folder)
+    # Finish SMS bulk file
+    if sms_writer.rows and not publish_failed:
+        try:
+            sms_writer.close()
+        except ShardPublishError:
+            publish_failed = True
+    
+    # Short links must resolve before the SMS file is handed over
+    if publish_failed:
+        sms_writer.abort()
+        print("[SMS] ERROR: Short URL mappings could not be saved - SMS file and shards withdrawn")
+        return 0
+    
+    if sms_writer.rows:
+        csv_file = sms_writer.path
         print(f"[SMS] SMS bulk file saved: {csv_file}")
-        print(f"[SMS] Generated {len(sms_data)} SMS links successfully")
+        print(f"[SMS] Generated {sms_writer.rows} SMS links successfully")
         
         # Print summary
         print(f"\n[SMS] SUMMARY:")
-        print(f"[SMS] - Total records processed: {len(df)}")
-        print(f"[SMS] - SMS links generated: {len(sms_data)}")
-        print(f"[SMS] - JSON files created: {len(letter_links)}")
-        print(f"[SMS] - SMS bulk file: {csv_file}")
+        print(f"[SMS] - Total records processed: {total_records}")
+        print(f"[SMS] - SMS links generated: {sms_writer.rows}")
+        print(f"[SMS] - JSON files created: {json_files_created}")
+        print(f"[SMS] - SMS bulk file: {sms_writer.summary()}")
+        
+        # Show the new SMS status in the folder listing
+        update_folder_safely(output_folder)
         
-        return len(sms_data)
+        return sms_writer.rows
     else:
+        sms_writer.abort()
         print("[SMS] No valid SMS data generated")
         return 0
 
@@ -547,6 +583,11 @@ def main():
     parser.add_argument('--folder', required=True, help='Output folder containing PDFs')
     parser.add_argument('--template', required=True, help='Template type (e.g., SPH_Fresh.py)')
     parser.add_argument('--base-url', default='https://your-domain.com', help='Base URL for letter viewer')
+    parser.add_argument('--lazy', action='store_true', help='Do not require PDFs - render each letter when its link is first opened')
+    parser.add_argument('--shard-rows', type=int, default=SMS_SHARD_MAX_ROWS,
+                        help='Split the SMS bulk file into shards of at most this many rows (0 = no limit)')
+    parser.add_argument('--shard-bytes', type=int, default=SMS_SHARD_MAX_BYTES,
+                        help='Split the SMS bulk file into shards of at most this many bytes (0 = no limit)')
     
     args = parser.parse_args()
     
@@ -554,7 +595,8 @@ def main():
     template_type = args.template.replace('.py', '').replace('_Fresh', '').replace('_Signature', '')
     
     try:
-        links_generated = generate_sms_links_for_folder(args.folder, template_type, args.base_url)
+        links_generated = generate_sms_links_for_folder(args.folder, template_type, args.base_url, args.template, args.lazy,
+                                                        args.shard_rows, args.shard_bytes)
         
         if links_generated > 0:
             print(f"\n[SMS] SUCCESS: Generated {links_generated} SMS links")
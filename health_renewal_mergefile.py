@@ -9,6 +9,7 @@ import os
 import glob
 import fitz  # PyMuPDF
 from datetime import datetime
+from combine_pdfs import combine_pdfs_streaming
 
 def merge_all_renewal_letters():
     """Merge all healthcare renewal letters into a single PDF for printing"""
@@ -42,55 +43,25 @@ def merge_all_renewal_letters():
     print()
     
     try:
-        # Create new merged document
-        merged_doc = fitz.open()
-        
-        total_pages = 0
-        processed_files = 0
-        
-        for i, pdf_file in enumerate(pdf_files, 1):
-            try:
-                filename = os.path.basename(pdf_file)
-                print(f"🔄 Processing ({i}/{len(pdf_files)}): {filename}")
-                
-                # Open the renewal letter PDF
-                letter_doc = fitz.open(pdf_file)
-                page_count = letter_doc.page_count
-                
-                # Add all pages from this renewal letter
-                for page_num in range(page_count):
-                    merged_doc.insert_pdf(letter_doc, from_page=page_num, to_page=page_num)
-                
-                letter_doc.close()
-                
-                total_pages += page_count
-                processed_files += 1
-                
-                print(f"   ✅ Added {page_count} pages")
-                
-            except Exception as e:
-                print(f"   ❌ Failed to process {filename}: {str(e)}")
-                continue
-        
+        # Merge in bounded-memory chunks (shared logos/fonts deduplicated per chunk)
+        processed_files, failed_files = combine_pdfs_streaming(pdf_files, output_filename)
         if processed_files == 0:
             print("❌ No files could be processed successfully!")
-            merged_doc.close()
             return
         
-        # Save the merged PDF
-        print(f"\n💾 Saving merged PDF...")
-        merged_doc.save(output_filename)
-        merged_doc.close()
-        
         # Verify the output file
         if os.path.exists(output_filename):
             file_size = os.path.getsize(output_filename)
             file_size_mb = file_size / (1024 * 1024)
+            with fitz.open(output_filename) as merged_doc:
+                total_pages = merged_doc.page_count
             
             print(f"\n🎉 Merge completed successfully!")
             print(f"📄 Output file: {output_filename}")
             print(f"📊 Statistics:")
             print(f"   • Processed files: {processed_files}/{len(pdf_files)}")
+            if failed_files:
+                print(f"   • Failed files: {failed_files}")
             print(f"   • Total pages: {total_pages}")
             print(f"   • File size: {file_size_mb:.2f} MB")
             print(f"\n📋 Ready for printing!")
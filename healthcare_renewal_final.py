@@ -8,7 +8,15 @@ from datetime import datetime
 # Set UTF-8 encoding for stdout to handle Unicode characters
 if sys.stdout.encoding != 'utf-8':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-import requests
+from api_config import HttpClients
+from letter_index import record_letter
+from letter_blocks import layout_paragraph
+from font_subsets import RunFontSubset
+from preflight import run_preflight, HEALTHCARE_RULES
+from date_columns import parse_date_column, format_date_column
+from column_manifests import read_policy_sheet
+from output_plan import plan_outputs, joined_text, save_manifest
+from output_profiles import OutputProfile, SizeReport
 import segno
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
@@ -21,9 +29,7 @@ from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER, TA_LEFT
 from reportlab.lib.colors import gray, blue, Color
 
 import os
-import re
 from datetime import datetime
-from reportlab.lib.utils import ImageReader
 from PyPDF2 import PdfFileReader, PdfFileWriter
 
 # Verify font files exist
@@ -45,7 +51,7 @@ except Exception as e:
 
 # Read the Excel file containing renewal data
 try:
-    df = pd.read_excel("RENEWAL_LISTING.xlsx", engine='openpyxl')
+    df = read_policy_sheet("RENEWAL_LISTING.xlsx", 'healthcare_renewal_final.py')
     print(f"[OK] Excel file loaded successfully with {len(df)} rows")
     print(f"[INFO] Available columns: {list(df.columns)}")
     
@@ -71,6 +77,39 @@ if len(sys.argv) > 1:
 os.makedirs(output_folder, exist_ok=True)
 print(f"[INFO] Using output folder: {output_folder}")
 
+# --merge-forms: attach the HealthSense forms while generating, so each letter is
+# written once in its final form instead of being rebuilt later by simple_merge.py
+appendix_merger = None
+if '--merge-forms' in sys.argv:
+    from appendix_merge import AppendixMerger, missing_appendix_forms
+    for missing_form in missing_appendix_forms():
+        print(f"[WARNING] Form not found, it will not be attached: {missing_form}")
+    appendix_merger = AppendixMerger()
+    print(f"[INFO] Attaching {appendix_merger.page_count} form pages to each letter")
+merged_count = 0
+merged_pages = 0
+
+# --profile print|email|web: logo resolution, QR rendering and stream compression
+letter_profile = OutputProfile.from_argv(sys.argv)
+size_report = SizeReport()
+print(f"[INFO] Output profile: {letter_profile.name}")
+
+# Pre-flight: classify every row up front so rows that would be skipped cost no
+# QR call or render (report: <output>/validation_report.csv)
+df, row_checks = run_preflight(df, HEALTHCARE_RULES, output_folder, id_column='POL_NO')
+
+# Plan every output file name up front - letters are named policy_name.pdf, so
+# repeated policy/name pairs get a numeric suffix instead of overwriting
+output_plan = plan_outputs(joined_text(df, ['POL_NO']), joined_text(df, ['TITLE', 'NAME', 'SURNAME']),
+                           '{policy}_{name}', output_folder)
+save_manifest(output_folder, output_plan, 'healthcare_renewal_final.py')
+
+# --font-subset: give every letter of the run the same embedded font subset so
+# combined files (print batches, combine_pdfs.py) store the fonts only once
+font_subset = RunFontSubset.from_dataframe(df) if '--font-subset' in sys.argv else None
+if font_subset:
+    print(f"[INFO] Run font subset enabled: {len(font_subset.charset)} non-ASCII glyphs shared by all letters")
+
 # Define custom paragraph styles with proper spacing
 styles = {}
 
@@ -147,18 +186,19 @@ styles['SmallText'] = ParagraphStyle(
     alignment=TA_JUSTIFY
 )
 
-# Function to format dates
-def format_date(date_value):
-    if pd.isna(date_value):
-        return ""
-    try:
-        if isinstance(date_value, (int, float)):
-            date_obj = pd.to_datetime(date_value, origin='1899-12-30', unit='D')
+# Format the date columns for the whole listing at once: Excel serial numbers,
+# date cells and text dates (format inferred per column, leftovers one by one)
+def format_date_columns(df, columns):
+    formatted = {}
+    for column in columns:
+        if column in df.columns:
+            parsed = parse_date_column(df[column], excel_serial=True, fallback=pd.to_datetime)
+            formatted[column] = format_date_column(parsed, df[column])
         else:
-            date_obj = pd.to_datetime(date_value)
-        return date_obj.strftime('%d %B %Y')
-    except:
-        return str(date_value)
+            formatted[column] = pd.Series('', index=df.index, dtype=object)
+    return formatted
+
+date_text = format_date_columns(df, ['EXPIRY_POL_FROM_DT', 'EXPIRY_POL_TO_DT', 'REN_POL_START_DT', 'REN_POL_TO_DT'])
 
 # Function to format currency (rounded to avoid decimals)
 def format_currency(amount):
@@ -171,8 +211,7 @@ def format_currency(amount):
 # Function to add content with proper spacing
 def add_paragraph(c, text, style, x, y, max_width):
     """Add a paragraph and return the new y position"""
-    para = Paragraph(text, style)
-    para.wrapOn(c, max_width, 1000)
+    para = layout_paragraph(text, style, max_width)
     para.drawOn(c, x, y - para.height)
     return y - para.height - style.spaceAfter
 
@@ -183,8 +222,8 @@ def check_new_page(c, y_pos, required_space, width, height, margin):
         
         # Add NIC logo to new page as well
         if os.path.exists("NICLOGO.jpg"):
-            nic_logo_img = ImageReader("NICLOGO.jpg")
             nic_logo_width = 120
+            nic_logo_img = letter_profile.image("NICLOGO.jpg", nic_logo_width)
             nic_logo_height = nic_logo_width * (nic_logo_img.getSize()[1] / nic_logo_img.getSize()[0])
             nic_logo_x = (width - nic_logo_width) / 2  # Center horizontally
             nic_logo_y = height - nic_logo_height - 20  # Top of page
@@ -195,8 +234,9 @@ def check_new_page(c, y_pos, required_space, width, height, margin):
         else:
             return height - margin
     return y_pos# Process each row in the DataFrame
-for index, row in df.iterrows():
-    print(f"[PROCESSING] Row {index + 1} of {len(df)}")
+# current_row counts the rows left after pre-flight; index is the Excel row
+for current_row, (index, row) in enumerate(df.iterrows(), 1):
+    print(f"[PROCESSING] Row {current_row} of {len(df)}")
     
     # Extract data from Excel columns
     pol_no = str(row.get('POL_NO', '')) if pd.notna(row.get('POL_NO', '')) else ''
@@ -241,30 +281,20 @@ for index, row in df.iterrows():
     except (ValueError, TypeError):
         mobile_no = ''
     
-    # Skip if essential data is missing
-    if not pol_no or not name:
-        print(f"⚠️ Skipping row {index + 1}: Missing essential data")
-        continue
-    
     # Create full customer name
     full_customer_name = f"{title} {name} {surname}".strip()
     
-    # Create filename-safe names
-    try:
-        from filename_utils import sanitize_filename
-        safe_name = sanitize_filename(full_customer_name)
-        safe_policy = sanitize_filename(pol_no)
-    except ImportError:
-        safe_name = re.sub(r'[^\w\s-]', '', full_customer_name).strip().replace(' ', '_')
-        safe_policy = re.sub(r'[^\w\s-]', '_', pol_no).strip()
+    # File names were planned for the whole batch before the loop (output_plan.py)
+    safe_name = output_plan.at[index, 'safe_name']
+    safe_policy = output_plan.at[index, 'safe_policy']
     
     print(f"[DEBUG] Processing: {full_customer_name} - Policy: {pol_no}")
     
     # Format dates
-    expiry_from_formatted = format_date(expiry_from)
-    expiry_to_formatted = format_date(expiry_to)
-    renewal_start_formatted = format_date(renewal_start)
-    renewal_end_formatted = format_date(renewal_end)
+    expiry_from_formatted = date_text['EXPIRY_POL_FROM_DT'].at[index]
+    expiry_to_formatted = date_text['EXPIRY_POL_TO_DT'].at[index]
+    renewal_start_formatted = date_text['REN_POL_START_DT'].at[index]
+    renewal_end_formatted = date_text['REN_POL_TO_DT'].at[index]
     
     # Create cover period string
     cover_period = f"{expiry_from_formatted} to {expiry_to_formatted}"    
@@ -320,11 +350,11 @@ for index, row in df.iterrows():
             "AdditionalPurposeTransaction": "Healthcare Renewal"
         }
         
-        response = requests.post(
+        response = HttpClients.zwennpay().post(
             "https://api.zwennpay.com:9425/api/v1.0/Common/GetMerchantQR",
             headers={"accept": "text/plain", "Content-Type": "application/json"},
             json=payload,
-            timeout=20
+            timeout=HttpClients.timeout(20)
         )
         
         if response.status_code == 200:
@@ -341,16 +371,20 @@ for index, row in df.iterrows():
 
     except Exception as e:
         print(f"⚠️ Error generating QR for {full_customer_name}: {str(e)}")    # Create PDF
-    pdf_filename = f"{output_folder}/{safe_policy}_{safe_name}.pdf"
-    c = canvas.Canvas(pdf_filename, pagesize=A4)
+    pdf_filename = f"{output_folder}/{output_plan.at[index, 'file']}"
+    # With --merge-forms the letter is drawn into memory and merged before it is written
+    letter_buffer = io.BytesIO() if appendix_merger else None
+    c = canvas.Canvas(letter_buffer if appendix_merger else pdf_filename, pagesize=A4, pageCompression=letter_profile.page_compression)
+    if font_subset:
+        font_subset.apply(c)
     width, height = A4
     margin = 50
     content_width = width - 2 * margin
     
     # Add NIC logo at the top center of page 1
     if os.path.exists("NICLOGO.jpg"):
-        nic_logo_img = ImageReader("NICLOGO.jpg")
         nic_logo_width = 120
+        nic_logo_img = letter_profile.image("NICLOGO.jpg", nic_logo_width)
         nic_logo_height = nic_logo_width * (nic_logo_img.getSize()[1] / nic_logo_img.getSize()[0])
         nic_logo_x = (width - nic_logo_width) / 2  # Center horizontally
         nic_logo_y = height - nic_logo_height - 20  # Top of page
@@ -364,8 +398,8 @@ for index, row in df.iterrows():
     
     # Add NIC I.sphere app QR codes (top right) - even larger size
     if os.path.exists("isphere_logo.jpg"):
-        isphere_img = ImageReader("isphere_logo.jpg")
         isphere_width = 220  # Increased from 200 to 220 for better visibility
+        isphere_img = letter_profile.image("isphere_logo.jpg", isphere_width)
         isphere_height = isphere_width * (isphere_img.getSize()[1] / isphere_img.getSize()[0])
         # Align right edge of logo with text right margin (width - margin)
         isphere_x = width - margin - isphere_width
@@ -381,8 +415,7 @@ for index, row in df.iterrows():
     # Add current date (top left) - positioned ABOVE address
     current_date = datetime.now().strftime("%d %B %Y")
     date_y_pos = height - 160  # Fixed position above address area
-    date_para = Paragraph(current_date, styles['SalutationText'])
-    date_para.wrapOn(c, content_width, height)
+    date_para = layout_paragraph(current_date, styles['SalutationText'], content_width)
     date_para.drawOn(c, margin, date_y_pos)
     
     # Position customer address for window envelope (UNCHANGED - keeps horizontal alignment with I.sphere)
@@ -399,8 +432,7 @@ for index, row in df.iterrows():
     # Use fixed positioning for envelope window (UNCHANGED)
     temp_y = envelope_address_y
     for line in address_lines:
-        addr_para = Paragraph(line, styles['AddressText'])
-        addr_para.wrapOn(c, content_width - 20, height)
+        addr_para = layout_paragraph(line, styles['AddressText'], content_width - 20)
         addr_para.drawOn(c, envelope_address_x, temp_y)
         temp_y -= addr_para.height + 3
     
@@ -521,8 +553,8 @@ for index, row in df.iterrows():
         
         # Calculate positions for all elements to determine box height (larger sizes)
         if os.path.exists("maucas2.jpeg"):
-            img = ImageReader("maucas2.jpeg")
             img_width = 110  # Increased for better visibility
+            img = letter_profile.image("maucas2.jpeg", img_width)
             img_height = img_width * (img.getSize()[1] / img.getSize()[0])
             temp_y -= img_height + 4  # Slightly more spacing
         
@@ -530,8 +562,8 @@ for index, row in df.iterrows():
         temp_y -= 12 + 4   # Text height + better spacing
         
         if os.path.exists("zwennPay.jpg"):
-            zwenn_img = ImageReader("zwennPay.jpg")
             zwenn_width = 80  # Increased back to original size
+            zwenn_img = letter_profile.image("zwennPay.jpg", zwenn_width)
             zwenn_height = zwenn_width * (zwenn_img.getSize()[1] / zwenn_img.getSize()[0])
             temp_y -= zwenn_height
         
@@ -549,8 +581,8 @@ for index, row in df.iterrows():
         
         # Add maucas logo (centered, larger size)
         if os.path.exists("maucas2.jpeg"):
-            img = ImageReader("maucas2.jpeg")
             img_width = 110  # Increased for better visibility
+            img = letter_profile.image("maucas2.jpeg", img_width)
             img_height = img_width * (img.getSize()[1] / img.getSize()[0])
             logo_x = page_center_x - (img_width / 2)
             c.drawImage(img, logo_x, y_pos - img_height, width=img_width, height=img_height)
@@ -559,7 +591,7 @@ for index, row in df.iterrows():
         # Add QR code (centered, larger size for better scanning)
         qr_size = 100  # Increased from 85 to 100 for much better scanning
         qr_x = page_center_x - (qr_size / 2)
-        c.drawImage(qr_filename, qr_x, y_pos - qr_size, width=qr_size, height=qr_size)
+        letter_profile.draw_qr(c, qr, qr_filename, qr_x, y_pos - qr_size, qr_size)
         y_pos -= qr_size + 4  # Slightly more spacing
         
         # Add "NIC Health Insurance" text below QR code (centered)
@@ -571,8 +603,8 @@ for index, row in df.iterrows():
         
         # Add ZwennPay logo below the text (centered)
         if os.path.exists("zwennPay.jpg"):
-            zwenn_img = ImageReader("zwennPay.jpg")
             zwenn_width = 80
+            zwenn_img = letter_profile.image("zwennPay.jpg", zwenn_width)
             zwenn_height = zwenn_width * (zwenn_img.getSize()[1] / zwenn_img.getSize()[0])
             zwenn_x = page_center_x - (zwenn_width / 2)
             c.drawImage(zwenn_img, zwenn_x, y_pos - zwenn_height, width=zwenn_width, height=zwenn_height)
@@ -643,12 +675,45 @@ for index, row in df.iterrows():
     y_pos = add_paragraph(c, "Encl.: Renewal Acceptance Form", styles['BodyText'], margin, y_pos, content_width)
     
     # Save PDF
+    letter_pages = c.getPageNumber()
     c.save()
-    
+
+    if appendix_merger:
+        letter_bytes = letter_buffer.getvalue()
+        try:
+            pdf_bytes, page_count = appendix_merger.merge_bytes(letter_bytes)
+            merged_count += 1
+            merged_pages += page_count
+        except Exception as e:
+            # Keep the plain letter rather than losing the customer
+            print(f"⚠️ Could not attach forms for {full_customer_name}: {str(e)}")
+            pdf_bytes, page_count = letter_bytes, None
+        temp_filename = pdf_filename + ".tmp"
+        with open(temp_filename, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(temp_filename, pdf_filename)
+        if page_count:
+            print(f"📎 Forms attached for {full_customer_name} ({page_count} pages)")
+            letter_pages = page_count
+
+    record_letter(output_folder, pdf_filename, letter_pages, pol_no, address_lines)
+    if font_subset:
+        # Measure the letter itself, not the attached forms
+        font_subset.record(letter_buffer.getvalue() if appendix_merger else pdf_filename)
+    size_report.add(pdf_filename)
+
     print(f"✅ Healthcare renewal PDF generated for {full_customer_name}")
     
     # Clean up QR file
     if qr_filename and os.path.exists(qr_filename):
         os.remove(qr_filename)
 
+if appendix_merger:
+    appendix_merger.close()
+    print(f"📎 Forms attached to {merged_count} letters ({merged_pages} pages total) - simple_merge.py is not needed for this run")
+
+if font_subset:
+    print(font_subset.summary())
+print(size_report.summary(letter_profile.name))
+
 print(f"🎉 Healthcare renewal script completed. Processed {len(df)} rows total.")
\ No newline at end of file
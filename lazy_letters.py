@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Lazy Letters
+On-demand rendering for SMS-only campaigns. With generate_sms_links.py --lazy
+no PDFs are generated up front; each letter record carries its row of the
+campaign's source Excel file instead (sourceRow, read with the template's
+column dtypes when the links are generated). The first time a customer
+opens the link, server.js runs
+
+  python lazy_letters.py --render letter_links/<folder>/<id>.json
+
+which renders that single row with the campaign's template (the template is
+run with --input on a one-row Excel file) and keeps the protected PDF in
+letter_cache/<id>/protected.pdf. Later opens are served from the cache.
+Records without a sourceRow are rendered from their sourceExcel copy.
+
+The cache is bounded: --evict removes letters not opened for
+LETTER_CACHE_DAYS and then the least recently opened ones until the cache is
+under LETTER_CACHE_MAX_MB. server.js runs it every 15 minutes rather than
+after each render, since it walks the whole cache. Evicted letters are
+simply rendered again.
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import argparse
+import subprocess
+from datetime import datetime, date
+import pandas as pd
+from column_manifests import read_policy_sheet
+
+LETTER_CACHE_DIR = os.getenv('LETTER_CACHE_DIR', 'letter_cache')
+LETTER_CACHE_MAX_MB = float(os.getenv('LETTER_CACHE_MAX_MB', 500))
+LETTER_CACHE_DAYS = float(os.getenv('LETTER_CACHE_DAYS', 30))
+RENDER_TIMEOUT_SECONDS = 180
+PROTECTED_FILE = "protected.pdf"
+
+# Templates that write protected/ and unprotected/ letters and accept --input
+LAZY_TEMPLATES = (
+    'SPH_Fresh.py',
+    'JPH_Fresh.py',
+    'Company_Fresh.py',
+    'MED_SPH_Fresh_Signature.py',
+    'MED_JPH_Fresh_Signature.py'
+)
+
+def cache_dir(unique_id, cache_root=LETTER_CACHE_DIR):
+    return os.path.join(cache_root, unique_id)
+
+def cached_letter_path(unique_id, cache_root=LETTER_CACHE_DIR):
+    return os.path.join(cache_dir(unique_id, cache_root), PROTECTED_FILE)
+
+def source_row(row):
+    """(JSON-safe values, date columns) of one template row, stored in the letter record"""
+    values = {}
+    dates = []
+    for column, value in row.items():
+        if pd.isna(value):
+            value = None
+        elif isinstance(value, (datetime, date)):
+            value = value.isoformat()
+            dates.append(column)
+        elif hasattr(value, 'item'):
+            # numpy scalar
+            value = value.item()
+        values[column] = value
+    return values, dates
+
+def row_frame(record, template):
+    """One-row DataFrame for the template - from the record, else from the source Excel"""
+    if 'sourceRow' in record:
+        df = pd.DataFrame([record['sourceRow']])
+        for column in record.get('sourceRowDates', []):
+            df[column] = pd.to_datetime(df[column])
+        return df
+    df = read_policy_sheet(record['sourceExcel'], template, prefix='[LAZY]')
+    return df.iloc[[record['rowIndex']]]
+
+def render_lock(path, timeout=RENDER_TIMEOUT_SECONDS):
+    """Wait for / take the per-letter lock so two opens do not render twice"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > timeout:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Letter is still being rendered: {path}")
+            time.sleep(0.2)
+
+def render_letter(record, cache_root=LETTER_CACHE_DIR):
+    """
+    Return the cached protected PDF for a lazy letter record, rendering it first
+    if needed. Raises on failure.
+    """
+    unique_id = record['id']
+    pdf_path = cached_letter_path(unique_id, cache_root)
+    if os.path.exists(pdf_path):
+        os.utime(pdf_path, None)
+        return pdf_path
+
+    template = record.get('template')
+    if template not in LAZY_TEMPLATES:
+        raise ValueError(f"Template {template} does not support on-demand rendering")
+
+    letter_dir = cache_dir(unique_id, cache_root)
+    os.makedirs(letter_dir, exist_ok=True)
+    lock_path = os.path.join(letter_dir, "render.lock")
+    fd = render_lock(lock_path)
+    try:
+        # Rendered by another request while we waited
+        if os.path.exists(pdf_path):
+            return pdf_path
+
+        render_dir = os.path.join(letter_dir, "render")
+        row_file = os.path.join(letter_dir, "row.xlsx")
+        row_frame(record, template).to_excel(row_file, index=False, engine='openpyxl')
+        try:
+            result = subprocess.run(
+                [sys.executable, template, '--input', row_file, '--output', render_dir],
+                capture_output=True, text=True, encoding='utf-8', errors='replace',
+                timeout=RENDER_TIMEOUT_SECONDS
+            )
+        finally:
+            # The row holds customer data - keep only the rendered letter
+            os.remove(row_file)
+
+        rendered = sorted(glob.glob(os.path.join(render_dir, 'protected', '*.pdf')))
+        if result.returncode != 0 or not rendered:
+            shutil.rmtree(render_dir, ignore_errors=True)
+            raise RuntimeError(f"{template} exited with code {result.returncode}: "
+                               f"{(result.stderr or result.stdout)[-500:]}")
+        os.replace(rendered[0], pdf_path)
+        shutil.rmtree(render_dir, ignore_errors=True)
+        return pdf_path
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+def evict(cache_root=LETTER_CACHE_DIR, max_mb=LETTER_CACHE_MAX_MB, max_days=LETTER_CACHE_DAYS):
+    """
+    Drop cached letters not opened for max_days, then the least recently
+    opened until the cache fits in max_mb. Returns (letters removed, bytes freed).
+    """
+    if not os.path.isdir(cache_root):
+        return 0, 0
+    entries = []
+    for unique_id in os.listdir(cache_root):
+        pdf_path = cached_letter_path(unique_id, cache_root)
+        if os.path.exists(pdf_path):
+            st = os.stat(pdf_path)
+            entries.append((st.st_mtime, st.st_size, unique_id))
+    entries.sort()
+
+    cutoff = time.time() - max_days * 86400
+    total = sum(size for _, size, _ in entries)
+    limit = max_mb * 1024 * 1024
+    removed = 0
+    freed = 0
+    for last_used, size, unique_id in entries:
+        if last_used >= cutoff and total <= limit:
+            break
+        shutil.rmtree(cache_dir(unique_id, cache_root), ignore_errors=True)
+        total -= size
+        removed += 1
+        freed += size
+    return removed, freed
+
+def main():
+    parser = argparse.ArgumentParser(description='Render SMS letters on first access and manage the letter cache')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--render', metavar='LETTER_JSON', help='Letter record written by generate_sms_links.py --lazy')
+    group.add_argument('--evict', action='store_true', help='Apply the cache size and age limits')
+    args = parser.parse_args()
+
+    if args.evict:
+        removed, freed = evict()
+        print(f"[LAZY] Evicted {removed} cached letters ({freed:,} bytes)")
+        return
+
+    try:
+        with open(args.render, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        pdf_path = render_letter(record)
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+    print(json.dumps({'success': True, 'pdfPath': pdf_path}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Static Letter Blocks
+Runs of letter content that are identical for every customer (benefit
+paragraphs, footers, fixed statements). A block is laid out once - paragraphs
+are wrapped when added - and can then be drawn into any number of canvases.
+With as_form=True it is stamped as a PDF Form XObject, so the content stream
+is written once per document and identical across letters.
+
+layout_paragraph() memoizes parsed and wrapped Paragraphs by (text, style,
+width) in a bounded LRU, so repeated texts are not re-parsed for every row.
+"""
+
+import os
+from collections import OrderedDict
+from reportlab.platypus import Paragraph
+
+# Height passed to wrap(); blocks are never split across pages
+WRAP_HEIGHT = 10000
+
+# Form bounding box margin - glyph descenders and marks can fall outside the
+# paragraph boxes, and anything outside the box is clipped
+FORM_BBOX_PADDING = 20
+
+# Wrapped paragraphs kept in the layout cache (override with PARAGRAPH_CACHE_SIZE)
+PARAGRAPH_CACHE_SIZE = int(os.getenv('PARAGRAPH_CACHE_SIZE', 1024))
+
+def style_key(style):
+    """
+    Hashable fingerprint of a ParagraphStyle's attributes.
+    Templates that build a style per letter still share cache entries.
+    """
+    return tuple(sorted((k, repr(v)) for k, v in vars(style).items() if k != 'parent'))
+
+class ParagraphLayoutCache:
+    """
+    LRU cache of wrapped Paragraphs keyed by (text, style, width).
+
+    A wrapped Paragraph keeps its line breaks and height, and drawOn() can be
+    called on any canvas, so a hit skips both markup parsing and wrapping.
+    Cached paragraphs are shared - callers must not modify them.
+    """
+
+    def __init__(self, maxsize=PARAGRAPH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, style, width):
+        key = (text, style_key(style), width)
+        para = self.entries.get(key)
+        if para is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return para
+
+        self.misses += 1
+        para = Paragraph(text, style)
+        para.wrap(width, WRAP_HEIGHT)
+        self.entries[key] = para
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return para
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return f"{self.hits}/{lookups} paragraph layouts reused ({rate:.0%})"
+
+paragraph_cache = ParagraphLayoutCache()
+
+def layout_paragraph(text, style, width):
+    """Return a Paragraph already wrapped to width, reusing an earlier identical layout"""
+    return paragraph_cache.get(text, style, width)
+
+class StaticBlock:
+    """
+    Content stacked top-down from the block's top-left corner.
+
+    Offsets are relative to that corner (y grows upwards, so everything sits
+    below 0). self.height is the distance from the top to the end of the last
+    item including its trailing space, i.e. how far the caller moves y_pos.
+    """
+
+    def __init__(self, name, width):
+        self.name = name
+        self.width = width
+        self.height = 0
+        self.items = []
+
+    def add_paragraph(self, text, style, x_offset=0, width=None, space_after=0):
+        """Wrap a paragraph once and place it at the current position"""
+        para = layout_paragraph(text, style, width if width is not None else self.width)
+        self.items.append(('paragraph', para, x_offset, -self.height - para.height))
+        self.height += para.height + space_after
+        return para
+
+    def add_drawing(self, draw_func):
+        """Call draw_func(canvas, x, top_y) at the current position, e.g. a bullet mark"""
+        self.items.append(('drawing', draw_func, 0, -self.height))
+
+    def add_space(self, space):
+        self.height += space
+
+    def _draw_items(self, c, x, top_y):
+        for kind, item, dx, dy in self.items:
+            if kind == 'paragraph':
+                item.drawOn(c, x + dx, top_y + dy)
+            else:
+                item(c, x + dx, top_y + dy)
+
+    def draw(self, c, x, top_y, as_form=False):
+        """Draw the block with its top-left corner at (x, top_y)"""
+        if not as_form:
+            self._draw_items(c, x, top_y)
+            return
+        if not c.hasForm(self.name):
+            pad = FORM_BBOX_PADDING
+            c.beginForm(self.name, lowerx=-pad, lowery=-self.height - pad,
+                        upperx=self.width + pad, uppery=pad)
+            self._draw_items(c, 0, 0)
+            c.endForm()
+        c.saveState()
+        c.translate(x, top_y)
+        c.doForm(self.name)
+        c.restoreState()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Letter Index
+JSON-lines record of every letter a template generates (file name, page count,
+size, policy and printed address), written next to the PDFs as each letter is
+saved. Batch tools such as print_batches.py read it instead of re-opening
+every PDF to count pages or work out where it is going.
+"""
+
+import os
+import json
+
+LETTER_INDEX_FILE = "letter_index.jsonl"
+
+def letter_index_path(output_folder):
+    return os.path.join(output_folder, LETTER_INDEX_FILE)
+
+def clean_address_lines(address_lines):
+    """Drop empty / NaN lines and surrounding whitespace"""
+    cleaned = []
+    for line in address_lines or []:
+        text = str(line).strip() if line is not None else ''
+        if text and text.lower() not in ('nan', 'none'):
+            cleaned.append(text)
+    return cleaned
+
+def record_letter(output_folder, pdf_path, pages, policy_no='', address_lines=None):
+    """
+    Append one letter to the folder's index.
+
+    address_lines are the lines printed in the address block, addressee first.
+    Never raises - a failed index write must not stop letter generation.
+    """
+    try:
+        entry = {
+            'file': os.path.basename(pdf_path),
+            'pages': int(pages),
+            'bytes': os.path.getsize(pdf_path) if os.path.exists(pdf_path) else None,
+            'policy': str(policy_no or ''),
+            'address': clean_address_lines(address_lines)
+        }
+        with open(letter_index_path(output_folder), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    except Exception as e:
+        print(f"⚠️ Could not record {os.path.basename(pdf_path)} in the letter index: {str(e)}")
+
+def load_letter_index(output_folder):
+    """
+    Read the index into {file name: entry}.
+    A letter regenerated into the same folder appears twice; the later entry wins.
+    """
+    index = {}
+    path = letter_index_path(output_folder)
+    if not os.path.exists(path):
+        return index
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn last line from an interrupted run
+                continue
+            index[entry['file']] = entry
+    return index
@@ -9,6 +9,8 @@ import os
 import glob
 import subprocess
 import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 # Try to use pypdf (newer version) first, fallback to PyPDF2
 try:
@@ -25,7 +27,103 @@ except ImportError:
         print("pip install pypdf")
         sys.exit(1)
 
-def merge_acceptance_form():
+# Acceptance form pages, parsed once per worker process by the pool initializer
+_worker_form_pages = None
+
+def _read_form_pages(form_pdf_path):
+    form_reader = PdfReader(form_pdf_path)
+    if USE_PYPDF:
+        return list(form_reader.pages)
+    return [form_reader.getPage(n) for n in range(form_reader.getNumPages())]
+
+def _init_merge_worker(form_pdf_path):
+    global _worker_form_pages
+    _worker_form_pages = _read_form_pages(form_pdf_path)
+
+def _merge_in_worker(pdf_file, form_pdf_path):
+    """
+    Merge one letter with the acceptance form (in a pool worker, or in this
+    process for a serial run - _init_merge_worker must have run first).
+    The result is written to a temp file and renamed over the letter only
+    when it looks valid, so the original is never touched on failure.
+    Returns (pdf_file, success, method_or_error).
+    """
+    temp_file = pdf_file + ".merging"
+    error = None
+    try:
+        # Method 1: pypdf/PyPDF2
+        try:
+            output_writer = PdfWriter()
+            with open(pdf_file, 'rb') as letter_file:
+                letter_reader = PdfReader(letter_file)
+                if USE_PYPDF:
+                    for page in letter_reader.pages:
+                        output_writer.add_page(page)
+                    for page in _worker_form_pages:
+                        output_writer.add_page(page)
+                else:
+                    for page_num in range(letter_reader.getNumPages()):
+                        output_writer.addPage(letter_reader.getPage(page_num))
+                    for page in _worker_form_pages:
+                        output_writer.addPage(page)
+                with open(temp_file, 'wb') as output_file:
+                    output_writer.write(output_file)
+            if os.path.getsize(temp_file) > 10000:  # At least 10KB
+                os.replace(temp_file, pdf_file)
+                return pdf_file, True, "pdf library"
+        except Exception as pdf_error:
+            error = f"PDF library method failed: {str(pdf_error)}"
+        
+        # Method 2: pdftk (if available)
+        try:
+            result = subprocess.run([
+                'pdftk', pdf_file, form_pdf_path, 'cat', 'output', temp_file
+            ], capture_output=True, text=True, timeout=30)
+            if result.returncode == 0 and os.path.exists(temp_file) and os.path.getsize(temp_file) > 10000:
+                os.replace(temp_file, pdf_file)
+                return pdf_file, True, "pdftk"
+        except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
+            pass  # pdftk not available or failed
+        
+        return pdf_file, False, error or "All merge methods failed"
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+def _report_merge(pdf_file, merged, detail):
+    filename = os.path.basename(pdf_file)
+    if merged:
+        if detail == "pdftk":
+            print(f"✅ Used pdftk for: {filename}")
+        print(f"✅ Merged: {filename}")
+    else:
+        print(f"❌ {detail} for: {filename}")
+    return merged
+
+def merge_serial(pdf_files, form_pdf_path):
+    """Merge letters one by one in this process; returns (success_count, error_count)"""
+    _init_merge_worker(form_pdf_path)
+    success_count = 0
+    for pdf_file in pdf_files:
+        if _report_merge(*_merge_in_worker(pdf_file, form_pdf_path)):
+            success_count += 1
+    return success_count, len(pdf_files) - success_count
+
+def merge_in_parallel(pdf_files, form_pdf_path, workers):
+    """Merge letters over a process pool; returns (success_count, error_count)"""
+    print(f"[INFO] Merging with {workers} worker processes")
+    success_count = 0
+    chunksize = max(1, len(pdf_files) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_merge_worker,
+                             initargs=(form_pdf_path,)) as executor:
+        results = executor.map(_merge_in_worker, pdf_files, [form_pdf_path] * len(pdf_files),
+                               chunksize=chunksize)
+        for pdf_file, merged, detail in results:
+            if _report_merge(pdf_file, merged, detail):
+                success_count += 1
+    return success_count, len(pdf_files) - success_count
+
+def merge_acceptance_form(workers=1):
     """Merge the acceptance form with all generated renewal letters"""
     
     # Path to the acceptance form
@@ -51,98 +149,19 @@ def merge_acceptance_form():
     
     print(f"📋 Found {len(pdf_files)} renewal letters to merge with acceptance form...")
     
-    success_count = 0
-    error_count = 0
-    
-    for pdf_file in pdf_files:
-        try:
-            # Create backup filename
-            backup_file = pdf_file.replace('.pdf', '_backup.pdf')
-            os.rename(pdf_file, backup_file)
-            
-            # Try different merging approaches
-            merged_successfully = False
-            
-            # Method 1: Try pypdf/PyPDF2
-            try:
-                output_writer = PdfWriter()
-                
-                # Add pages from the renewal letter
-                with open(backup_file, 'rb') as letter_file:
-                    letter_reader = PdfReader(letter_file)
-                    if USE_PYPDF:
-                        # pypdf syntax
-                        for page in letter_reader.pages:
-                            output_writer.add_page(page)
-                    else:
-                        # PyPDF2 syntax
-                        for page_num in range(letter_reader.getNumPages()):
-                            output_writer.addPage(letter_reader.getPage(page_num))
-                
-                # Add pages from the acceptance form
-                with open(form_pdf_path, 'rb') as form_file:
-                    form_reader = PdfReader(form_file)
-                    if USE_PYPDF:
-                        # pypdf syntax
-                        for page in form_reader.pages:
-                            output_writer.add_page(page)
-                    else:
-                        # PyPDF2 syntax
-                        for page_num in range(form_reader.getNumPages()):
-                            output_writer.addPage(form_reader.getPage(page_num))
-                
-                # Write merged PDF
-                with open(pdf_file, 'wb') as output_file:
-                    output_writer.write(output_file)
-                
-                # Check if file was created successfully and has reasonable size
-                if os.path.exists(pdf_file) and os.path.getsize(pdf_file) > 10000:  # At least 10KB
-                    merged_successfully = True
-                
-            except Exception as pdf_error:
-                print(f"⚠️ PDF library method failed for {os.path.basename(pdf_file)}: {str(pdf_error)}")
-            
-            # Method 2: Try using system command (if available)
-            if not merged_successfully:
-                try:
-                    # Try using pdftk if available
-                    result = subprocess.run([
-                        'pdftk', backup_file, form_pdf_path, 'cat', 'output', pdf_file
-                    ], capture_output=True, text=True, timeout=30)
-                    
-                    if result.returncode == 0 and os.path.exists(pdf_file) and os.path.getsize(pdf_file) > 10000:
-                        merged_successfully = True
-                        print(f"✅ Used pdftk for: {os.path.basename(pdf_file)}")
-                except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
-                    pass  # pdftk not available or failed
-            
-            if merged_successfully:
-                # Remove backup if successful
-                os.remove(backup_file)
-                filename = os.path.basename(pdf_file)
-                print(f"✅ Merged: {filename}")
-                success_count += 1
-            else:
-                # Restore backup if all methods failed
-                if os.path.exists(backup_file):
-                    os.rename(backup_file, pdf_file)
-                filename = os.path.basename(pdf_file)
-                print(f"❌ All merge methods failed for: {filename}")
-                error_count += 1
-            
-        except Exception as e:
-            # Restore backup if merging failed
-            if os.path.exists(backup_file):
-                os.rename(backup_file, pdf_file)
-            
-            filename = os.path.basename(pdf_file)
-            print(f"❌ Failed to merge: {filename} - {str(e)}")
-            error_count += 1
+    if workers > 1:
+        success_count, error_count = merge_in_parallel(pdf_files, form_pdf_path, workers)
+    else:
+        success_count, error_count = merge_serial(pdf_files, form_pdf_path)
     
-    print(f"\n🎉 Merging completed!")
+    print("\n🎉 Merging completed!")
     print(f"✅ Successfully merged: {success_count} files")
     if error_count > 0:
         print(f"❌ Failed to merge: {error_count} files")
 
 if __name__ == "__main__":
-    merge_acceptance_form()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Merge the Renewal Acceptance Form into renewal letters')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for merging (default: 1 = serial, 0 = one per CPU)')
+    args = parser.parse_args()
+    merge_acceptance_form(args.workers if args.workers > 0 else (os.cpu_count() or 1))
\ No newline at end of file
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Output Plan
+Works out every output file name of a batch before the first letter is
+rendered, and saves them as <output folder>/output_manifest.json:
+
+  {"template": "SPH_Fresh.py", "createdAt": "...", "letters": [
+      {"row": 0, "policyNo": "00520/0001149", "name": "Mr John Smith",
+       "file": "001_00520_0001149_Mr_John_Smith.pdf"}, ...]}
+
+Names are sanitized once per distinct value (filename_utils.sanitize_filename
+is memoized), and two rows that would produce the same file name - the same
+policy and name on a listing without sequence numbers - get _2, _3, ...
+instead of silently overwriting each other.
+
+Later stages (SMS links, email, combine) read the manifest rather than
+re-deriving names or matching files by prefix.
+"""
+
+import os
+import re
+import json
+from datetime import datetime
+from functools import lru_cache
+import pandas as pd
+from filename_utils import sanitize_filename
+
+MANIFEST_FILE = "output_manifest.json"
+
+# Keep full paths under the Windows 260 character limit
+MAX_PATH_LENGTH = 250
+
+# Stem and customer name of each template's letters
+ARREARS_LETTER = {'stem': '{seq:03d}_{policy}_{name}', 'policy': 'Policy No',
+                  'name': ['Owner 1 Title', 'Owner 1 First Name', 'Owner 1 Surname'],
+                  'missing_name': 'Name_Missing'}
+
+LETTER_NAMING = {
+    'SPH_Fresh.py': ARREARS_LETTER,
+    'JPH_Fresh.py': ARREARS_LETTER,
+    'MED_SPH_Fresh_Signature.py': ARREARS_LETTER,
+    'MED_JPH_Fresh_Signature.py': ARREARS_LETTER,
+    'Company_Fresh.py': dict(ARREARS_LETTER, missing_name='Company_Name_Missing'),
+}
+
+def manifest_path(output_folder):
+    return os.path.join(output_folder, MANIFEST_FILE)
+
+def text_column(df, column):
+    """Column as stripped text, '' where empty or 'nan'"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    values = df[column].astype(object)
+    text = values.where(values.notna(), '').astype(str).str.strip()
+    return text.where(~text.str.lower().isin(['nan', '']), '')
+
+def joined_text(df, columns):
+    """Cells joined with spaces (empty cells as ''), stripped - e.g. title, name and surname"""
+    joined = pd.Series('', index=df.index, dtype=object)
+    for i, column in enumerate(columns):
+        values = df[column].astype(object) if column in df.columns else pd.Series('', index=df.index, dtype=object)
+        joined = joined + (' ' if i else '') + values.where(values.notna(), '').astype(str)
+    return joined.str.strip()
+
+def customer_names(df, columns, missing='Name_Missing'):
+    """Non-empty name parts joined with spaces, as the templates build them"""
+    names = pd.Series('', index=df.index, dtype=object)
+    for column in columns:
+        part = text_column(df, column)
+        separator = pd.Series(' ', index=df.index).where((names != '') & (part != ''), '')
+        names = names + separator + part
+    return names.where(names != '', missing)
+
+def sanitize_column(values, sanitizer=sanitize_filename):
+    """Apply sanitizer once per distinct value"""
+    distinct = pd.unique(values)
+    return values.map(dict(zip(distinct, (sanitizer(v) for v in distinct))))
+
+def disambiguate(stems):
+    """Append _2, _3, ... to stems that repeat (case-insensitively, as on Windows)"""
+    stems = stems.copy()
+    while True:
+        keys = stems.str.lower()
+        repeat = keys.groupby(keys).cumcount()
+        if not (repeat > 0).any():
+            return stems
+        stems[repeat > 0] = stems[repeat > 0] + '_' + (repeat[repeat > 0] + 1).astype(str)
+
+def plan_outputs(policy_nos, names, stem='{seq:03d}_{policy}_{name}', output_folder='',
+                 name_sanitizer=sanitize_filename, policy_sanitizer=sanitize_filename, extension='.pdf'):
+    """
+    DataFrame indexed like the listing with policy_no, name, safe_policy,
+    safe_name and file (the planned file name) for every row.
+    {seq} in stem is the row number in the Excel file (index + 1).
+    """
+    plan = pd.DataFrame({'policy_no': policy_nos.astype(object).where(policy_nos.notna(), '').astype(str),
+                         'name': names.astype(str)}, index=policy_nos.index)
+    plan['safe_policy'] = sanitize_column(plan['policy_no'], policy_sanitizer)
+    plan['safe_name'] = sanitize_column(plan['name'], name_sanitizer)
+
+    def stems_for(safe_names):
+        return pd.Series([stem.format(seq=index + 1, policy=policy, name=name)
+                          for index, policy, name in zip(plan.index, plan['safe_policy'], safe_names)],
+                         index=plan.index, dtype=object)
+
+    stems = stems_for(plan['safe_name'])
+    # Shorten the name part where the full path would be too long
+    excess = (stems.str.len() + len(os.path.join(output_folder, '')) + len(extension)) - MAX_PATH_LENGTH
+    if (excess > 0).any():
+        keep = (plan['safe_name'].str.len() - excess.clip(lower=0)).clip(lower=20)
+        plan['safe_name'] = [name[:n] for name, n in zip(plan['safe_name'], keep)]
+        stems = stems_for(plan['safe_name'])
+
+    planned = disambiguate(stems)
+    collisions = int((planned != stems).sum())
+    if collisions:
+        print(f"[PLAN] {collisions} duplicate file names renamed with a numeric suffix")
+    plan['file'] = planned + extension
+    return plan
+
+def plan_letters(df, template):
+    """Output plan of an arrears template (see LETTER_NAMING), or None for other templates"""
+    naming = LETTER_NAMING.get(os.path.basename(template))
+    if not naming:
+        return None
+    names = customer_names(df, naming['name'], naming['missing_name'])
+    policy_nos = df[naming['policy']] if naming['policy'] in df.columns else pd.Series('', index=df.index)
+    return plan_outputs(policy_nos, names, naming['stem'])
+
+def save_manifest(output_folder, plan, template):
+    """Write the plan for the downstream stages; returns the manifest path"""
+    path = manifest_path(output_folder)
+    letters = [{'row': int(index), 'policyNo': entry.policy_no, 'name': entry.name, 'file': entry.file}
+               for index, entry in zip(plan.index, plan.itertuples(index=False))]
+    os.makedirs(output_folder, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'template': os.path.basename(template), 'createdAt': datetime.now().isoformat(),
+                   'letters': letters}, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    print(f"[PLAN] {len(letters)} output files planned: {path}")
+    return path
+
+def load_manifest(output_folder):
+    """The folder's manifest, or None for folders generated before manifests existed"""
+    try:
+        with open(manifest_path(output_folder), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def files_by_row(manifest):
+    return {entry['row']: entry['file'] for entry in (manifest or {}).get('letters', [])}
+
+def letters_by_policy(manifest):
+    """Manifest entries grouped by policy number - build once, then look up with find_letter()"""
+    letters = {}
+    for entry in (manifest or {}).get('letters', []):
+        letters.setdefault(entry['policyNo'].strip(), []).append(entry)
+    return letters
+
+def in_manifest_order(folder_path, filenames):
+    """
+    Sort file names into the letter order of the folder's output manifest
+    (Excel row order, also past row 999); files the manifest does not know
+    follow, sorted by name.
+    """
+    manifest = load_manifest(folder_path)
+    if not manifest:
+        return sorted(filenames)
+    position = {entry['file']: i for i, entry in enumerate(manifest.get('letters', []))}
+    return sorted(filenames, key=lambda f: (f not in position, position.get(f, 0), f))
+
+def find_letter(letters, policy_no, name=None):
+    """
+    File planned for a policy (letters from letters_by_policy()); with several
+    letters for the same policy the name decides. None if the policy is unknown.
+    """
+    matches = letters.get(str(policy_no or '').strip(), [])
+    if len(matches) > 1 and name:
+        named = [entry for entry in matches if entry['name'].strip().lower() == str(name).strip().lower()]
+        matches = named or matches
+    return matches[0]['file'] if matches else None
+
+# Motor renewal file names keep their own cleaning rules (dashes and quotes
+# replaced, other non-ASCII characters collapsed to '_', at most 100 characters)
+MOTOR_REPLACEMENTS = [('â€"', '-'), ('–', '-'), ('—', '-'), ('"', ''), ("'", ''), ('`', '')]
+NON_ASCII_RUN = re.compile(r'[^\x00-\x7F]+')
+UNDERSCORE_RUN = re.compile(r'_+')
+MOTOR_MAX_NAME_LENGTH = 100
+
+@lru_cache(maxsize=65536)
+def motor_safe_name(name):
+    for old, new in MOTOR_REPLACEMENTS:
+        name = name.replace(old, new)
+    name = NON_ASCII_RUN.sub('_', name)
+    name = name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+    name = UNDERSCORE_RUN.sub('_', name).strip('_')
+    return name[:MOTOR_MAX_NAME_LENGTH]
+
+def motor_safe_policy(policy_no):
+    return policy_no.replace('/', '_').replace('\\', '_')
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Letter Output Profiles
+Chooses how images, the payment QR and page streams are written into a
+letter, depending on where it is going:
+
+  print - logos at source resolution, QR as a PNG raster (original output)
+  email - logos downsampled to 150 dpi at their printed size, JPEG quality 80,
+          QR drawn as vector squares
+  web   - logos at 110 dpi, JPEG quality 70, vector QR
+
+Select with --profile <name> (default: print). SizeReport collects the
+resulting file sizes for the run summary.
+"""
+
+import io
+import os
+import math
+from PIL import Image
+from reportlab.lib.utils import ImageReader
+
+DEFAULT_PROFILE = 'print'
+
+PROFILES = {
+    'print': {'image_dpi': None, 'jpeg_quality': None, 'vector_qr': False, 'page_compression': None},
+    'email': {'image_dpi': 150, 'jpeg_quality': 80, 'vector_qr': True, 'page_compression': 1},
+    'web': {'image_dpi': 110, 'jpeg_quality': 70, 'vector_qr': True, 'page_compression': 1},
+}
+
+# Quiet zone around the vector QR, in modules (same as the PNG's border=2)
+QR_BORDER = 2
+
+def profile_from_argv(argv):
+    """Profile name given with --profile, or the default"""
+    for i, arg in enumerate(argv):
+        if arg == '--profile' and i + 1 < len(argv):
+            return argv[i + 1]
+    return DEFAULT_PROFILE
+
+class OutputProfile:
+    """
+    Settings of one profile plus the images prepared for it.
+
+    Downsampled logos are encoded once per (file, printed width) and the same
+    ImageReader is reused for every letter of the run.
+    """
+
+    def __init__(self, name=DEFAULT_PROFILE):
+        if name not in PROFILES:
+            raise ValueError(f"Unknown output profile '{name}' (choose from {', '.join(PROFILES)})")
+        self.name = name
+        self.settings = PROFILES[name]
+        self.images = {}
+
+    @classmethod
+    def from_argv(cls, argv):
+        return cls(profile_from_argv(argv))
+
+    @property
+    def page_compression(self):
+        """Canvas pageCompression argument (None keeps the reportlab default)"""
+        return self.settings['page_compression']
+
+    def image(self, path, draw_width):
+        """ImageReader for a logo printed draw_width points wide"""
+        key = (path, draw_width)
+        if key not in self.images:
+            self.images[key] = self._prepare_image(path, draw_width)
+        return self.images[key]
+
+    def _prepare_image(self, path, draw_width):
+        dpi = self.settings['image_dpi']
+        if not dpi:
+            return ImageReader(path)
+        with Image.open(path) as img:
+            target_width = math.ceil(draw_width / 72 * dpi)
+            if img.width > target_width:
+                target_height = max(1, round(img.height * target_width / img.width))
+                img = img.resize((target_width, target_height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            img.convert('RGB').save(buffer, format='JPEG', quality=self.settings['jpeg_quality'], optimize=True)
+        # Keep the source file if re-encoding did not make it smaller
+        if buffer.tell() >= os.path.getsize(path):
+            return ImageReader(path)
+        buffer.seek(0)
+        return ImageReader(buffer)
+
+    def draw_qr(self, c, qr, qr_filename, x, y, size):
+        """Draw the payment QR in a size x size square with its lower-left corner at (x, y)"""
+        if not self.settings['vector_qr']:
+            c.drawImage(qr_filename, x, y, width=size, height=size)
+            return
+
+        rows = [list(row) for row in qr.matrix_iter(scale=1, border=QR_BORDER)]
+        module = size / len(rows)
+        c.saveState()
+        c.setFillColorRGB(0, 0, 0)
+        path = c.beginPath()
+        for r, row in enumerate(rows):
+            top = y + size - r * module
+            col = 0
+            # One rectangle per run of dark modules in the row
+            while col < len(row):
+                if not row[col]:
+                    col += 1
+                    continue
+                start = col
+                while col < len(row) and row[col]:
+                    col += 1
+                path.rect(x + start * module, top - module, (col - start) * module, module)
+        c.drawPath(path, stroke=0, fill=1)
+        c.restoreState()
+
+def format_kb(size):
+    return f"{size / 1024:.1f} KB"
+
+class SizeReport:
+    """File sizes of the generated letters, grouped by kind (e.g. protected / unprotected)"""
+
+    def __init__(self):
+        self.sizes = {}
+
+    def add(self, path, kind='letters'):
+        if path and os.path.exists(path):
+            self.sizes.setdefault(kind, []).append(os.path.getsize(path))
+
+    def summary(self, profile_name=None):
+        """Multi-line size distribution for the run summary"""
+        heading = f"📦 Letter sizes ({profile_name} profile):" if profile_name else "📦 Letter sizes:"
+        lines = [heading]
+        for kind, sizes in self.sizes.items():
+            ordered = sorted(sizes)
+            median = ordered[len(ordered) // 2]
+            p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+            lines.append(f"   {kind}: {len(ordered)} files, {sum(ordered) / (1024 * 1024):.1f} MB total - "
+                         f"min {format_kb(ordered[0])}, median {format_kb(median)}, p90 {format_kb(p90)}, max {format_kb(ordered[-1])}")
+        if len(lines) == 1:
+            lines.append("   no letters written")
+        return '\n'.join(lines)
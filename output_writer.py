@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Output Writer
+Moves letter file I/O off the rendering thread. The templates render each
+letter to bytes (canvas.getpdfdata(), encryption in memory) and hand them
+to an OutputWriter, whose thread writes them while the next row renders:
+
+  write(path, data)   - temp file + os.replace, so readers never see half a letter
+  write_derived(path, source, salt, build)
+                      - encrypted letter; build() is skipped when the store
+                        already holds what it made from the same source and salt
+  link(src, dst)      - protected copy of a letter without a NIC (blob_store.link_or_copy)
+  remove(path)        - QR temp files
+  submit(fn, *args)   - anything that needs the file on disk (letter index, size report)
+
+Jobs run in the order they were submitted. The queue holds at most
+OUTPUT_WRITER_QUEUE jobs; when the disk falls behind, the renderer waits
+instead of piling letters up in memory. close() (also run at exit) writes
+out everything still queued.
+
+With a blob_store.BlobStore, letters are written into the store once and
+hardlinked into place, so regenerating a campaign with the same data only
+writes the letters that changed.
+"""
+
+import os
+import sys
+import time
+import queue
+import atexit
+import threading
+from blob_store import link_or_copy, derived_key
+
+OUTPUT_WRITER_QUEUE = int(os.getenv('OUTPUT_WRITER_QUEUE', 64))
+OUTPUT_FSYNC = os.getenv('OUTPUT_FSYNC', '0') == '1'
+
+def write_atomic(path, data, fsync=OUTPUT_FSYNC):
+    """Write data to path through a temp file in the same folder"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def remove_if_exists(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class OutputWriter:
+    """Single background thread running file jobs in submission order"""
+
+    def __init__(self, max_pending=OUTPUT_WRITER_QUEUE, fsync=OUTPUT_FSYNC, blob_store=None):
+        self.queue = queue.Queue(maxsize=max(1, max_pending))
+        self.fsync = fsync
+        self.blob_store = blob_store
+        self.errors = []
+        self.files_written = 0
+        self.bytes_written = 0
+        # Letters linked from content already in the blob store instead of written
+        self.files_reused = 0
+        self.bytes_reused = 0
+        self.write_seconds = 0.0
+        # Time the renderer spent waiting for a free queue slot
+        self.wait_seconds = 0.0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='output-writer', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the writer thread after all earlier jobs; blocks while the queue is full"""
+        if self.closed:
+            raise RuntimeError("Output writer is closed")
+        start = time.perf_counter()
+        self.queue.put((fn, args))
+        self.wait_seconds += time.perf_counter() - start
+
+    def write(self, path, data):
+        self.submit(self._write, path, data)
+
+    def write_derived(self, path, source, salt, build):
+        """
+        Write build() to path, e.g. the letter encrypted with its password. If the
+        store already holds what build() made from the same source and salt, that
+        blob is linked and build() is not called. Returns True if build() ran.
+        """
+        key = derived_key(source, salt) if self.blob_store else None
+        digest = self.blob_store.derived(key) if key else None
+        if digest:
+            self.submit(self._link_blob, path, digest)
+            return False
+        self.submit(self._write, path, build(), key)
+        return True
+
+    def link(self, src, dst):
+        self.submit(link_or_copy, src, dst)
+
+    def remove(self, path):
+        self.submit(remove_if_exists, path)
+
+    def _write(self, path, data, derived=None):
+        start = time.perf_counter()
+        if self.blob_store:
+            digest, reused = self.blob_store.link_bytes(data, path)
+            if derived:
+                self.blob_store.remember_derived(derived, digest)
+        else:
+            write_atomic(path, data, self.fsync)
+            reused = False
+        self.write_seconds += time.perf_counter() - start
+        if reused:
+            self.files_reused += 1
+            self.bytes_reused += len(data)
+        else:
+            self.files_written += 1
+            self.bytes_written += len(data)
+
+    def _link_blob(self, path, digest):
+        self.blob_store.link_digest(digest, path)
+        self.files_reused += 1
+        self.bytes_reused += os.path.getsize(path)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args = job
+                try:
+                    fn(*args)
+                except Exception as e:
+                    target = args[0] if args else getattr(fn, '__name__', 'job')
+                    self.errors.append((target, str(e)))
+                    print(f"❌ Failed to write {target}: {str(e)}", file=sys.stderr)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until every submitted job has run"""
+        self.queue.join()
+
+    def close(self):
+        """Run the remaining jobs and stop the thread; safe to call more than once"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def summary(self):
+        """Run summary line"""
+        line = (f"💾 Output writer: {self.files_written} files, {self.bytes_written / (1024 * 1024):.1f} MB "
+                f"written in {self.write_seconds:.1f}s off the render thread, "
+                f"renderer waited {self.wait_seconds:.1f}s for the disk")
+        if self.files_reused:
+            line += (f", {self.files_reused} unchanged letters linked from the blob store "
+                     f"({self.bytes_reused / (1024 * 1024):.1f} MB not rewritten)")
+        if self.errors:
+            line += f", {len(self.errors)} failed"
+        return line
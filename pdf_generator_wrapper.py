@@ -13,6 +13,8 @@ import subprocess
 import glob
 import time
 from pathlib import Path
+from blob_store import BlobStore
+from folder_inventory import update_folder_safely
 
 def cleanup_old_excel_files():
     """Remove old Excel files before processing new upload to prevent wrong file usage"""
@@ -68,6 +70,10 @@ def main():
     # Use Generic_Template.xlsx as the standard input filename for all templates
     expected_filename = 'Generic_Template.xlsx'
     
+    # Backups and source copies of the upload are hardlinks into the blob store,
+    # so rerunning with the same Excel file does not store it again
+    blob_store = BlobStore()
+    
     # Copy input file to expected location with robust error handling
     try:
         # First, verify input file exists
@@ -93,19 +99,19 @@ def main():
         
         # Validate the copied file has required columns
         try:
-            import pandas as pd
-            test_df = pd.read_excel(expected_filename, engine='openpyxl')
-            available_cols = list(test_df.columns)
-            required_cols = ['Policy No', 'Arrears Amount']
+            # Header only - the template loads the rows it needs itself
+            from column_manifests import sheet_columns, check_columns
+            available_cols = sheet_columns(expected_filename)
+            missing_required, missing_optional = check_columns(available_cols, args.template)
             
             print(f"Copied file validation:")
-            print(f"  - Rows: {len(test_df)}")
             print(f"  - Columns: {len(available_cols)}")
             print(f"  - Column names: {available_cols}")
             
-            missing_required = [col for col in required_cols if col not in available_cols]
             if missing_required:
                 raise Exception(f"Copied file missing required columns: {missing_required}")
+            if missing_optional:
+                print(f"WARNING: Columns used by {os.path.basename(args.template)} are missing and will print blank: {missing_optional}")
             
             has_email = 'EMAIL_ID' in available_cols
             print(f"  - EMAIL_ID present: {has_email}")
@@ -123,7 +129,7 @@ def main():
         import datetime
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_name = f"Generic_Template_backup_{timestamp}.xlsx"
-        shutil.copy2(expected_filename, backup_name)
+        blob_store.link(expected_filename, backup_name)
         print(f"Created backup: {backup_name}")
         
     except Exception as e:
@@ -157,6 +163,9 @@ def main():
     if script_dir:
         os.chdir(script_dir)
     
+    # Set once the success path has refreshed the folder listing; otherwise finally does it
+    inventory_refreshed = False
+    
     try:
         # Execute the template script with output folder argument
         print(f"Executing template: {args.template}")
@@ -180,7 +189,7 @@ def main():
             if os.path.exists(expected_filename):
                 folder_name = os.path.basename(args.output)
                 excel_copy_path = os.path.join(args.output, f"{folder_name}_source.xlsx")
-                shutil.copy2(expected_filename, excel_copy_path)
+                blob_store.link(expected_filename, excel_copy_path)
                 file_size = os.path.getsize(excel_copy_path)
                 print(f"[SMS-PREP] Saved Excel file copy for SMS generation: {excel_copy_path}")
                 print(f"[SMS-PREP] File size: {file_size:,} bytes")
@@ -189,6 +198,16 @@ def main():
         except Exception as e:
             print(f"[SMS-PREP] Warning: Could not save Excel file copy: {e}")
         
+        # Drop stored uploads that nothing links to any more
+        try:
+            removed, freed = blob_store.gc()
+            blob_count, blob_bytes = blob_store.usage()
+            if removed:
+                print(f"[BLOB] Removed {removed} expired blobs ({freed:,} bytes)")
+            print(f"[BLOB] Store holds {blob_count} blobs ({blob_bytes:,} bytes)")
+        except Exception as e:
+            print(f"[BLOB] Warning: Blob store cleanup failed: {e}")
+        
         # Mark input file as processed AFTER successful execution
         try:
             if os.path.exists(expected_filename):
@@ -198,9 +217,18 @@ def main():
         except Exception as e:
             print(f"Warning: Could not mark file as processed: {e}")
         
+        # Refresh the folder listing served to the UI; its counts replace a rescan here
+        inventory_entry = update_folder_safely(args.output, original_cwd)
+        inventory_refreshed = True
+        
         # Check if PDFs were generated in the target output directory (including subfolders)
         moved_files = 0
-        if os.path.exists(args.output):
+        if inventory_entry:
+            moved_files = inventory_entry['totalPdfFiles']
+            print(f"Found {inventory_entry['protectedCount']} PDFs in protected folder")
+            print(f"Found {inventory_entry['unprotectedCount']} PDFs in unprotected folder")
+            print(f"Found {moved_files} total PDF files in directory: {args.output}")
+        elif os.path.exists(args.output):
             # Count PDFs in main folder
             pdf_files = [f for f in os.listdir(args.output) if f.endswith('.pdf')]
             moved_files = len(pdf_files)
@@ -276,6 +304,10 @@ def main():
         # Restore original working directory
         os.chdir(original_cwd)
         
+        # A failed or timed-out run may still have written letters - list them
+        if not inventory_refreshed:
+            update_folder_safely(args.output, original_cwd)
+        
         # Final cleanup - only if file still exists (in case of errors)
         try:
             if os.path.exists(expected_filename):
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Pre-flight Validation
+Classifies every row of a letter listing before any QR call or PDF render:
+
+  ok       - the row is generated normally
+  fallback - the row is generated, but with substitute data (e.g. no NIC)
+  skip     - the row would be skipped by the generator anyway
+
+The checks are column operations over the whole DataFrame, so validating a
+large listing costs about as much as reading it. run_preflight() writes
+validation_report.csv into the output folder and returns only the viable
+rows; the original row index is kept, so letter numbering and SMS links
+still match the Excel file.
+"""
+
+import os
+import pandas as pd
+
+REPORT_FILE = "validation_report.csv"
+
+# Text values the generators treat as empty
+BLANK_VALUES = ('', 'nan', 'none')
+
+def blank(df, column):
+    """True where the column is missing, empty or a placeholder like 'nan'"""
+    if column not in df.columns:
+        return pd.Series(True, index=df.index)
+    values = df[column]
+    return values.isna() | values.astype(str).str.strip().str.lower().isin(BLANK_VALUES)
+
+def all_blank(df, columns):
+    mask = pd.Series(True, index=df.index)
+    for column in columns:
+        mask &= blank(df, column)
+    return mask
+
+def non_numeric(df, column):
+    """True where the column does not hold a number (thousands separators allowed)"""
+    if column not in df.columns:
+        return pd.Series(True, index=df.index)
+    values = df[column].astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(values, errors='coerce').isna() | df[column].isna()
+
+# Each rule is (status, reason, check); check(df) returns a boolean Series that
+# is True for the rows the rule applies to. The first matching skip wins.
+ARREARS_RULES = [
+    ('skip', 'Missing policy number', lambda df: blank(df, 'Policy No')),
+    ('fallback', 'Missing NIC - protected copy is not password protected', lambda df: blank(df, 'NIC')),
+]
+
+SMS_RULES = [
+    ('skip', 'No mobile number', lambda df: blank(df, 'MOBILE_NO')),
+    ('skip', 'No policy number', lambda df: blank(df, 'Policy No')),
+    ('fallback', 'Missing NIC - QR uses fallback data', lambda df: blank(df, 'NIC')),
+    ('fallback', 'Missing customer name - QR uses fallback data',
+     lambda df: all_blank(df, ['Owner 1 Title', 'Owner 1 First Name', 'Owner 1 Surname'])),
+]
+
+MOTOR_RULES = [
+    ('skip', "Non-numeric or empty 'New Net Premium'", lambda df: non_numeric(df, 'New Net Premium')),
+]
+
+HEALTHCARE_RULES = [
+    ('skip', 'Missing policy number', lambda df: blank(df, 'POL_NO')),
+    ('skip', 'Missing name', lambda df: blank(df, 'NAME')),
+]
+
+def classify_rows(df, rules):
+    """DataFrame (same index as df) with the status and reason of every row"""
+    status = pd.Series('ok', index=df.index, dtype=object)
+    reason = pd.Series('', index=df.index, dtype=object)
+    for rule_status, rule_reason, check in rules:
+        if rule_status == 'fallback':
+            mask = check(df).astype(bool)
+            # Several fallbacks on one row are all reported
+            reason[mask] = (reason[mask] + '; ').where(reason[mask] != '', '') + rule_reason
+            status[mask] = 'fallback'
+    # Reverse order, so the first matching skip is the one reported
+    for rule_status, rule_reason, check in reversed(rules):
+        if rule_status == 'skip':
+            mask = check(df).astype(bool)
+            status[mask] = 'skip'
+            reason[mask] = rule_reason
+    return pd.DataFrame({'status': status, 'reason': reason})
+
+def write_report(df, checks, path, id_column):
+    """CSV with one line per row: row number (as in the logs), policy, status, reason"""
+    report = pd.DataFrame({
+        'row': df.index + 1,
+        'policy_no': df[id_column] if id_column in df.columns else '',
+        'status': checks['status'],
+        'reason': checks['reason']
+    })
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    report.to_csv(path, index=False, encoding='utf-8')
+    return path
+
+def run_preflight(df, rules, output_folder, id_column='Policy No', label='[PREFLIGHT]'):
+    """
+    Validate all rows, write the report and return (viable rows, checks).
+    Viable rows are the ok and fallback rows, in their original order.
+    """
+    checks = classify_rows(df, rules)
+    counts = checks['status'].value_counts()
+    try:
+        report_path = write_report(df, checks, os.path.join(output_folder, REPORT_FILE), id_column)
+    except OSError as e:
+        report_path = None
+        print(f"{label} Warning: Could not write validation report: {e}")
+
+    print(f"{label} {len(df)} rows: {counts.get('ok', 0)} ok, {counts.get('fallback', 0)} with fallback data, "
+          f"{counts.get('skip', 0)} skipped")
+    skipped = checks[checks['status'] == 'skip']
+    for reason, count in skipped['reason'].value_counts().items():
+        print(f"{label}   skip - {reason}: {count}")
+    if report_path:
+        print(f"{label} Report: {report_path}")
+
+    viable = checks['status'] != 'skip'
+    return df[viable], checks
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Print Batch Builder
+Splits a folder of letters into print-ready PDF files of at most N pages or
+M MB, ordered by region or postal address, and writes a manifest giving the
+page range of every policy in every file. Page counts and addresses come from
+the letter index written at generation time (letter_index.py), so the letters
+are not opened to plan the run. Batch files are written in parallel and any
+single batch can be rebuilt from the manifest with --only.
+"""
+
+import os
+import sys
+import csv
+import json
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+from letter_index import load_letter_index
+
+DEFAULT_MAX_PAGES = 1000
+DEFAULT_MAX_MB = 50
+SORT_CHOICES = ('filename', 'region', 'address')
+MANIFEST_JSON = "print_manifest.json"
+MANIFEST_CSV = "print_manifest.csv"
+
+def get_letter_folder(folder):
+    """Letters to print live in unprotected/ (each protected PDF has its own password)"""
+    unprotected_path = os.path.join(folder, 'unprotected')
+    return unprotected_path if os.path.isdir(unprotected_path) else folder
+
+def collect_letters(folder):
+    """
+    Build the letter list for a folder from its letter index.
+    Letters missing from the index, or whose size no longer matches it (for
+    example merged with forms afterwards), are opened once to count pages.
+    Returns (letters, opened_count).
+    """
+    pdf_dir = get_letter_folder(folder)
+    index = load_letter_index(folder)
+    letters = []
+    opened = 0
+
+    for name in sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith('.pdf')):
+        path = os.path.join(pdf_dir, name)
+        size = os.path.getsize(path)
+        entry = index.get(name) or {}
+        if entry and entry.get('bytes') in (None, size):
+            pages = entry['pages']
+        else:
+            with fitz.open(path) as doc:
+                pages = doc.page_count
+            opened += 1
+        letters.append({
+            'file': name,
+            'path': path,
+            'pages': pages,
+            'bytes': size,
+            'policy': entry.get('policy', ''),
+            'address': entry.get('address', [])
+        })
+
+    return letters, opened
+
+def postal_lines(letter):
+    """Address lines without the addressee, upper-cased for sorting"""
+    return [line.upper() for line in letter['address'][1:]]
+
+def letter_region(letter):
+    """Last postal line (town / district), or '' when unknown"""
+    lines = postal_lines(letter)
+    return lines[-1] if lines else ''
+
+def sort_letters(letters, sort_by='filename'):
+    """Order letters for printing; letters without an address go last"""
+    if sort_by == 'region':
+        return sorted(letters, key=lambda l: (not letter_region(l), letter_region(l), l['file']))
+    if sort_by == 'address':
+        # Most general line first: region, then locality, then street
+        return sorted(letters, key=lambda l: (not postal_lines(l), list(reversed(postal_lines(l))), l['file']))
+    return sorted(letters, key=lambda l: l['file'])
+
+def plan_batches(letters, max_pages=DEFAULT_MAX_PAGES, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+    """
+    Split ordered letters into batches without breaking a letter across files.
+    Sizes are the sum of the separate letters, an upper bound of the written
+    file since shared logos and fonts are stored once per batch.
+    """
+    batches = []
+    current = []
+    pages = 0
+    size = 0
+    for letter in letters:
+        if current and (pages + letter['pages'] > max_pages or size + letter['bytes'] > max_bytes):
+            batches.append(current)
+            current = []
+            pages = 0
+            size = 0
+        current.append(letter)
+        pages += letter['pages']
+        size += letter['bytes']
+    if current:
+        batches.append(current)
+    return batches
+
+def build_manifest(batches, output_dir, name, sort_by):
+    """Attach output paths and per-letter page ranges to the planned batches"""
+    manifest = {
+        'name': name,
+        'created': datetime.now().isoformat(),
+        'sort': sort_by,
+        'batches': []
+    }
+    for number, letters in enumerate(batches, 1):
+        start = 1
+        entries = []
+        for letter in letters:
+            entries.append(dict(letter, start_page=start, end_page=start + letter['pages'] - 1))
+            start += letter['pages']
+        manifest['batches'].append({
+            'batch': number,
+            'output': os.path.join(output_dir, f"{name}_part{number:03d}.pdf"),
+            'pages': start - 1,
+            'letters': entries
+        })
+    return manifest
+
+def save_manifest(manifest, output_dir):
+    """Write the JSON manifest (used by --only) and a CSV copy for the print house"""
+    with open(os.path.join(output_dir, MANIFEST_JSON), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    csv_path = os.path.join(output_dir, MANIFEST_CSV)
+    with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Batch File', 'Start Page', 'End Page', 'Pages', 'Policy No',
+                         'Addressee', 'Region', 'Letter File'])
+        for batch in manifest['batches']:
+            for letter in batch['letters']:
+                writer.writerow([
+                    os.path.basename(batch['output']), letter['start_page'], letter['end_page'],
+                    letter['pages'], letter['policy'], letter['address'][0] if letter['address'] else '',
+                    letter_region(letter), letter['file']
+                ])
+    return csv_path
+
+def write_batch(batch):
+    """
+    Worker: combine one batch into its output file via a .part temp file.
+    Returns (batch number, pages written, error message or None).
+    """
+    output_path = batch['output']
+    partial_path = output_path + ".part"
+    try:
+        combined_doc = fitz.open()
+        for letter in batch['letters']:
+            with fitz.open(letter['path']) as source_doc:
+                combined_doc.insert_pdf(source_doc)
+        pages = combined_doc.page_count
+        combined_doc.save(partial_path, garbage=4, deflate=True)
+        combined_doc.close()
+        if pages != batch['pages']:
+            os.remove(partial_path)
+            return batch['batch'], pages, (f"expected {batch['pages']} pages from the letter index, "
+                                           f"got {pages} - rerun without --only to re-plan")
+        os.replace(partial_path, output_path)
+        return batch['batch'], pages, None
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return batch['batch'], None, str(e)
+
+def write_batches(batches, workers):
+    """Write batches over a process pool; returns the number that failed"""
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+        for number, pages, error in executor.map(write_batch, batches):
+            if error:
+                print(f"❌ Batch {number} failed: {error}")
+                failed += 1
+            else:
+                print(f"✅ Batch {number}: {pages} pages")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Build print-ready batch files with a page-range manifest')
+    parser.add_argument('--folder', required=True, help='Output folder of a letter run')
+    parser.add_argument('--name', help='Batch file name prefix (default: <folder>_print_<date>)')
+    parser.add_argument('--output', help='Directory for batch files (default: <folder>/print_batches)')
+    parser.add_argument('--max-pages', type=int, default=DEFAULT_MAX_PAGES,
+                        help=f'Maximum pages per batch file (default: {DEFAULT_MAX_PAGES})')
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_MB,
+                        help=f'Maximum size per batch file in MB (default: {DEFAULT_MAX_MB})')
+    parser.add_argument('--sort', choices=SORT_CHOICES, default='filename',
+                        help='Letter order: filename, region (last address line) or full postal address')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Batch files written in parallel (default: one per CPU)')
+    parser.add_argument('--only', type=int, help='Rebuild a single batch number from the existing manifest')
+
+    args = parser.parse_args()
+
+    print("🖨️ Print Batch Builder Started")
+    print("==============================")
+
+    output_dir = args.output or os.path.join(args.folder, 'print_batches')
+    os.makedirs(output_dir, exist_ok=True)
+
+    if args.only:
+        manifest_path = os.path.join(output_dir, MANIFEST_JSON)
+        if not os.path.exists(manifest_path):
+            print(f"❌ Error: No manifest found at {manifest_path}", file=sys.stderr)
+            sys.exit(1)
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        selected = [b for b in manifest['batches'] if b['batch'] == args.only]
+        if not selected:
+            print(f"❌ Error: Batch {args.only} is not in {manifest_path}", file=sys.stderr)
+            sys.exit(1)
+        print(f"🔄 Rebuilding batch {args.only} of {len(manifest['batches'])}")
+        sys.exit(1 if write_batches(selected, 1) else 0)
+
+    if not os.path.isdir(args.folder):
+        print(f"❌ Error: Folder not found: {args.folder}", file=sys.stderr)
+        sys.exit(1)
+
+    letters, opened = collect_letters(args.folder)
+    if not letters:
+        print(f"❌ Error: No PDF files found in {get_letter_folder(args.folder)}", file=sys.stderr)
+        sys.exit(1)
+    print(f"📋 Found {len(letters)} letters ({sum(l['pages'] for l in letters)} pages)")
+    if opened:
+        print(f"⚠️ {opened} letters were not in the letter index and were opened to count pages")
+
+    name = args.name or f"{os.path.basename(os.path.normpath(args.folder))}_print_{datetime.now().strftime('%Y-%m-%d')}"
+    ordered = sort_letters(letters, args.sort)
+    batches = plan_batches(ordered, args.max_pages, int(args.max_mb * 1024 * 1024))
+    manifest = build_manifest(batches, output_dir, name, args.sort)
+    csv_path = save_manifest(manifest, output_dir)
+    print(f"📄 Planned {len(batches)} batch files sorted by {args.sort} "
+          f"(max {args.max_pages} pages / {args.max_mb:g} MB each)")
+    print(f"📑 Manifest: {csv_path}")
+
+    failed = write_batches(manifest['batches'], args.workers)
+
+    print("\n🎉 Print batches completed!")
+    print(f"✅ Written: {len(batches) - failed} files in {output_dir}")
+    if failed:
+        print(f"❌ Failed: {failed} files (rebuild with --only <batch>)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
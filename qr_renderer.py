@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+QR Renderer
+PNG rendering of the payment QR codes shown in the letter viewer.
+
+generate_sms_links.py pre-renders each letter's QR next to its JSON file
+(letter_links/<folder>/<id>_qr.png), so the viewer normally just reads a file.
+For letters linked before that, server.js keeps one renderer running:
+
+  python qr_renderer.py --serve
+
+which reads one JSON request per line on stdin, {"id": 1, "data": "..."},
+and answers each with {"id": 1, "png": "<base64>"} or {"id": 1, "error": "..."}.
+Rendered images are kept in an LRU cache (QR_CACHE_SIZE entries).
+"""
+
+import io
+import os
+import sys
+import json
+import base64
+import argparse
+from functools import lru_cache
+import segno
+
+# Module size and quiet zone of the viewer image (4 px per module, 2 module border)
+QR_SCALE = 4
+QR_BORDER = 2
+QR_FILE_SUFFIX = "_qr.png"
+QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 512))
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr_png(data):
+    """PNG bytes of the QR code for data"""
+    qr = segno.make_qr(data, error='L')
+    buffer = io.BytesIO()
+    qr.save(buffer, kind='png', scale=QR_SCALE, border=QR_BORDER)
+    return buffer.getvalue()
+
+def qr_file_path(links_dir, unique_id):
+    return os.path.join(links_dir, f"{unique_id}{QR_FILE_SUFFIX}")
+
+def save_qr_png(data, links_dir, unique_id):
+    """Write the letter's QR image next to its JSON file; returns the path"""
+    path = qr_file_path(links_dir, unique_id)
+    with open(path, 'wb') as f:
+        f.write(render_qr_png(data))
+    return path
+
+def handle_request(line):
+    """Answer one request line; never raises"""
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get('id')
+        png = render_qr_png(request['data'])
+        return {'id': request_id, 'png': base64.b64encode(png).decode('ascii')}
+    except Exception as e:
+        return {'id': request_id, 'error': str(e)}
+
+def serve(stdin=sys.stdin, stdout=sys.stdout):
+    """Render requests until stdin is closed"""
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        stdout.write(json.dumps(handle_request(line)) + '\n')
+        stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description='Render payment QR codes for the letter viewer')
+    parser.add_argument('--serve', action='store_true', help='Answer JSON-lines requests on stdin')
+    parser.add_argument('--data', help='Render one QR code and write the PNG to --output')
+    parser.add_argument('--output', help='PNG file for --data')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve()
+    elif args.data and args.output:
+        with open(args.output, 'wb') as f:
+            f.write(render_qr_png(args.data))
+        print(f"QR code saved: {args.output}")
+    else:
+        parser.error('use --serve, or --data with --output')
+
+if __name__ == "__main__":
+    main()
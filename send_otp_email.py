@@ -10,6 +10,7 @@ import argparse
 import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 from dotenv import load_dotenv
+from api_config import HttpClients
 
 # Load environment variables from .env file
 load_dotenv()
@@ -29,9 +30,7 @@ if not BREVO_API_KEY:
 def setup_brevo_client():
     """Setup Brevo API client (reusing existing function)"""
     try:
-        configuration = sib_api_v3_sdk.Configuration()
-        configuration.api_key['api-key'] = BREVO_API_KEY
-        api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
+        api_instance = HttpClients.brevo_sdk(BREVO_API_KEY, os.getenv('BREVO_API_URL'))
         print("[INFO] Brevo client initialized successfully")
         return api_instance
     except Exception as e:
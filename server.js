@@ -57,13 +57,32 @@ function saveUrlMappings(mappings) {
   }
 }
 
-function generateShortId() {
-  const chars = 'abcdefghijklmnopqrstuvwxyz0123456789';
-  let result = '';
-  for (let i = 0; i < 6; i++) {
-    result += chars.charAt(Math.floor(Math.random() * chars.length));
-  }
-  return result;
+// Short IDs come from the same allocator as the SMS campaigns (short_ids.py):
+// a keyed permutation of a shared counter, unique without checking the mappings
+function allocateShortId() {
+  return new Promise((resolve, reject) => {
+    const python = spawn(PYTHON_PATH, ['short_ids.py', '--allocate', '1'], {
+      stdio: ['ignore', 'pipe', 'pipe']
+    });
+    let stdout = '';
+    let stderr = '';
+    python.stdout.on('data', (data) => { stdout += data.toString(); });
+    python.stderr.on('data', (data) => { stderr += data.toString(); });
+    python.on('error', reject);
+    python.on('close', (code) => {
+      let result = null;
+      try {
+        result = JSON.parse(stdout.trim());
+      } catch (error) {
+        // fall through to the error below
+      }
+      if (code === 0 && result && result.success) {
+        resolve(result.ids[0]);
+      } else {
+        reject(new Error((result && result.error) || stderr.trim() || `short_ids.py exited with code ${code}`));
+      }
+    });
+  });
 }
 
 function isExpired(mapping) {
@@ -519,9 +538,73 @@ app.get('/api/templates', (req, res) => {
   }
 });
 
+// Precomputed folder listing kept up to date by folder_inventory.py
+// (refreshed by the PDF wrapper, SMS link generation and the PDF combiner when a job finishes)
+const FOLDER_INVENTORY_DIR = 'folder_inventory';
+const FOLDER_INVENTORY_INDEX = path.join(FOLDER_INVENTORY_DIR, 'index.json');
+let folderInventoryCache = { mtimeMs: 0, data: null };
+let folderInventoryRebuilding = false;
+
+function rebuildFolderInventory() {
+  if (folderInventoryRebuilding) return;
+  folderInventoryRebuilding = true;
+  console.log('[INVENTORY] Building folder inventory in the background');
+  const rebuild = spawn(PYTHON_PATH, ['folder_inventory.py', '--rebuild']);
+  rebuild.on('close', (code) => {
+    folderInventoryRebuilding = false;
+    console.log(`[INVENTORY] Rebuild finished with code: ${code}`);
+  });
+  rebuild.on('error', (error) => {
+    folderInventoryRebuilding = false;
+    console.error('[INVENTORY] Could not start rebuild:', error.message);
+  });
+}
+
+// Returns the inventory document, or null when it does not exist yet
+// (the caller then scans the folders itself while a rebuild runs)
+function loadFolderInventory() {
+  try {
+    const stats = fs.statSync(FOLDER_INVENTORY_INDEX);
+    if (stats.mtimeMs !== folderInventoryCache.mtimeMs) {
+      const data = JSON.parse(fs.readFileSync(FOLDER_INVENTORY_INDEX, 'utf8'));
+      folderInventoryCache = { mtimeMs: stats.mtimeMs, data: data };
+    }
+    return folderInventoryCache.data;
+  } catch (error) {
+    if (error.code === 'ENOENT') {
+      rebuildFolderInventory();
+    } else {
+      console.warn('[INVENTORY] Could not read folder inventory:', error.message);
+    }
+    return null;
+  }
+}
+
+// PDF listing of one folder from the inventory, or null if missing
+function loadFolderContents(folder) {
+  if (folder !== path.basename(folder)) return null;
+  try {
+    const contentsFile = path.join(FOLDER_INVENTORY_DIR, 'contents', `${folder}.json`);
+    return JSON.parse(fs.readFileSync(contentsFile, 'utf8'));
+  } catch (error) {
+    return null;
+  }
+}
+
 // API endpoint to get available PDF folders
 app.get('/api/folders', (req, res) => {
   try {
+    const inventory = loadFolderInventory();
+    if (inventory) {
+      return res.json({
+        success: true,
+        folders: inventory.folders.map(folder => ({
+          name: folder.name,
+          pdfCount: folder.totalPdfFiles
+        }))
+      });
+    }
+
     console.log('[DEBUG] Scanning for PDF folders...');
     const allItems = fs.readdirSync('.');
     console.log('[DEBUG] All items in directory:', allItems.length);
@@ -588,6 +671,15 @@ app.get('/api/folders', (req, res) => {
 // NEW: Enhanced API endpoint for folder-based SMS link generation
 app.get('/api/pdf-folders-enhanced', (req, res) => {
   try {
+    const inventory = loadFolderInventory();
+    if (inventory) {
+      return res.json({
+        success: true,
+        folders: inventory.folders,
+        totalFolders: inventory.folders.length
+      });
+    }
+
     console.log('[DEBUG] Enhanced folder scanning for SMS link generation...');
     const allItems = fs.readdirSync('.');
     
@@ -809,7 +901,7 @@ app.post('/api/send-emails-brevo', (req, res) => {
   req.setTimeout(3600000); // 1 hour in milliseconds
   res.setTimeout(3600000); // 1 hour in milliseconds
 
-  const { emailData, folderName } = req.body;
+  const { emailData, folderName, linkLetters, batchSize } = req.body;
 
   if (!emailData || !folderName) {
     return res.status(400).json({
@@ -818,6 +910,15 @@ app.post('/api/send-emails-brevo', (req, res) => {
     });
   }
 
+  // Batches (Brevo messageVersions) can only be sent as letter links, never with attachments
+  const batchRecipients = parseInt(batchSize, 10) || 0;
+  if (batchRecipients < 0 || (batchRecipients > 0 && !linkLetters)) {
+    return res.status(400).json({
+      success: false,
+      message: 'batchSize must be a positive number and requires linkLetters'
+    });
+  }
+
   const folderPath = path.resolve('.', folderName);
   if (!fs.existsSync(folderPath)) {
     return res.status(404).json({
@@ -834,13 +935,23 @@ app.post('/api/send-emails-brevo', (req, res) => {
     console.log(`[DEBUG] Sending ${emailData.length} emails via Brevo`);
     console.log(`[DEBUG] PDF folder: ${folderPath}`);
 
-    // Execute Brevo email service
-    const python = spawn(PYTHON_PATH, [
+    const brevoArgs = [
       'brevo_email_service.py',
       '--data', emailDataFile,
       '--folder', folderPath,
       '--output', 'email_results.json'
-    ], {
+    ];
+    if (linkLetters) {
+      // Email links to the letter viewer instead of attaching the PDF
+      brevoArgs.push('--link-letters', '--letter-base-url', `${req.protocol}://${req.get('host')}`);
+      console.log(`[DEBUG] Letter-link mode${batchRecipients ? `, batches of ${batchRecipients}` : ''}`);
+    }
+    if (batchRecipients) {
+      brevoArgs.push('--batch-size', String(batchRecipients));
+    }
+
+    // Execute Brevo email service
+    const python = spawn(PYTHON_PATH, brevoArgs, {
       encoding: 'utf8'
     });
 
@@ -1183,7 +1294,7 @@ app.post('/api/generate-sms-links-from-folder', (req, res) => {
   req.setTimeout(600000); // 10 minutes in milliseconds
   res.setTimeout(600000); // 10 minutes in milliseconds
 
-  const { folderName, template, baseUrl } = req.body;
+  const { folderName, template, baseUrl, lazy } = req.body;
 
   if (!folderName) {
     return res.status(400).json({
@@ -1192,8 +1303,9 @@ app.post('/api/generate-sms-links-from-folder', (req, res) => {
     });
   }
 
+  // Lazy campaigns render letters on first access, so the folder may not exist yet
   const folderPath = path.resolve('.', folderName);
-  if (!fs.existsSync(folderPath)) {
+  if (!lazy && !fs.existsSync(folderPath)) {
     return res.status(404).json({
       success: false,
       message: 'Selected folder not found. Please ensure the folder exists.'
@@ -1240,6 +1352,9 @@ app.post('/api/generate-sms-links-from-folder', (req, res) => {
       '--template', detectedTemplate,
       '--base-url', baseUrl || `${req.protocol}://${req.get('host')}`
     ];
+    if (lazy) {
+      pythonArgs.push('--lazy');
+    }
 
     console.log(`[DEBUG] Python command: ${PYTHON_PATH} ${pythonArgs.join(' ')}`);
 
@@ -1384,6 +1499,124 @@ app.get('/api/download-sms-file/:outputFolder', (req, res) => {
   }
 });
 
+// API endpoint to download a campaign as one ZIP (letters, SMS CSV, run files)
+// zip_export.py streams the archive from the letter files; the layout is fixed
+// by the file names and sizes, so Range requests resume interrupted downloads.
+const ZIP_SUBFOLDERS = ['protected', 'unprotected', 'both'];
+
+function zipExportInfo(args) {
+  return new Promise((resolve, reject) => {
+    const python = spawn(PYTHON_PATH, ['zip_export.py', ...args, '--info'], {
+      stdio: ['ignore', 'pipe', 'pipe']
+    });
+    let stdout = '';
+    let stderr = '';
+    python.stdout.on('data', (data) => { stdout += data.toString(); });
+    python.stderr.on('data', (data) => { stderr += data.toString(); });
+    python.on('error', reject);
+    python.on('close', (code) => {
+      try {
+        if (code === 0) {
+          return resolve(JSON.parse(stdout.trim()));
+        }
+      } catch (error) {
+        // fall through to the error below
+      }
+      reject(new Error(stderr.trim() || `zip_export.py exited with code ${code}`));
+    });
+  });
+}
+
+// [start, end] of a single "bytes=" range, null to send the whole archive
+function parseByteRange(header, size) {
+  const match = /^bytes=(\d*)-(\d*)$/.exec((header || '').trim());
+  if (!match || (match[1] === '' && match[2] === '')) {
+    return null;
+  }
+  let start;
+  let end;
+  if (match[1] === '') {
+    // Suffix range: the last N bytes
+    start = Math.max(size - parseInt(match[2], 10), 0);
+    end = size - 1;
+  } else {
+    start = parseInt(match[1], 10);
+    end = match[2] === '' ? size - 1 : Math.min(parseInt(match[2], 10), size - 1);
+  }
+  return start <= end ? [start, end] : 'unsatisfiable';
+}
+
+app.get('/api/export-zip/:outputFolder', async (req, res) => {
+  const outputFolder = path.basename(req.params.outputFolder);
+  const subfolder = req.query.subfolder || 'protected';
+
+  if (!ZIP_SUBFOLDERS.includes(subfolder)) {
+    return res.status(400).json({ success: false, message: `subfolder must be one of ${ZIP_SUBFOLDERS.join(', ')}` });
+  }
+  if (!fs.existsSync(outputFolder) || !fs.statSync(outputFolder).isDirectory()) {
+    return res.status(404).json({ success: false, message: 'Folder not found' });
+  }
+
+  const args = ['--folder', outputFolder, '--subfolder', subfolder];
+  let info;
+  try {
+    info = await zipExportInfo(args);
+  } catch (error) {
+    console.error('[ERROR] Failed to prepare ZIP export:', error);
+    return res.status(500).json({ success: false, message: 'Failed to prepare ZIP export', error: error.message });
+  }
+
+  const etag = `"${info.etag}"`;
+  const filename = `${outputFolder}_${subfolder}.zip`;
+  res.setHeader('Content-Type', 'application/zip');
+  res.setHeader('Content-Disposition', `attachment; filename="${filename}"`);
+  res.setHeader('Accept-Ranges', 'bytes');
+  res.setHeader('ETag', etag);
+
+  // A range only applies to the same archive (If-Range carries the ETag the client has)
+  const ifRange = req.headers['if-range'];
+  const range = (!ifRange || ifRange === etag) ? parseByteRange(req.headers.range, info.size) : null;
+  if (range === 'unsatisfiable') {
+    res.setHeader('Content-Range', `bytes */${info.size}`);
+    return res.status(416).end();
+  }
+
+  if (range) {
+    res.status(206);
+    res.setHeader('Content-Range', `bytes ${range[0]}-${range[1]}/${info.size}`);
+    res.setHeader('Content-Length', range[1] - range[0] + 1);
+    args.push('--start', String(range[0]), '--end', String(range[1]));
+  } else {
+    res.setHeader('Content-Length', info.size);
+  }
+  if (req.method === 'HEAD') {
+    return res.end();
+  }
+
+  console.log(`[DEBUG] ZIP export of ${outputFolder} (${subfolder}): ${info.entries} files, ` +
+              (range ? `bytes ${range[0]}-${range[1]} of ${info.size}` : `${info.size} bytes`));
+  const python = spawn(PYTHON_PATH, ['zip_export.py', ...args], {
+    stdio: ['ignore', 'pipe', 'pipe']
+  });
+  python.stdout.pipe(res);
+  python.stderr.on('data', (data) => {
+    console.error(`[ZIP] ${data.toString().trim()}`);
+  });
+  python.on('close', (code) => {
+    if (code !== 0) {
+      console.error(`[ERROR] zip_export.py exited with code ${code}`);
+      // Headers are sent - cut the response so the client sees an incomplete download
+      res.destroy();
+    }
+  });
+  // Stop reading letters when the client goes away
+  res.on('close', () => {
+    if (python.exitCode === null) {
+      python.kill();
+    }
+  });
+});
+
 // API endpoint to view individual letter (customer-facing)
 // NEW: Password verification endpoint
 app.post('/api/verify-letter-access', (req, res) => {
@@ -2459,6 +2692,128 @@ function generateLetterViewerHTML(letterData) {
 }
 
 // API endpoint to download PDF for letter viewer
+// Lazy letters (generate_sms_links.py --lazy) have no PDF until their link is
+// first opened; lazy_letters.py renders them into LETTER_CACHE_DIR.
+const LETTER_CACHE_DIR = process.env.LETTER_CACHE_DIR || 'letter_cache';
+const LAZY_RENDER_TIMEOUT_MS = 200000;
+// Each render runs a template in its own Python process; at most
+// LAZY_RENDER_CONCURRENCY run at once and LAZY_RENDER_QUEUE_MAX wait for a
+// slot. Opens beyond that get a 503 with Retry-After instead of a process.
+const LAZY_RENDER_CONCURRENCY = parseInt(process.env.LAZY_RENDER_CONCURRENCY || '2', 10);
+const LAZY_RENDER_QUEUE_MAX = parseInt(process.env.LAZY_RENDER_QUEUE_MAX || '20', 10);
+const LAZY_RENDER_RETRY_AFTER_SECONDS = 30;
+const LETTER_CACHE_EVICT_INTERVAL_MS = 15 * 60 * 1000;
+const lazyRenders = new Map(); // uniqueId -> in-flight or queued render promise
+const lazyRenderQueue = []; // renders waiting for a slot
+let lazyRendersRunning = 0;
+
+function runQueuedLazyRenders() {
+  while (lazyRendersRunning < LAZY_RENDER_CONCURRENCY && lazyRenderQueue.length > 0) {
+    const start = lazyRenderQueue.shift();
+    lazyRendersRunning++;
+    start().then(() => {
+      lazyRendersRunning--;
+      runQueuedLazyRenders();
+    });
+  }
+}
+
+function renderLazyLetter(uniqueId, jsonFile) {
+  if (lazyRenders.has(uniqueId)) {
+    return lazyRenders.get(uniqueId);
+  }
+
+  if (lazyRenderQueue.length >= LAZY_RENDER_QUEUE_MAX) {
+    const error = new Error('Too many letters are being prepared, please try again shortly');
+    error.code = 'RENDER_QUEUE_FULL';
+    return Promise.reject(error);
+  }
+
+  const render = new Promise((resolve, reject) => {
+    lazyRenderQueue.push(() => spawnLazyRender(uniqueId, jsonFile).then(resolve, reject));
+    runQueuedLazyRenders();
+  });
+
+  lazyRenders.set(uniqueId, render);
+  const done = () => lazyRenders.delete(uniqueId);
+  render.then(done, done);
+  return render;
+}
+
+function spawnLazyRender(uniqueId, jsonFile) {
+  return new Promise((resolve, reject) => {
+    console.log(`[DEBUG] Rendering lazy letter ${uniqueId}`);
+    const python = spawn(PYTHON_PATH, ['lazy_letters.py', '--render', jsonFile], {
+      stdio: ['ignore', 'pipe', 'pipe'],
+      timeout: LAZY_RENDER_TIMEOUT_MS
+    });
+
+    let stdout = '';
+    let stderr = '';
+    python.stdout.on('data', (data) => { stdout += data.toString(); });
+    python.stderr.on('data', (data) => { stderr += data.toString(); });
+    python.on('error', reject);
+    python.on('close', (code) => {
+      // The result is the last line printed
+      const lines = stdout.trim().split('\n');
+      let result = null;
+      try {
+        result = JSON.parse(lines[lines.length - 1]);
+      } catch (error) {
+        // fall through to the error below
+      }
+      if (code === 0 && result && result.success) {
+        resolve(result.pdfPath);
+      } else {
+        reject(new Error((result && result.error) || stderr.trim() || `lazy_letters.py exited with code ${code}`));
+      }
+    });
+  });
+}
+
+// Keep the letter cache within LETTER_CACHE_MAX_MB / LETTER_CACHE_DAYS
+setInterval(() => {
+  if (!fs.existsSync(LETTER_CACHE_DIR)) return;
+  const python = spawn(PYTHON_PATH, ['lazy_letters.py', '--evict'], { stdio: ['ignore', 'pipe', 'pipe'] });
+  let output = '';
+  python.stdout.on('data', (data) => { output += data.toString(); });
+  python.stderr.on('data', (data) => { output += data.toString(); });
+  python.on('error', (error) => console.error('[ERROR] Letter cache eviction failed:', error.message));
+  python.on('close', () => console.log(output.trim()));
+}, LETTER_CACHE_EVICT_INTERVAL_MS);
+
+function sendLetterRenderError(res, uniqueId, error) {
+  if (error.code === 'RENDER_QUEUE_FULL') {
+    console.warn(`[WARN] Render queue full, letter ${uniqueId} deferred`);
+    res.setHeader('Retry-After', String(LAZY_RENDER_RETRY_AFTER_SECONDS));
+    return res.status(503).json({
+      success: false,
+      message: error.message
+    });
+  }
+  console.error(`[ERROR] Failed to render letter ${uniqueId}:`, error.message);
+  res.status(500).json({
+    success: false,
+    message: 'Failed to prepare PDF',
+    error: error.message
+  });
+}
+
+// Path of a letter's protected PDF, rendering lazy letters on first access
+function resolveLetterPdf(uniqueId, letterData, jsonFile) {
+  if (!letterData.lazy) {
+    return Promise.resolve(path.join('.', letterData.pdfPath.replace(/^\//, '')));
+  }
+  const cachedPdf = path.join(LETTER_CACHE_DIR, uniqueId, 'protected.pdf');
+  if (fs.existsSync(cachedPdf)) {
+    // Keeps recently opened letters out of the cache eviction
+    const now = new Date();
+    fs.utimesSync(cachedPdf, now, now);
+    return Promise.resolve(cachedPdf);
+  }
+  return renderLazyLetter(uniqueId, jsonFile);
+}
+
 app.get('/api/download-pdf/:uniqueId', (req, res) => {
   try {
     const { uniqueId } = req.params;
@@ -2466,6 +2821,7 @@ app.get('/api/download-pdf/:uniqueId', (req, res) => {
     // Find the letter data file to get PDF path
     const letterLinksDir = 'letter_links';
     let letterData = null;
+    let letterJsonFile = null;
 
     if (fs.existsSync(letterLinksDir)) {
       const outputFolders = fs.readdirSync(letterLinksDir);
@@ -2476,6 +2832,7 @@ app.get('/api/download-pdf/:uniqueId', (req, res) => {
           const jsonFile = path.join(folderPath, `${uniqueId}.json`);
           if (fs.existsSync(jsonFile)) {
             letterData = JSON.parse(fs.readFileSync(jsonFile, 'utf8'));
+            letterJsonFile = jsonFile;
             break;
           }
         }
@@ -2489,23 +2846,22 @@ app.get('/api/download-pdf/:uniqueId', (req, res) => {
       });
     }
 
-    // Convert relative path to absolute path
-    const pdfPath = path.join('.', letterData.pdfPath.replace(/^\//, ''));
-    
-    if (!fs.existsSync(pdfPath)) {
-      return res.status(404).json({
-        success: false,
-        message: 'PDF file not found on server'
-      });
-    }
+    resolveLetterPdf(uniqueId, letterData, letterJsonFile).then((pdfPath) => {
+      if (!fs.existsSync(pdfPath)) {
+        return res.status(404).json({
+          success: false,
+          message: 'PDF file not found on server'
+        });
+      }
 
-    // Set headers for PDF download
-    const filename = path.basename(pdfPath);
-    res.setHeader('Content-Type', 'application/pdf');
-    res.setHeader('Content-Disposition', `attachment; filename="${filename}"`);
-    
-    console.log(`[DEBUG] Serving PDF: ${pdfPath} as ${filename}`);
-    fs.createReadStream(pdfPath).pipe(res);
+      // Set headers for PDF download (lazy letters keep their campaign filename)
+      const filename = path.basename(letterData.pdfPath);
+      res.setHeader('Content-Type', 'application/pdf');
+      res.setHeader('Content-Disposition', `attachment; filename="${filename}"`);
+      
+      console.log(`[DEBUG] Serving PDF: ${pdfPath} as ${filename}`);
+      fs.createReadStream(pdfPath).pipe(res);
+    }).catch((error) => sendLetterRenderError(res, uniqueId, error));
 
   } catch (error) {
     console.error('[ERROR] Failed to serve PDF:', error);
@@ -2568,6 +2924,73 @@ app.get('/test-qr', (req, res) => {
 });
 
 // Generate QR code image for letter viewer
+// Long-running QR renderer (qr_renderer.py --serve), started on first use and
+// restarted if it exits; requests and replies are JSON lines matched by id
+const qrRenderer = { process: null, stdout: '', nextId: 1, pending: new Map() };
+const QR_RENDER_TIMEOUT_MS = 10000;
+
+function startQrRenderer() {
+  const renderer = spawn(PYTHON_PATH, ['qr_renderer.py', '--serve'], {
+    stdio: ['pipe', 'pipe', 'pipe']
+  });
+  qrRenderer.process = renderer;
+  qrRenderer.stdout = '';
+
+  renderer.stdout.on('data', (data) => {
+    qrRenderer.stdout += data.toString();
+    let newline;
+    while ((newline = qrRenderer.stdout.indexOf('\n')) >= 0) {
+      const line = qrRenderer.stdout.slice(0, newline);
+      qrRenderer.stdout = qrRenderer.stdout.slice(newline + 1);
+      try {
+        const reply = JSON.parse(line);
+        const request = qrRenderer.pending.get(reply.id);
+        if (!request) continue;
+        qrRenderer.pending.delete(reply.id);
+        clearTimeout(request.timer);
+        if (reply.png) {
+          request.resolve(Buffer.from(reply.png, 'base64'));
+        } else {
+          request.reject(new Error(reply.error || 'QR renderer returned no image'));
+        }
+      } catch (error) {
+        console.error('[QR-RENDERER] Invalid reply:', error.message);
+      }
+    }
+  });
+
+  renderer.stderr.on('data', (data) => {
+    console.error(`[QR-RENDERER] ${data.toString().trim()}`);
+  });
+
+  const stopRenderer = (reason) => {
+    if (qrRenderer.process !== renderer) return;
+    qrRenderer.process = null;
+    for (const request of qrRenderer.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(new Error(reason));
+    }
+    qrRenderer.pending.clear();
+  };
+  renderer.on('exit', (code) => stopRenderer(`QR renderer exited with code ${code}`));
+  renderer.on('error', (error) => stopRenderer(`QR renderer failed: ${error.message}`));
+  renderer.stdin.on('error', (error) => stopRenderer(`QR renderer input closed: ${error.message}`));
+  return renderer;
+}
+
+function renderQrPng(data) {
+  return new Promise((resolve, reject) => {
+    const renderer = qrRenderer.process || startQrRenderer();
+    const id = qrRenderer.nextId++;
+    const timer = setTimeout(() => {
+      qrRenderer.pending.delete(id);
+      reject(new Error('QR renderer timed out'));
+    }, QR_RENDER_TIMEOUT_MS);
+    qrRenderer.pending.set(id, { resolve, reject, timer });
+    renderer.stdin.write(JSON.stringify({ id, data }) + '\n');
+  });
+}
+
 app.get('/api/qr-code/:uniqueId', (req, res) => {
   try {
     const { uniqueId } = req.params;
@@ -2575,6 +2998,7 @@ app.get('/api/qr-code/:uniqueId', (req, res) => {
     // Find the letter data file to get QR code data
     const letterLinksDir = 'letter_links';
     let letterData = null;
+    let letterFolderPath = null;
 
     if (fs.existsSync(letterLinksDir)) {
       const outputFolders = fs.readdirSync(letterLinksDir);
@@ -2585,6 +3009,7 @@ app.get('/api/qr-code/:uniqueId', (req, res) => {
           const jsonFile = path.join(folderPath, `${uniqueId}.json`);
           if (fs.existsSync(jsonFile)) {
             letterData = JSON.parse(fs.readFileSync(jsonFile, 'utf8'));
+            letterFolderPath = folderPath;
             break;
           }
         }
@@ -2595,86 +3020,32 @@ app.get('/api/qr-code/:uniqueId', (req, res) => {
       return res.status(404).send('QR code data not found');
     }
 
-    console.log(`[DEBUG] Generating QR code for ${uniqueId}: ${letterData.qrCodeData.substring(0, 50)}...`);
-    console.log(`[DEBUG] QR data length: ${letterData.qrCodeData.length} characters`);
-
-    // Use Python to generate QR code image
-    const pythonArgs = [
-      '-c',
-      `
-import qrcode
-import io
-import sys
-import base64
-
-# QR data from command line
-qr_data = """${letterData.qrCodeData.replace(/"/g, '\\"')}"""
-
-# Generate QR code
-qr = qrcode.QRCode(
-    version=1,
-    error_correction=qrcode.constants.ERROR_CORRECT_L,
-    box_size=4,
-    border=2,
-)
-qr.add_data(qr_data)
-qr.make(fit=True)
-
-# Create image
-img = qr.make_image(fill_color="black", back_color="white")
-
-# Save to bytes
-img_buffer = io.BytesIO()
-img.save(img_buffer, format='PNG')
-img_buffer.seek(0)
-
-# Output base64 encoded image
-import base64
-img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-print(img_base64)
-      `
-    ];
-
-    const python = spawn(PYTHON_PATH, pythonArgs, {
-      encoding: 'utf8',
-      stdio: ['pipe', 'pipe', 'pipe']
-    });
-
-    let stdout = '';
-    let stderr = '';
-
-    python.stdout.on('data', (data) => {
-      stdout += data.toString();
-    });
+    const sendQrPng = (imageBuffer) => {
+      res.setHeader('Content-Type', 'image/png');
+      res.setHeader('Cache-Control', 'public, max-age=3600'); // Cache for 1 hour
+      res.send(imageBuffer);
+    };
 
-    python.stderr.on('data', (data) => {
-      stderr += data.toString();
-    });
+    // Pre-rendered by generate_sms_links.py
+    const qrFile = path.join(letterFolderPath, `${uniqueId}_qr.png`);
+    if (fs.existsSync(qrFile)) {
+      return sendQrPng(fs.readFileSync(qrFile));
+    }
 
-    python.on('close', (code) => {
-      if (code === 0 && stdout.trim()) {
-        // Convert base64 to image and send
-        const imageBuffer = Buffer.from(stdout.trim(), 'base64');
-        res.setHeader('Content-Type', 'image/png');
-        res.setHeader('Cache-Control', 'public, max-age=3600'); // Cache for 1 hour
-        res.send(imageBuffer);
+    // Links generated before QR pre-rendering: use the running renderer
+    console.log(`[DEBUG] Rendering QR code for ${uniqueId}: ${letterData.qrCodeData.substring(0, 50)}...`);
+    renderQrPng(letterData.qrCodeData)
+      .then((imageBuffer) => {
+        sendQrPng(imageBuffer);
         console.log(`[DEBUG] QR code generated successfully for ${uniqueId}`);
-      } else {
-        console.error(`[ERROR] Python QR generation failed: ${stderr}`);
-        // Fallback to a simple error image or redirect to Google Charts with truncated data
+      })
+      .catch((error) => {
+        console.error(`[ERROR] QR rendering failed: ${error.message}`);
+        // Fallback to Google Charts with truncated data
         const truncatedData = letterData.qrCodeData.substring(0, 1000); // Limit to 1000 chars
         const googleQRUrl = `https://chart.googleapis.com/chart?chs=100x100&cht=qr&chl=${encodeURIComponent(truncatedData)}`;
         res.redirect(googleQRUrl);
-      }
-    });
-
-    python.on('error', (error) => {
-      console.error('[ERROR] Failed to start Python QR generation:', error);
-      // Fallback to Google Charts
-      const truncatedData = letterData.qrCodeData.substring(0, 1000);
-      const googleQRUrl = `https://chart.googleapis.com/chart?chs=100x100&cht=qr&chl=${encodeURIComponent(truncatedData)}`;
-      res.redirect(googleQRUrl);
-    });
+      });
 
   } catch (error) {
     console.error('[ERROR] Failed to generate QR code:', error);
@@ -2702,6 +3073,7 @@ app.get('/api/download-pdf-unprotected/:uniqueId', (req, res) => {
     // Find the letter data file to get PDF path
     const letterLinksDir = 'letter_links';
     let letterData = null;
+    let letterJsonFile = null;
 
     if (fs.existsSync(letterLinksDir)) {
       const outputFolders = fs.readdirSync(letterLinksDir);
@@ -2712,6 +3084,7 @@ app.get('/api/download-pdf-unprotected/:uniqueId', (req, res) => {
           const jsonFile = path.join(folderPath, `${uniqueId}.json`);
           if (fs.existsSync(jsonFile)) {
             letterData = JSON.parse(fs.readFileSync(jsonFile, 'utf8'));
+            letterJsonFile = jsonFile;
             break;
           }
         }
@@ -2726,23 +3099,23 @@ app.get('/api/download-pdf-unprotected/:uniqueId', (req, res) => {
     }
 
     // Use protected PDF path (already set to protected in generate_sms_links.py)
-    const pdfPath = path.join('.', letterData.pdfPath.replace(/^\//, ''));
-    
-    if (!fs.existsSync(pdfPath)) {
-      console.error(`[ERROR] PDF file not found: ${pdfPath}`);
-      return res.status(404).json({
-        success: false,
-        message: 'PDF file not found on server'
-      });
-    }
+    resolveLetterPdf(uniqueId, letterData, letterJsonFile).then((pdfPath) => {
+      if (!fs.existsSync(pdfPath)) {
+        console.error(`[ERROR] PDF file not found: ${pdfPath}`);
+        return res.status(404).json({
+          success: false,
+          message: 'PDF file not found on server'
+        });
+      }
 
-    // Set headers for PDF download
-    const filename = path.basename(pdfPath);
-    res.setHeader('Content-Type', 'application/pdf');
-    res.setHeader('Content-Disposition', `attachment; filename="${filename}"`);
-    
-    console.log(`[DEBUG] Serving protected PDF: ${pdfPath} as ${filename}`);
-    fs.createReadStream(pdfPath).pipe(res);
+      // Set headers for PDF download (lazy letters keep their campaign filename)
+      const filename = path.basename(letterData.pdfPath);
+      res.setHeader('Content-Type', 'application/pdf');
+      res.setHeader('Content-Disposition', `attachment; filename="${filename}"`);
+      
+      console.log(`[DEBUG] Serving protected PDF: ${pdfPath} as ${filename}`);
+      fs.createReadStream(pdfPath).pipe(res);
+    }).catch((error) => sendLetterRenderError(res, uniqueId, error));
 
   } catch (error) {
     console.error('[ERROR] Failed to serve PDF:', error);
@@ -2861,19 +3234,37 @@ app.get('/api/folder-contents/:folder/:subfolder?', (req, res) => {
       });
     }
 
-    const files = fs.readdirSync(targetPath)
-      .filter(file => file.endsWith('.pdf'))
-      .map(file => {
-        const filePath = path.join(targetPath, file);
-        const stats = fs.statSync(filePath);
-        return {
-          filename: file,
-          path: `${folder}${subfolder ? '/' + subfolder : ''}/${file}`,
-          size: stats.size,
-          lastModified: stats.mtime,
-          location: subfolder || 'main'
-        };
-      });
+    // Use the inventory listing unless files were added or removed since it was taken
+    const location = subfolder || 'main';
+    const contents = loadFolderContents(folder);
+    const indexedFiles = contents && contents.files[location];
+    const listingIsCurrent = indexedFiles &&
+      fs.statSync(targetPath).mtimeMs <= Date.parse(contents.indexedAt);
+
+    let files;
+    if (listingIsCurrent) {
+      files = indexedFiles.map(file => ({
+        filename: file.filename,
+        path: `${folder}${subfolder ? '/' + subfolder : ''}/${file.filename}`,
+        size: file.size,
+        lastModified: file.lastModified,
+        location: location
+      }));
+    } else {
+      files = fs.readdirSync(targetPath)
+        .filter(file => file.endsWith('.pdf'))
+        .map(file => {
+          const filePath = path.join(targetPath, file);
+          const stats = fs.statSync(filePath);
+          return {
+            filename: file,
+            path: `${folder}${subfolder ? '/' + subfolder : ''}/${file}`,
+            size: stats.size,
+            lastModified: stats.mtime,
+            location: subfolder || 'main'
+          };
+        });
+    }
 
     res.json({
       success: true,
@@ -2969,7 +3360,7 @@ app.get('/api/status', (req, res) => {
 });
 
 // Test endpoint for short URL system
-app.post('/api/test-short-url', (req, res) => {
+app.post('/api/test-short-url', async (req, res) => {
   try {
     const { longUrl } = req.body;
     
@@ -2980,18 +3371,10 @@ app.post('/api/test-short-url', (req, res) => {
       });
     }
     
-    // Generate short ID
-    const shortId = generateShortId();
+    // Allocate short ID (unique by construction - no retries)
+    const finalShortId = await allocateShortId();
     const mappings = loadUrlMappings();
     
-    // Ensure unique ID
-    let attempts = 0;
-    let finalShortId = shortId;
-    while (mappings[finalShortId] && attempts < 10) {
-      finalShortId = generateShortId();
-      attempts++;
-    }
-    
     // Create mapping
     const mapping = {
       url: longUrl,
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Short IDs
+Allocates the 6-character nicl.ink IDs (lowercase letters and digits).
+
+Instead of drawing random IDs and checking them against url_mappings.json,
+every ID is the next value of a persisted counter passed through a keyed
+permutation of the whole ID space (a Feistel network over 32 bits with
+BLAKE2s rounds, cycle-walked into 36^6). Different counter values always
+give different IDs, and without the key the sequence cannot be predicted:
+
+  allocate_short_ids(20000)   - a whole campaign's IDs in one call
+
+The counter lives in short_ids.json next to a fingerprint of the key, so a
+changed key (which would restart the permutation) is refused instead of
+handing out IDs that may already be in use. The key is SHORT_ID_KEY, or a
+random key created once in short_id_key.
+
+IDs drawn at random before the allocator existed are recorded the first
+time it runs and skipped until the last of them has expired.
+
+server.js allocates through `python short_ids.py --allocate 1`.
+"""
+
+import os
+import sys
+import json
+import time
+import string
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+
+ALPHABET = string.ascii_lowercase + string.digits
+ID_LENGTH = 6
+ID_SPACE = len(ALPHABET) ** ID_LENGTH
+ROUNDS = 8
+
+SHORT_URL_BASE = "https://nicl.ink"
+URL_MAPPINGS_FILE = "url_mappings.json"
+SHORT_URL_DAYS = 30
+
+STATE_FILE = os.getenv('SHORT_ID_STATE', 'short_ids.json')
+KEY_FILE = os.getenv('SHORT_ID_KEY_FILE', 'short_id_key')
+LOCK_TIMEOUT_SECONDS = 30
+
+def load_key(key_file=KEY_FILE):
+    """SHORT_ID_KEY, else the key file (created with a random key on first use)"""
+    key = os.getenv('SHORT_ID_KEY')
+    if key:
+        return key.encode('utf-8')
+    try:
+        with open(key_file, 'r', encoding='ascii') as f:
+            return f.read().strip().encode('ascii')
+    except FileNotFoundError:
+        key = os.urandom(32).hex()
+        fd = os.open(key_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        with os.fdopen(fd, 'w', encoding='ascii') as f:
+            f.write(key)
+        return key.encode('ascii')
+
+def key_fingerprint(key):
+    return hashlib.sha256(b'short-id-fingerprint:' + key).hexdigest()[:16]
+
+class ShortIdPermutation:
+    """Keyed bijection of range(ID_SPACE) onto itself"""
+
+    def __init__(self, key):
+        # blake2s keys are at most 32 bytes
+        self.key = hashlib.sha256(key).digest()
+
+    def _round(self, round_no, half):
+        digest = hashlib.blake2s(bytes([round_no]) + half.to_bytes(2, 'big'), key=self.key, digest_size=2).digest()
+        return int.from_bytes(digest, 'big')
+
+    def _permute32(self, value):
+        left, right = value >> 16, value & 0xFFFF
+        for round_no in range(ROUNDS):
+            left, right = right, left ^ self._round(round_no, right)
+        return (left << 16) | right
+
+    def __call__(self, value):
+        # Cycle-walk: a permutation of 2^32 values restricted to the ones below ID_SPACE
+        value = self._permute32(value)
+        while value >= ID_SPACE:
+            value = self._permute32(value)
+        return value
+
+def encode_id(value):
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+@contextmanager
+def state_lock(state_path, timeout=LOCK_TIMEOUT_SECONDS):
+    """Exclusive lock so SMS runs and the server never hand out the same counter values"""
+    lock_path = f"{state_path}.lock"
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > timeout:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Short ID allocator is locked: {lock_path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+def legacy_ids(mappings_file=URL_MAPPINGS_FILE):
+    """(6-character IDs in the mappings file, when the last of them expires)"""
+    try:
+        with open(mappings_file, 'r', encoding='utf-8') as f:
+            mappings = json.load(f)
+    except (OSError, ValueError):
+        return [], None
+    ids = sorted(short_id for short_id in mappings if len(short_id) == ID_LENGTH)
+    expiries = [mappings[short_id].get('expires') for short_id in ids if mappings[short_id].get('expires')]
+    return ids, max(expiries) if expiries else None
+
+def load_state(state_path, fingerprint, mappings_file):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        # First run: IDs drawn at random so far must not be handed out again
+        ids, until = legacy_ids(mappings_file)
+        return {'next': 0, 'key': fingerprint, 'legacy': ids, 'legacyUntil': until}
+    if state.get('key') != fingerprint:
+        raise RuntimeError(f"Short ID key does not match {state_path}; "
+                           f"restore the original key (SHORT_ID_KEY / {KEY_FILE})")
+    return state
+
+def save_state(state_path, state):
+    temp_path = f"{state_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_path, state_path)
+
+def allocate_short_ids(count, state_path=STATE_FILE, key_file=KEY_FILE, mappings_file=URL_MAPPINGS_FILE):
+    """count IDs never handed out before, reserved before they are returned"""
+    key = load_key(key_file)
+    permutation = ShortIdPermutation(key)
+    with state_lock(state_path):
+        state = load_state(state_path, key_fingerprint(key), mappings_file)
+        if state.get('legacyUntil') and datetime.now().isoformat() > state['legacyUntil']:
+            state['legacy'], state['legacyUntil'] = [], None
+        legacy = set(state.get('legacy') or [])
+
+        ids = []
+        counter = state['next']
+        while len(ids) < count:
+            if counter >= ID_SPACE:
+                raise RuntimeError("Short ID space exhausted")
+            short_id = encode_id(permutation(counter))
+            counter += 1
+            if short_id not in legacy:
+                ids.append(short_id)
+        state['next'] = counter
+        save_state(state_path, state)
+    return ids
+
+def url_mapping(long_url, days=SHORT_URL_DAYS):
+    """Entry of url_mappings.json for a new short URL"""
+    now = datetime.now()
+    return {
+        "url": long_url,
+        "created": now.isoformat(),
+        "expires": (now + timedelta(days=days)).isoformat(),
+        "clicks": 0,
+        "active": True
+    }
+
+def short_url_for(short_id):
+    return f"{SHORT_URL_BASE}/{short_id}"
+
+def save_url_mappings(new_mappings, mappings_file=URL_MAPPINGS_FILE):
+    """Add mappings to url_mappings.json in one read and one write; False if it could not be saved"""
+    try:
+        with open(mappings_file, 'r', encoding='utf-8') as f:
+            mappings = json.load(f)
+    except FileNotFoundError:
+        mappings = {}
+    try:
+        mappings.update(new_mappings)
+        temp_path = f"{mappings_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(mappings, f, indent=2)
+        os.replace(temp_path, mappings_file)
+        return True
+    except Exception as e:
+        print(f"[SMS] Error saving URL mapping: {e}")
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description='Allocate nicl.ink short IDs')
+    parser.add_argument('--allocate', type=int, required=True, metavar='COUNT', help='Number of IDs to allocate')
+    args = parser.parse_args()
+    try:
+        print(json.dumps({'success': True, 'ids': allocate_short_ids(args.allocate)}))
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
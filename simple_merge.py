@@ -12,16 +12,14 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from PIL import Image
 import fitz  # PyMuPDF - more reliable than PyPDF2
+import argparse
+from appendix_merge import AppendixMerger, RENEWAL_APPENDIX_FORMS, merge_files_parallel
 
-def convert_pdf_to_images_and_merge():
+def convert_pdf_to_images_and_merge(workers=1):
     """Convert PDFs to images and recreate as new PDF - most reliable method"""
     
     # Paths to all forms that need to be merged
-    required_pdfs = [
-        "Renewal Acceptance Form - HealthSense Plan V2 0.pdf",
-        "HEALTHSENSE _SOB - FEB 2025.pdf", 
-        "HEALTHSENSE CAT COVER_SOB - FEB 2025.pdf"
-    ]
+    required_pdfs = RENEWAL_APPENDIX_FORMS
     
     # Check if all required PDFs exist
     missing_files = []
@@ -63,6 +61,35 @@ def convert_pdf_to_images_and_merge():
         print(f"   {i}. {os.path.basename(pdf_path)}")
     print()
     
+    if workers > 1:
+        success_count, error_count = merge_in_parallel(pdf_files, required_pdfs, workers)
+    else:
+        success_count, error_count = merge_serially(pdf_files, required_pdfs)
+    
+    # Clean up any unwanted AcceptanceForm files that might have been created
+    cleanup_count = 0
+    acceptance_files = glob.glob(f"{output_folder}/*_AcceptanceForm.pdf")
+    for acceptance_file in acceptance_files:
+        try:
+            os.remove(acceptance_file)
+            cleanup_count += 1
+        except:
+            pass
+    
+    print(f"\n🎉 Merging completed!")
+    print(f"✅ Successfully merged: {success_count} files")
+    if error_count > 0:
+        print(f"❌ Failed to merge: {error_count} files")
+    if cleanup_count > 0:
+        print(f"🧹 Cleaned up {cleanup_count} unwanted AcceptanceForm files")
+
+def merge_serially(pdf_files, required_pdfs):
+    """Merge letters one at a time in this process; returns (success_count, error_count)"""
+    
+    # Parse the static forms once; every letter is merged from this copy
+    merger = AppendixMerger(required_pdfs)
+    print()
+    
     success_count = 0
     error_count = 0
     
@@ -75,31 +102,9 @@ def convert_pdf_to_images_and_merge():
             backup_file = pdf_file.replace('.pdf', '_backup.pdf')
             os.rename(pdf_file, backup_file)
             
-            # Open all PDFs with PyMuPDF
+            # Letter pages followed by the pre-loaded forms
             letter_doc = fitz.open(backup_file)
-            
-            # Create new PDF
-            merged_doc = fitz.open()
-            
-            # Add pages from renewal letter (pages 1-2)
-            for page_num in range(letter_doc.page_count):
-                merged_doc.insert_pdf(letter_doc, from_page=page_num, to_page=page_num)
-            
-            # Add pages from each required PDF in order
-            for pdf_path in required_pdfs:
-                try:
-                    form_doc = fitz.open(pdf_path)
-                    print(f"   📄 Adding {form_doc.page_count} pages from {os.path.basename(pdf_path)}")
-                    
-                    # Add all pages from this PDF
-                    for page_num in range(form_doc.page_count):
-                        merged_doc.insert_pdf(form_doc, from_page=page_num, to_page=page_num)
-                    
-                    form_doc.close()
-                    
-                except Exception as e:
-                    print(f"   ⚠️ Warning: Could not merge {pdf_path}: {str(e)}")
-                    continue
+            merged_doc = merger.build(letter_doc)
             
             # Save merged PDF
             merged_doc.save(pdf_file)
@@ -139,30 +144,42 @@ def convert_pdf_to_images_and_merge():
             print(f"❌ Failed to merge: {filename} - {str(e)}")
             error_count += 1
     
-    # Clean up any unwanted AcceptanceForm files that might have been created
-    cleanup_count = 0
-    acceptance_files = glob.glob(f"{output_folder}/*_AcceptanceForm.pdf")
-    for acceptance_file in acceptance_files:
-        try:
-            os.remove(acceptance_file)
-            cleanup_count += 1
-        except:
-            pass
+    merger.close()
     
-    print(f"\n🎉 Merging completed!")
-    print(f"✅ Successfully merged: {success_count} files")
-    if error_count > 0:
-        print(f"❌ Failed to merge: {error_count} files")
-    if cleanup_count > 0:
-        print(f"🧹 Cleaned up {cleanup_count} unwanted AcceptanceForm files")
+    return success_count, error_count
+
+def merge_in_parallel(pdf_files, required_pdfs, workers):
+    """Merge letters over a process pool; returns (success_count, error_count)"""
+    print(f"⚙️ Merging with {workers} worker processes...")
+    print()
+    
+    success_count = 0
+    error_count = 0
+    
+    for pdf_file, merged, detail in merge_files_parallel(pdf_files, required_pdfs, workers):
+        filename = os.path.basename(pdf_file)
+        if merged:
+            print(f"✅ Merged: {filename} ({detail} total pages)")
+            success_count += 1
+        else:
+            print(f"❌ Failed to merge: {filename} - {detail}")
+            error_count += 1
+    
+    return success_count, error_count
 
 if __name__ == "__main__":
     try:
         import fitz
+        parser = argparse.ArgumentParser(description='Merge the HealthSense forms into renewal letters')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes for merging (default: 1 = serial, 0 = one per CPU)')
+        args = parser.parse_args()
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        
         print("� MMerging PDFs...")
         print()
         
-        convert_pdf_to_images_and_merge()
+        convert_pdf_to_images_and_merge(workers)
         
     except ImportError:
         print("❌ PyMuPDF not installed. Please install it:")
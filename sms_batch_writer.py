@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+SMS Batch Writer
+Writes the SMS bulk file row by row while the links are generated, instead
+of collecting every row and writing one CSV at the end.
+
+  letter_links/<folder>/sms_batch.csv           - the whole campaign (download, status)
+  letter_links/<folder>/sms_shards/             - only when a shard limit is set:
+      sms_batch_001.csv, sms_batch_002.csv, ...   each within the gateway's upload limits
+      manifest.json                               shards finished so far
+
+A shard is closed (renamed from .part, added to the manifest) as soon as
+the next row would take it over SMS_SHARD_MAX_ROWS rows or
+SMS_SHARD_MAX_BYTES bytes, header included, so the first shards can be
+uploaded while the rest of the campaign is still being generated. The
+manifest says "complete": true once the last shard is written. Memory use
+does not grow with the campaign size.
+
+Rows carry links that must work by the time a file is uploaded, so the
+before_publish callback runs before each shard (and the bulk file) is
+published; if it returns False, ShardPublishError is raised and nothing new
+is published. abort() removes the shards already published and leaves the
+manifest marked "aborted" with no shards listed.
+"""
+
+import os
+import io
+import csv
+import json
+import math
+import hashlib
+from datetime import datetime
+
+SMS_COLUMNS = ['SN', 'Surname', 'First Name', 'NID', 'Mobile No', 'Message Text']
+SMS_BATCH_FILE = "sms_batch.csv"
+SHARD_DIR = "sms_shards"
+SHARD_MANIFEST = "manifest.json"
+
+# Gateway upload limits per file; 0 = no limit (no shards written)
+SMS_SHARD_MAX_ROWS = int(os.getenv('SMS_SHARD_MAX_ROWS', 0))
+SMS_SHARD_MAX_BYTES = int(os.getenv('SMS_SHARD_MAX_BYTES', 0))
+
+def csv_value(value):
+    """Empty cell for None and NaN, as pandas writes them"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return value
+
+def encode_row(values):
+    """One CSV line (pandas-compatible quoting and line ending) as UTF-8 bytes"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator=os.linesep).writerow([csv_value(v) for v in values])
+    return buffer.getvalue().encode('utf-8')
+
+class ShardPublishError(Exception):
+    """before_publish refused a shard - the rows it carries must not be sent"""
+
+class CsvFile:
+    """CSV written under <path>.part and renamed into place when closed"""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.file = open(f"{path}.part", 'wb')
+        self.rows = 0
+        self.bytes = 0
+        self.first_sn = None
+        self.last_sn = None
+        self.digest = hashlib.sha256()
+        self._write(header)
+
+    def _write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+        self.bytes += len(data)
+
+    def write_row(self, line, sn=None):
+        self._write(line)
+        self.rows += 1
+        if self.first_sn is None:
+            self.first_sn = sn
+        self.last_sn = sn
+
+    def close(self):
+        self.file.close()
+        os.replace(f"{self.path}.part", self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(f"{self.path}.part")
+
+class SmsBatchWriter:
+    """
+    Streaming writer for a campaign's SMS bulk file and its shards.
+    Rows are dicts keyed by SMS_COLUMNS; finish with close(), or abort().
+    before_publish() is called before each shard or the bulk file is published.
+    """
+
+    def __init__(self, links_dir, max_rows=SMS_SHARD_MAX_ROWS, max_bytes=SMS_SHARD_MAX_BYTES, columns=SMS_COLUMNS,
+                 before_publish=None):
+        self.links_dir = links_dir
+        self.columns = columns
+        self.before_publish = before_publish
+        self.max_rows = max(0, max_rows or 0)
+        self.max_bytes = max(0, max_bytes or 0)
+        self.sharded = bool(self.max_rows or self.max_bytes)
+        self.header = encode_row(columns)
+        self.shards = []
+        self.shard = None
+        self.rows = 0
+        os.makedirs(links_dir, exist_ok=True)
+        self.batch = CsvFile(os.path.join(links_dir, SMS_BATCH_FILE), self.header)
+        if self.sharded:
+            self.shard_dir = os.path.join(links_dir, SHARD_DIR)
+            os.makedirs(self.shard_dir, exist_ok=True)
+            # Shards of an earlier run of this folder
+            for name in os.listdir(self.shard_dir):
+                os.remove(os.path.join(self.shard_dir, name))
+            self._save_manifest(complete=False)
+
+    @property
+    def path(self):
+        return self.batch.path
+
+    def write(self, row):
+        line = encode_row(row.get(column) for column in self.columns)
+        sn = row.get('SN')
+        self.batch.write_row(line, sn)
+        if self.sharded:
+            if self.shard and self._over_limit(self.shard, line):
+                self._close_shard()
+            if not self.shard:
+                self.shard = CsvFile(os.path.join(self.shard_dir, f"sms_batch_{len(self.shards) + 1:03d}.csv"),
+                                     self.header)
+            self.shard.write_row(line, sn)
+        self.rows += 1
+
+    def _over_limit(self, shard, line):
+        if self.max_rows and shard.rows >= self.max_rows:
+            return True
+        # A row larger than the byte limit still gets a shard of its own
+        return bool(self.max_bytes) and shard.rows > 0 and shard.bytes + len(line) > self.max_bytes
+
+    def _check_publish(self):
+        if self.before_publish and not self.before_publish():
+            raise ShardPublishError("Rows could not be prepared for publishing")
+
+    def _close_shard(self):
+        self._check_publish()
+        self.shard.close()
+        self.shards.append({
+            'file': os.path.basename(self.shard.path),
+            'rows': self.shard.rows,
+            'bytes': self.shard.bytes,
+            'sha256': self.shard.digest.hexdigest(),
+            'firstSN': self.shard.first_sn,
+            'lastSN': self.shard.last_sn
+        })
+        self.shard = None
+        self._save_manifest(complete=False)
+
+    def _save_manifest(self, complete, aborted=False):
+        path = os.path.join(self.shard_dir, SHARD_MANIFEST)
+        manifest = {
+            'updatedAt': datetime.now().isoformat(),
+            'complete': complete,
+            'aborted': aborted,
+            'maxRows': self.max_rows,
+            'maxBytes': self.max_bytes,
+            'totalRows': sum(shard['rows'] for shard in self.shards),
+            'shards': self.shards
+        }
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def close(self):
+        """Finish the bulk file and the last shard; mark the manifest complete"""
+        self._check_publish()
+        self.batch.close()
+        if self.sharded:
+            if self.shard:
+                self._close_shard()
+            self._save_manifest(complete=True)
+
+    def abort(self):
+        """Drop the unfinished files and withdraw the shards already published"""
+        self.batch.discard()
+        if self.shard:
+            self.shard.discard()
+            self.shard = None
+        if self.sharded:
+            for shard in self.shards:
+                path = os.path.join(self.shard_dir, shard['file'])
+                if os.path.exists(path):
+                    os.remove(path)
+            self.shards = []
+            self._save_manifest(complete=False, aborted=True)
+
+    def summary(self):
+        if not self.sharded:
+            return f"{self.rows} rows in {self.path}"
+        return f"{self.rows} rows in {self.path}, {len(self.shards)} shards in {self.shard_dir}"
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+ZIP Export
+Packages a campaign folder - its letters, the SMS CSV and its gateway
+shards, and the run files (output_manifest.json, validation_report.csv) -
+as one ZIP, streamed
+straight from the letter files without a temporary archive.
+
+PDFs are already compressed, so every entry is STORED. The archive layout
+then depends only on the file names and sizes, which gives the total size
+before anything is read and lets any byte range be produced on its own:
+
+  python zip_export.py --folder output_x --info                    # size, ETag, entries (JSON)
+  python zip_export.py --folder output_x --output campaign.zip      # whole archive to a file
+  python zip_export.py --folder output_x --start 1048576            # bytes 1048576- to stdout
+
+server.js serves GET /api/export-zip/:folder with Range / If-Range support
+on top of this, so an interrupted download resumes where it stopped.
+
+CRC-32s are needed in the local headers and the central directory. They are
+computed while streaming and kept in <folder>/zip_crc_cache.json, so a
+resumed download does not have to read the earlier letters again.
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import hashlib
+import argparse
+from output_plan import MANIFEST_FILE, in_manifest_order
+from preflight import REPORT_FILE
+from sms_batch_writer import SMS_BATCH_FILE, SHARD_DIR, SHARD_MANIFEST
+
+CRC_CACHE_FILE = "zip_crc_cache.json"
+LETTER_LINKS_DIR = "letter_links"
+CHUNK_SIZE = 1024 * 1024
+SUBFOLDERS = ('protected', 'unprotected')
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+ZIP64_END_RECORD = struct.Struct('<IQHHIIQQQQ')
+ZIP64_LOCATOR = struct.Struct('<IIQI')
+ZIP64_OFFSET_EXTRA = struct.Struct('<HHQ')
+
+UTF8_NAMES = 0x800
+# Offsets, sizes and counts from these limits on go in the Zip64 records
+ZIP32_LIMIT = 0xFFFFFFFF
+ENTRY_LIMIT = 0xFFFF
+# Value of a classic field whose real value is in a Zip64 record
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+
+def dos_datetime(mtime):
+    """(time, date) in MS-DOS format; earlier than 1980 is stored as 1980-01-01"""
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+def campaign_files(folder, subfolders=('protected',)):
+    """(name in the archive, path) of a campaign's letters and run files"""
+    files = []
+    for subfolder in subfolders:
+        letters_dir = os.path.join(folder, subfolder)
+        if os.path.isdir(letters_dir):
+            names = [f for f in os.listdir(letters_dir) if f.lower().endswith('.pdf')]
+            files += [(f"{subfolder}/{name}", os.path.join(letters_dir, name))
+                      for name in in_manifest_order(folder, names)]
+    links_dir = os.path.join(LETTER_LINKS_DIR, os.path.basename(os.path.normpath(folder)))
+    run_files = [
+        (SMS_BATCH_FILE, os.path.join(links_dir, SMS_BATCH_FILE)),
+        (MANIFEST_FILE, os.path.join(folder, MANIFEST_FILE)),
+        (REPORT_FILE, os.path.join(folder, REPORT_FILE)),
+    ]
+    shard_dir = os.path.join(links_dir, SHARD_DIR)
+    if os.path.isdir(shard_dir):
+        shards = sorted(f for f in os.listdir(shard_dir) if f.endswith('.csv'))
+        run_files += [(f"{SHARD_DIR}/{name}", os.path.join(shard_dir, name)) for name in shards + [SHARD_MANIFEST]]
+    files += [(name, path) for name, path in run_files if os.path.isfile(path)]
+    return files
+
+class CrcCache:
+    """CRC-32 by archive name, valid while the file's size and mtime are unchanged"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.changed = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def get(self, entry):
+        cached = self.entries.get(entry['name'])
+        if cached and cached[0] == entry['size'] and cached[1] == entry['mtime_ns']:
+            return cached[2]
+        return None
+
+    def put(self, entry, crc):
+        self.entries[entry['name']] = [entry['size'], entry['mtime_ns'], crc]
+        self.changed = True
+
+    def save(self):
+        if not (self.path and self.changed):
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.path)
+            self.changed = False
+        except OSError as e:
+            print(f"[ZIP] Warning: Could not save CRC cache: {e}", file=sys.stderr)
+
+class ZipExport:
+    """Layout of a STORED archive over existing files, readable by byte range"""
+
+    def __init__(self, files, crc_cache=None):
+        self.crc_cache = crc_cache or CrcCache()
+        self.entries = []
+        offset = 0
+        for name, path in files:
+            st = os.stat(path)
+            encoded = name.encode('utf-8')
+            self.entries.append({
+                'name': name, 'encoded': encoded, 'path': path, 'offset': offset,
+                'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'dos': dos_datetime(st.st_mtime)
+            })
+            offset += LOCAL_HEADER.size + len(encoded) + st.st_size
+
+        self.central_offset = offset
+        self.central_size = sum(CENTRAL_HEADER.size + len(e['encoded']) +
+                                (ZIP64_OFFSET_EXTRA.size if e['offset'] >= ZIP32_LIMIT else 0)
+                                for e in self.entries)
+        end_offset = self.central_offset + self.central_size
+        self.zip64 = (len(self.entries) >= ENTRY_LIMIT or self.central_offset >= ZIP32_LIMIT
+                      or end_offset >= ZIP32_LIMIT)
+        self.size = end_offset + END_RECORD.size
+        if self.zip64:
+            self.size += ZIP64_END_RECORD.size + ZIP64_LOCATOR.size
+
+    @property
+    def etag(self):
+        """Changes whenever the archive's bytes would change"""
+        digest = hashlib.sha1()
+        for e in self.entries:
+            digest.update(f"{e['name']}\0{e['size']}\0{e['mtime_ns']}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def info(self):
+        return {'size': self.size, 'etag': self.etag, 'entries': len(self.entries)}
+
+    def read_entry(self, entry):
+        """Whole file, checked against the layout; its CRC is cached on the way"""
+        with open(entry['path'], 'rb') as f:
+            data = f.read()
+        if len(data) != entry['size']:
+            raise RuntimeError(f"{entry['path']} changed size during the export")
+        if self.crc_cache.get(entry) is None:
+            self.crc_cache.put(entry, zlib.crc32(data))
+        return data
+
+    def crc(self, entry):
+        crc = self.crc_cache.get(entry)
+        if crc is None:
+            crc = zlib.crc32(self.read_entry(entry))
+        return crc
+
+    def local_header(self, entry):
+        version = 45 if self.zip64 else 20
+        time_, date_ = entry['dos']
+        return LOCAL_HEADER.pack(0x04034b50, version, UTF8_NAMES, 0, time_, date_, self.crc(entry),
+                                 entry['size'], entry['size'], len(entry['encoded']), 0) + entry['encoded']
+
+    def central_directory(self):
+        """Central directory and end records"""
+        version = 45 if self.zip64 else 20
+        parts = []
+        for e in self.entries:
+            time_, date_ = e['dos']
+            extra = b''
+            offset = e['offset']
+            if offset >= ZIP32_LIMIT:
+                extra = ZIP64_OFFSET_EXTRA.pack(0x0001, 8, offset)
+                offset = ZIP64_MARKER
+            parts.append(CENTRAL_HEADER.pack(0x02014b50, version, version, UTF8_NAMES, 0, time_, date_,
+                                             self.crc(e), e['size'], e['size'], len(e['encoded']),
+                                             len(extra), 0, 0, 0, 0, offset) + e['encoded'] + extra)
+
+        count = len(self.entries)
+        if self.zip64:
+            zip64_end_offset = self.central_offset + self.central_size
+            parts.append(ZIP64_END_RECORD.pack(0x06064b50, ZIP64_END_RECORD.size - 12, 45, 45, 0, 0,
+                                               count, count, self.central_size, self.central_offset))
+            parts.append(ZIP64_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1))
+            parts.append(END_RECORD.pack(0x06054b50, 0, 0, ZIP64_COUNT_MARKER, ZIP64_COUNT_MARKER,
+                                         ZIP64_MARKER, ZIP64_MARKER, 0))
+        else:
+            parts.append(END_RECORD.pack(0x06054b50, 0, 0, count, count,
+                                         self.central_size, self.central_offset, 0))
+        return b''.join(parts)
+
+    def iter_bytes(self, start=0, end=None):
+        """Yield the archive's bytes start..end (inclusive, as in an HTTP Range)"""
+        end = self.size - 1 if end is None else min(end, self.size - 1)
+        if start > end:
+            return
+        for entry in self.entries:
+            header_size = LOCAL_HEADER.size + len(entry['encoded'])
+            entry_start = entry['offset']
+            entry_end = entry_start + header_size + entry['size']
+            if entry_end <= start:
+                continue
+            if entry_start > end:
+                break
+
+            if entry_start + header_size > start:
+                # The header is needed, which needs the CRC - read the whole letter once
+                data = self.read_entry(entry)
+                block = self.local_header(entry) + data
+                yield from chunks(block[max(start - entry_start, 0):end - entry_start + 1])
+            else:
+                # Resuming inside a letter's data
+                data_start = entry_start + header_size
+                yield from read_slice(entry['path'], start - data_start, min(end, entry_end - 1) - start + 1)
+
+        if end >= self.central_offset:
+            directory = self.central_directory()
+            yield directory[max(start - self.central_offset, 0):end - self.central_offset + 1]
+        self.crc_cache.save()
+
+    def write_to(self, stream, start=0, end=None):
+        written = 0
+        for block in self.iter_bytes(start, end):
+            stream.write(block)
+            written += len(block)
+        stream.flush()
+        return written
+
+def chunks(data, size=CHUNK_SIZE):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def read_slice(path, offset, length):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while length > 0:
+            block = f.read(min(CHUNK_SIZE, length))
+            if not block:
+                raise RuntimeError(f"{path} changed size during the export")
+            length -= len(block)
+            yield block
+
+def campaign_export(folder, subfolders=('protected',)):
+    """ZipExport for a campaign folder, with its CRC cache"""
+    return ZipExport(campaign_files(folder, subfolders), CrcCache(os.path.join(folder, CRC_CACHE_FILE)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream a campaign folder as a ZIP archive')
+    parser.add_argument('--folder', required=True, help='Campaign output folder')
+    parser.add_argument('--subfolder', choices=SUBFOLDERS + ('both',), default='protected',
+                        help='Letters to include (default: protected)')
+    parser.add_argument('--info', action='store_true', help='Print size, ETag and entry count as JSON')
+    parser.add_argument('--output', help='ZIP file to write (default: stdout)')
+    parser.add_argument('--start', type=int, default=0, help='First byte to write')
+    parser.add_argument('--end', type=int, help='Last byte to write (inclusive)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f"[ZIP] ERROR: Folder not found: {args.folder}", file=sys.stderr)
+        sys.exit(1)
+
+    subfolders = SUBFOLDERS if args.subfolder == 'both' else (args.subfolder,)
+    export = campaign_export(args.folder, subfolders)
+    if args.info:
+        print(json.dumps(export.info()))
+        return
+
+    if args.output:
+        temp_path = f"{args.output}.tmp"
+        with open(temp_path, 'wb') as f:
+            written = export.write_to(f, args.start, args.end)
+        os.replace(temp_path, args.output)
+        print(f"[ZIP] {len(export.entries)} files, {written:,} bytes written to {args.output}", file=sys.stderr)
+    else:
+        export.write_to(sys.stdout.buffer, args.start, args.end)
+
+if __name__ == "__main__":
+    main()